@@ -11,6 +11,133 @@ class Settings(BaseSettings):
     langsmith_endpoint: str = "https://api.smith.langchain.com"
     langsmith_api_key: str | None = None
     langsmith_project: str | None = None
+
+    # Embedding backend: "openai" or "hashing" (local, network-free)
+    embedding_provider: str = "openai"
+    embedding_dimensions: int = 1536
+
+    # Number of chunks embedded and upserted together by add_texts
+    embed_window_size: int = 64
+
+    # Two-stage retrieval: index a truncated prefix of each embedding and
+    # re-score candidates with the full vectors kept locally. Those vectors
+    # are per process, so this needs a single uvicorn worker; /status/rescore
+    # shows how often queries fell back to coarse scores
+    coarse_dimensions: int | None = None
+    rescore_factor: int = 4
+
+    # Result selection for /query: drop low scores, cut at the largest score
+    # gap, and cap prompt context tokens; None disables each check
+    retrieval_min_score: float | None = None
+    retrieval_max_score_gap: float | None = None
+    retrieval_token_budget: int | None = None
+    # Bounds for the candidate over-fetch factor, adapted to the duplicate rate
+    overfetch_min_factor: float = 1.2
+    overfetch_max_factor: float = 4.0
+
+    # Hierarchical retrieval: keep a centroid per file/channel and search
+    # only the chunks of the N centroids closest to the query
+    route_top_n: int | None = None
+
+    # Namespace partitioning: store each chunk in the namespace of its value
+    # for this metadata key (e.g. "channel_id"). A query searches the
+    # namespace it names, or those its filter names (failing past
+    # query_max_namespaces), or else all of them in parallel; past the limit
+    # it searches the default namespace and the largest others, taken from a
+    # namespace list refreshed every namespace_cache_seconds
+    namespace_key: str | None = None
+    query_max_namespaces: int = 16
+    namespace_cache_seconds: float = 60
+
+    # Storage for locally held vectors: float32, float16 or int8. float16
+    # halves and int8 quarters their memory, but local search converts them
+    # back to float32 and runs about 10x (float16) or 2x (int8) slower
+    local_vector_dtype: str = "float32"
+
+    # Upstream deadlines (seconds, covering retries), concurrency caps and
+    # circuit breaking
+    openai_chat_timeout: float = 30.0
+    openai_embedding_timeout: float = 10.0
+    openai_max_concurrency: int = 16
+    pinecone_timeout: float = 10.0
+    pinecone_max_concurrency: int = 16
+    upstream_max_retries: int = 2
+    circuit_failure_threshold: int = 5
+    circuit_reset_seconds: float = 30.0
+    # Start a second query embedding request if the first is slower than this
+    query_embedding_hedge_ms: int | None = None
+
+    # Semantic answer cache for /query
+    answer_cache_enabled: bool = True
+    answer_cache_threshold: float = 0.95
+    answer_cache_size: int = 1000
+    answer_cache_ttl_seconds: float = 3600
+
+    # Speculative retrieval for queries still being typed (/query/prefetch).
+    # Prefetches are held in the worker that received them, so with several
+    # uvicorn workers only a /query routed to the same worker (e.g. sticky
+    # sessions by session_id) can use them; others run their own retrieval
+    prefetch_enabled: bool = False
+    prefetch_ttl_seconds: float = 30
+    prefetch_min_similarity: float = 0.85
+    prefetch_max_sessions: int = 1000
+
+    # Near-duplicate suppression for /index/realtime: "skip", "merge" or None
+    # (off unless set), applied to messages at most dedup_window_seconds apart
+    dedup_policy: str | None = None
+    dedup_max_distance: int = 3
+    dedup_max_entries: int = 100000
+    dedup_scope_key: str | None = "channel_id"
+    dedup_window_seconds: float | None = 600
+
+    # Pack /index/realtime messages into per-channel conversation windows,
+    # kept in process memory (so not with shared_queue_path)
+    pack_conversations: bool = False
+    pack_max_gap_seconds: float = 300
+    pack_max_tokens: int = 256
+    pack_overlap_messages: int = 1
+
+    # Retention policies, e.g. [{"match": {"source": "chat"}, "max_age_days": 30,
+    # "action": "summarize"}], applied by a background compaction task. Only
+    # the uvicorn worker holding retention_lock_path compacts
+    retention_policies: list[dict] = []
+    retention_interval_seconds: float = 3600
+    retention_batch_size: int = 100
+    retention_max_deletes_per_run: int = 10000
+    retention_lock_path: str = "retention.lock"
+
+    # SQLite file shared by all uvicorn workers for the realtime queue,
+    # rate-limit budget and status; None keeps a per-process queue. Cannot
+    # be combined with pack_conversations, whose windows are per process
+    shared_queue_path: str | None = None
+    shared_queue_lease_seconds: float = 300
+    shared_queue_poll_seconds: float = 0.5
+
+    # Snapshots of in-process state (local vectors, dedup fingerprints,
+    # conversation windows, counters); disabled unless a directory is set.
+    # Each uvicorn worker locks its own worker-<n> subdirectory
+    snapshot_dir: str | None = None
+    snapshot_interval_seconds: float = 300
+    snapshot_keep: int = 2
+
+    # Request tracing: a sampled fraction of requests and, if enabled, those
+    # sent with "X-Profile: 1" (or "X-Profile: <profile_header_token>" when
+    # a token is set) run under a stack sampler; profiled requests and, if
+    # set, those slower than slow_request_ms are kept in a ring buffer of
+    # trace files, whose directory is only created once a trace is saved.
+    # The /admin/traces endpoints are unauthenticated, so keep the header
+    # off, or behind a token, wherever clients are untrusted
+    profile_sample_rate: float = 0.0
+    profile_header_enabled: bool = False
+    profile_header_token: str | None = None
+    profile_interval_ms: float = 5
+    slow_request_ms: float | None = None
+    trace_dir: str = "traces"
+    trace_max_files: int = 200
+
+    # Streaming ingestion
+    ingest_batch_size: int = 64
+    ingest_queue_size: int = 8
     
     class Config:
         env_file = ".env.ai-service"
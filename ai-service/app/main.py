@@ -1,5 +1,6 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, ORJSONResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import uvicorn
@@ -7,16 +8,33 @@ from dotenv import load_dotenv
 import os
 import logging
 import openai
+import uuid
+import asyncio
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-from .utils.vector_store import add_texts, similarity_search_with_score, get_pinecone, delete_all_vectors
+from .utils.vector_store import (
+    add_texts, similarity_search_with_stats, get_pinecone, delete_all_vectors,
+    get_full_vector_store, set_full_vector_store, get_namespace_stats, namespace_name,
+    get_rescore_status, TooManyNamespacesError
+)
 from .utils.file_processor import extract_text_from_file
 from .utils.realtime_processor import RealTimeProcessor
+from .utils.conversation_packer import ConversationPacker
+from .utils.ingest_pipeline import StreamingIngestor
+from .utils.resilience import DependencyUnavailableError, get_dependency_status
+from .utils.answer_cache import SemanticAnswerCache, context_fingerprint
+from .utils.prefetch import QueryPrefetcher
+from .utils.embeddings import get_query_embedding, FULL_DIMENSIONS
+from .utils.compression import CompressionMiddleware
+from .utils.retention import RetentionCompactor, RetentionPolicy
+from .utils.snapshot import SnapshotManager
+from .utils.shared_queue import SharedIngestQueue
+from .utils.profiling import ProfilingMiddleware, TraceStore, stage
 from .config import get_settings
-from .utils.gpt import process_query
+from .utils.gpt import process_query_with_usage
 
 # Load environment variables
 load_dotenv()
@@ -32,15 +50,87 @@ logger.info(f"Pinecone Environment: {settings.pinecone_environment}")
 logger.info(f"Pinecone Index: {settings.pinecone_index}")
 logger.info("========================")
 
+# Full vectors for re-scoring live only in the worker that indexed them, so
+# with several workers most queries would silently rank on coarse scores
+if settings.coarse_dimensions is not None and (
+    settings.shared_queue_path or int(os.environ.get("WEB_CONCURRENCY", "1")) > 1
+):
+    raise RuntimeError(
+        "coarse_dimensions requires a single uvicorn worker; unset shared_queue_path and WEB_CONCURRENCY"
+    )
+
 app = FastAPI(title="ChatGenius AI Service")
 
 # Initialize real-time processor
 processor = RealTimeProcessor(
     batch_size=10,
     rate_limit_per_minute=100,
-    max_queue_size=1000
+    max_queue_size=1000,
+    dedup_policy=settings.dedup_policy,
+    dedup_max_distance=settings.dedup_max_distance,
+    dedup_max_entries=settings.dedup_max_entries,
+    dedup_scope_key=settings.dedup_scope_key,
+    dedup_window_seconds=settings.dedup_window_seconds,
+    packer=ConversationPacker(
+        max_gap_seconds=settings.pack_max_gap_seconds,
+        max_tokens=settings.pack_max_tokens,
+        overlap_messages=settings.pack_overlap_messages,
+        carry_keys=("source", settings.namespace_key) if settings.namespace_key else ("source",)
+    ) if settings.pack_conversations else None,
+    shared_queue=SharedIngestQueue(
+        settings.shared_queue_path,
+        max_size=1000,
+        lease_seconds=settings.shared_queue_lease_seconds
+    ) if settings.shared_queue_path else None,
+    shared_poll_seconds=settings.shared_queue_poll_seconds
+)
+
+# On-disk snapshots of in-process state, restored at startup
+snapshots = None
+if settings.snapshot_dir:
+    snapshots = SnapshotManager(
+        settings.snapshot_dir,
+        interval_seconds=settings.snapshot_interval_seconds,
+        keep=settings.snapshot_keep
+    )
+    snapshots.register_store("full_vectors", get_full_vector_store, set_full_vector_store)
+    # With a shared queue the counters already outlive workers in its
+    # database; restoring them under a new worker ID would count them twice
+    if processor.shared_queue is None:
+        snapshots.register_state("realtime_processor", processor.dump_state, processor.restore_state)
+    if processor.detector is not None:
+        snapshots.register_section("dedup", processor.detector.dump, processor.detector.restore)
+    if processor.packer is not None:
+        snapshots.register_section("conversation_windows", processor.packer.dump, processor.packer.restore)
+
+# Background expiry of aged vectors
+compactor = RetentionCompactor(
+    policies=[RetentionPolicy.from_dict(policy) for policy in settings.retention_policies],
+    interval_seconds=settings.retention_interval_seconds,
+    batch_size=settings.retention_batch_size,
+    max_deletes_per_run=settings.retention_max_deletes_per_run,
+    lock_path=settings.retention_lock_path
+)
+
+# Answers to recent queries, reused for paraphrases over the same context
+answer_cache = SemanticAnswerCache(
+    dimensions=FULL_DIMENSIONS,
+    threshold=settings.answer_cache_threshold,
+    max_entries=settings.answer_cache_size,
+    ttl_seconds=settings.answer_cache_ttl_seconds
+)
+
+# Retrieval started while a query is typed, claimed by the submitted query
+prefetcher = QueryPrefetcher(
+    ttl_seconds=settings.prefetch_ttl_seconds,
+    min_similarity=settings.prefetch_min_similarity,
+    max_sessions=settings.prefetch_max_sessions
 )
 
+# Streaming ingestion jobs, most recent last
+ingest_jobs: Dict[str, StreamingIngestor] = {}
+MAX_TRACKED_INGEST_JOBS = 100
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -50,6 +140,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger responses with br or gzip, as negotiated by the client
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+# Stage timings for every request; slow or profiled ones are kept on disk
+trace_store = TraceStore(settings.trace_dir, max_traces=settings.trace_max_files)
+app.add_middleware(
+    ProfilingMiddleware,
+    store=trace_store,
+    sample_rate=settings.profile_sample_rate,
+    header_enabled=settings.profile_header_enabled,
+    header_token=settings.profile_header_token,
+    slow_request_ms=settings.slow_request_ms,
+    interval_ms=settings.profile_interval_ms
+)
+
 # Request/Response Models
 class IndexContentRequest(BaseModel):
     """Request model for indexing content"""
@@ -61,10 +166,29 @@ class QueryRequest(BaseModel):
     query: str
     k: Optional[int] = 4
     filter: Optional[Dict[str, Any]] = None
+    # Value of settings.namespace_key to search (e.g. a channel ID); defaults
+    # to an equality filter on that key, else the default namespace
+    namespace: Optional[str] = None
+    # Response shaping; the answer is always generated from the full chunks
+    include_results: bool = True
+    include_content: bool = True
+    snippet_chars: Optional[int] = None
+    metadata_keys: Optional[List[str]] = None
+    # Result selection; defaults come from settings
+    min_score: Optional[float] = None
+    max_score_gap: Optional[float] = None
+    token_budget: Optional[int] = None
+    include_stats: bool = False
+    # Claims a prefetch started for this session by /query/prefetch
+    session_id: Optional[str] = None
+
+class PrefetchRequest(QueryRequest):
+    """Request model for prefetching retrieval while a query is typed"""
+    session_id: str
 
 class SearchResult(BaseModel):
     """Model for search results"""
-    content: str
+    content: Optional[str] = None
     metadata: Dict[str, Any]
     score: float
 
@@ -72,14 +196,22 @@ class QueryResponse(BaseModel):
     """Response model for queries"""
     results: List[SearchResult]
     answer: str
+    cached: bool = False
+    retrieval: Optional[Dict[str, Any]] = None
 
 class ProcessingStatus(BaseModel):
     """Model for processing status"""
     queue_size: int
+    in_flight: int = 0
     processed_count: int
     failed_count: int
+    suppressed_count: int = 0
+    saved_tokens: int = 0
     last_processed: Optional[str]
     is_processing: bool
+    packing: Optional[Dict[str, Any]] = None
+    workers: Optional[int] = None
+    queue_lag_seconds: Optional[float] = None
 
 @app.get("/health")
 async def health_check():
@@ -97,19 +229,65 @@ async def index_content(request: IndexContentRequest):
             metadatas=request.metadata
         )
         return ids
+    except DependencyUnavailableError as e:
+        logger.error(f"Upstream unavailable: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/index/stream")
+async def index_stream(request: Request, offset: int = 0, job_id: Optional[str] = None):
+    """
+    Index an NDJSON body of {"text": ..., "metadata": {...}} records.
+
+    Records are processed as they arrive. Pass the returned checkpoint back
+    as `offset` to resume an interrupted backfill.
+    """
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="offset must be non-negative")
+
+    job_id = job_id or str(uuid.uuid4())
+    ingestor = StreamingIngestor(
+        job_id=job_id,
+        start_offset=offset,
+        batch_size=settings.ingest_batch_size,
+        queue_size=settings.ingest_queue_size
+    )
+    ingest_jobs.pop(job_id, None)
+    ingest_jobs[job_id] = ingestor
+    while len(ingest_jobs) > MAX_TRACKED_INGEST_JOBS:
+        ingest_jobs.pop(next(iter(ingest_jobs)))
+
+    logger.info(f"Starting ingest job {job_id} at offset {offset}")
+    try:
+        return await ingestor.run(request.stream())
+    except Exception as e:
+        logger.error(f"Ingest job {job_id} failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=ingestor.get_status())
+
+@app.get("/status/ingest")
+async def get_ingest_status(job_id: Optional[str] = None):
+    """
+    Get progress of streaming ingestion jobs
+    """
+    if job_id is None:
+        return [job.get_status() for job in ingest_jobs.values()]
+    if job_id not in ingest_jobs:
+        raise HTTPException(status_code=404, detail=f"Unknown ingest job: {job_id}")
+    return ingest_jobs[job_id].get_status()
+
 @app.post("/index/file")
 async def index_file(file: UploadFile = File(...)) -> Dict[str, List[str]]:
     """Index a file's content"""
     try:
-        content = await file.read()
+        with stage("read_upload"):
+            content = await file.read()
         logger.info(f"Received file upload: {file.filename}, size: {len(content)} bytes")
         
         try:
             # Extract text and metadata
-            result = await extract_text_from_file(content, file.filename)
+            with stage("extract"):
+                result = await extract_text_from_file(content, file.filename)
             logger.info(f"Successfully extracted text from {result['metadata']['filename']}")
         except Exception as e:
             logger.error(f"Text extraction failed: {str(e)}")
@@ -118,10 +296,11 @@ async def index_file(file: UploadFile = File(...)) -> Dict[str, List[str]]:
         try:
             # Index the content
             _, index = get_pinecone()
-            doc_ids = await add_texts(
-                texts=[result["content"]],
-                metadatas=[result["metadata"]]
-            )
+            with stage("index"):
+                doc_ids = await add_texts(
+                    texts=[result["content"]],
+                    metadatas=[result["metadata"]]
+                )
             logger.info(f"Successfully indexed document with IDs: {doc_ids}")
         except Exception as e:
             logger.error(f"Indexing failed: {str(e)}")
@@ -135,53 +314,155 @@ async def index_file(file: UploadFile = File(...)) -> Dict[str, List[str]]:
     except NotImplementedError as e:
         logger.error(f"Unsupported file type: {str(e)}")
         raise HTTPException(status_code=415, detail=str(e))
+    except DependencyUnavailableError as e:
+        logger.error(f"Upstream unavailable: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error processing file: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/query", response_model=QueryResponse)
+def request_namespace(request: QueryRequest) -> Optional[str]:
+    """Namespace a query asks for, if any"""
+    if request.namespace is None:
+        return None
+    if settings.namespace_key is None:
+        raise HTTPException(status_code=400, detail="Namespaces are not enabled")
+    return namespace_name(request.namespace)
+
+def retrieval_params(request: QueryRequest) -> Dict[str, Any]:
+    """Parameters that must match for a prefetch to stand in for a query's retrieval"""
+    return {
+        "k": request.k,
+        "filter": request.filter,
+        "namespace": request.namespace,
+        "min_score": request.min_score,
+        "max_score_gap": request.max_score_gap,
+        "token_budget": request.token_budget
+    }
+
+async def retrieve(request: QueryRequest, namespace: Optional[str]) -> Dict[str, Any]:
+    """Embed the query and select the results to answer it from"""
+    with stage("embed_query"):
+        query_embedding = await get_query_embedding(request.query)
+    
+    # Perform similarity search, keeping only results worth prompting with
+    with stage("search"):
+        results, retrieval_stats = await similarity_search_with_stats(
+            request.query,
+            k=request.k,
+            filter=request.filter,
+            query_embedding=query_embedding,
+            namespace=namespace,
+            min_score=request.min_score if request.min_score is not None else settings.retrieval_min_score,
+            max_score_gap=request.max_score_gap if request.max_score_gap is not None else settings.retrieval_max_score_gap,
+            token_budget=request.token_budget if request.token_budget is not None else settings.retrieval_token_budget
+        )
+    return {"query_embedding": query_embedding, "results": results, "stats": retrieval_stats}
+
+def shape_result(result: Dict[str, Any], request: QueryRequest) -> Dict[str, Any]:
+    """Apply the request's response-shaping options to a search result"""
+    metadata = result["metadata"]
+    if request.metadata_keys is not None:
+        metadata = {key: metadata[key] for key in request.metadata_keys if key in metadata}
+    
+    shaped = {"metadata": metadata, "score": result["score"]}
+    if request.include_content:
+        content = result["content"]
+        if request.snippet_chars is not None and len(content) > request.snippet_chars:
+            content = content[:request.snippet_chars].rstrip() + "…"
+        shaped["content"] = content
+    return shaped
+
+@app.post("/query", response_model=QueryResponse, response_model_exclude_none=True)
 async def query_avatar(request: QueryRequest):
     """
     Query the avatar's knowledge
     """
+    namespace = request_namespace(request)
+    
     try:
-        # Perform similarity search
-        results = await similarity_search_with_score(
-            request.query,
-            k=request.k,
-            filter=request.filter
-        )
+        # Use retrieval prefetched while the query was typed, if close enough
+        retrieved = None
+        if settings.prefetch_enabled and request.session_id is not None:
+            with stage("prefetch_wait"):
+                retrieved = await prefetcher.take(request.session_id, request.query, retrieval_params(request))
         
-        # Format results according to response model
-        formatted_results = [
-            SearchResult(
-                content=doc["content"],
-                metadata={k: v for k, v in doc.items() if k != "content"},
-                score=score
-            )
-            for doc, score in results
-        ]
+        if retrieved is None:
+            # Embed once for both retrieval and the answer cache
+            retrieved = await retrieve(request, namespace)
+            query_embedding = retrieved["query_embedding"]
+            retrieval_stats = retrieved["stats"]
+        else:
+            # A prefetch of different text has the wrong embedding for the
+            # answer cache, so such queries bypass it rather than re-embed
+            query_embedding = retrieved["query_embedding"] if retrieved["exact"] else None
+            retrieval_stats = {
+                **retrieved["stats"],
+                "prefetch": {key: retrieved[key] for key in ("exact", "similarity", "saved_ms")}
+            }
+        results = retrieved["results"]
+        logger.info(f"Retrieval stats: {retrieval_stats}")
         
-        # Convert SearchResults to format expected by GPT
+        # Convert search results to format expected by GPT
         results_for_gpt = [
             {
-                "content": result.content,
-                "metadata": result.metadata,
-                "score": result.score
+                "content": doc["content"],
+                "metadata": {k: v for k, v in doc.items() if k != "content"},
+                "score": score
             }
-            for result in formatted_results
+            for doc, score in results
         ]
         
+        # Reuse an answer to a near-identical query over the same chunks
+        context = context_fingerprint(results)
+        answer = None
+        if settings.answer_cache_enabled and query_embedding is not None:
+            answer = answer_cache.lookup(query_embedding, context)
+        cached = answer is not None
+        
         # Generate GPT response
-        answer = await process_query(request.query, results_for_gpt)
+        if answer is None:
+            with stage("generate"):
+                answer, tokens = await process_query_with_usage(request.query, results_for_gpt)
+            if settings.answer_cache_enabled and query_embedding is not None:
+                answer_cache.store(query_embedding, context, answer, tokens)
         
-        return QueryResponse(
-            results=formatted_results,
-            answer=answer
-        )
+        # Serialize directly with orjson instead of validating through the response model
+        response = {
+            "results": [shape_result(result, request) for result in results_for_gpt] if request.include_results else [],
+            "answer": answer,
+            "cached": cached
+        }
+        if request.include_stats:
+            response["retrieval"] = retrieval_stats
+        return ORJSONResponse(response)
+    except TooManyNamespacesError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except DependencyUnavailableError as e:
+        logger.error(f"Upstream unavailable: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/query/prefetch")
+async def prefetch_query(request: PrefetchRequest):
+    """
+    Start retrieval for a query that is still being typed
+
+    Returns immediately; a later /query with the same session_id uses the
+    result if its text is close enough to this one.
+    """
+    if not settings.prefetch_enabled:
+        raise HTTPException(status_code=404, detail="Prefetch is not enabled")
+    namespace = request_namespace(request)
+    status = prefetcher.prefetch(
+        request.session_id,
+        request.query,
+        retrieval_params(request),
+        lambda: retrieve(request, namespace)
+    )
+    return {"session_id": request.session_id, "status": status}
+
 @app.post("/index/realtime", response_model=bool)
 async def index_realtime(request: IndexContentRequest):
     """
@@ -201,16 +482,151 @@ async def get_processing_status():
     """
     Get current processing status
     """
-    status = processor.get_status()
+    status = await processor.get_aggregated_status()
     if status["last_processed"]:
         status["last_processed"] = status["last_processed"].isoformat()
     return status
 
+@app.get("/status/dependencies")
+async def get_dependencies_status():
+    """
+    Get circuit breaker state and call metrics for upstream dependencies
+    """
+    return get_dependency_status()
+
+@app.on_event("startup")
+async def restore_snapshot():
+    """Restore in-process state and start periodic snapshots"""
+    if snapshots is not None:
+        snapshots.restore()
+        snapshots.start()
+
+@app.on_event("shutdown")
+async def write_final_snapshot():
+    """Snapshot in-process state before exiting"""
+    if snapshots is not None:
+        await snapshots.stop()
+        await snapshots.snapshot()
+        snapshots.close()
+
+@app.on_event("startup")
+async def start_processor():
+    """Start consuming the shared ingestion queue, if configured"""
+    processor.start()
+
+@app.on_event("shutdown")
+async def stop_processor():
+    """Stop consuming the shared ingestion queue"""
+    await processor.stop()
+
+@app.on_event("startup")
+async def start_compaction():
+    """Start applying retention policies in the background"""
+    if compactor.policies:
+        compactor.start()
+
+@app.on_event("shutdown")
+async def stop_compaction():
+    """Stop background compaction"""
+    await compactor.stop()
+
+@app.post("/index/compact")
+async def compact_index():
+    """
+    Apply retention policies now
+    """
+    return await compactor.run_once()
+
+@app.post("/index/snapshot")
+async def snapshot_state():
+    """
+    Write a snapshot of in-process state now
+    """
+    if snapshots is None:
+        raise HTTPException(status_code=404, detail="Snapshots are not enabled")
+    try:
+        return await snapshots.snapshot()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/status/snapshot")
+async def get_snapshot_status():
+    """
+    Get snapshot and restore metrics
+    """
+    if snapshots is None:
+        raise HTTPException(status_code=404, detail="Snapshots are not enabled")
+    return snapshots.get_status()
+
+@app.get("/admin/traces")
+async def list_traces():
+    """
+    List saved slow and profiled request traces, newest first
+    """
+    return await asyncio.to_thread(trace_store.list)
+
+@app.get("/admin/traces/{trace_id}")
+async def download_trace(trace_id: str):
+    """
+    Download a saved trace with its stage timings and profile
+    """
+    path = trace_store.path(trace_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return FileResponse(path, media_type="application/json", filename=path.name)
+
+@app.get("/status/retention")
+async def get_retention_status():
+    """
+    Get retention policies, compaction metrics and index size over time
+    """
+    return compactor.get_status()
+
+@app.get("/status/namespaces")
+async def get_namespaces_status():
+    """
+    Get the vector count of each namespace
+    """
+    try:
+        counts = await get_namespace_stats()
+    except DependencyUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {
+        "namespace_key": settings.namespace_key,
+        "namespace_count": len(counts),
+        "total_vector_count": sum(counts.values()),
+        "namespaces": dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
+    }
+
+@app.get("/status/prefetch")
+async def get_prefetch_status():
+    """
+    Get prefetch hit rate and retrieval latency saved
+    """
+    return prefetcher.get_status()
+
+@app.get("/status/rescore")
+async def get_rescoring_status():
+    """
+    Get how often two-stage retrieval fell back to coarse scores
+    """
+    return get_rescore_status()
+
+@app.get("/status/cache")
+async def get_cache_status():
+    """
+    Get answer cache hit ratio and saved tokens
+    """
+    return answer_cache.get_status()
+
 @app.post("/index/reset")
 async def reset_index():
     """Delete all vectors from the index"""
     try:
         await delete_all_vectors()
+        answer_cache.clear()
+        prefetcher.clear()
+        processor.clear_dedup()
         return {"status": "success", "message": "All vectors deleted"}
     except Exception as e:
         logger.error(f"Error resetting index: {str(e)}")
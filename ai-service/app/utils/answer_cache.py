@@ -0,0 +1,126 @@
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+from collections import OrderedDict
+import hashlib
+import itertools
+import logging
+import time
+import numpy as np
+
+from .local_store import LocalVectorStore
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Nearest cached queries checked per lookup
+CANDIDATES_PER_LOOKUP = 8
+
+def context_fingerprint(results: List[Tuple[dict, float]]) -> FrozenSet[Tuple[str, str]]:
+    """
+    Identify the retrieved context by chunk ID and content hash
+
+    Hashing the content as well as the ID means a chunk that was re-upserted
+    under the same ID with new text does not match an older answer.
+    """
+    return frozenset(
+        (doc.get("id", ""), hashlib.sha1(doc.get("content", "").encode("utf-8")).hexdigest())
+        for doc, _ in results
+    )
+
+class SemanticAnswerCache:
+    """
+    Cache of generated answers keyed by query embedding similarity.
+
+    A lookup hits when a cached query is at least `threshold` cosine-similar
+    to the new one and was answered from exactly the same retrieved chunks.
+    Entries expire after `ttl_seconds` and the oldest are evicted first.
+    """
+
+    def __init__(self,
+                 dimensions: int,
+                 threshold: float = 0.95,
+                 max_entries: int = 1000,
+                 ttl_seconds: float = 3600):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._vectors = LocalVectorStore(dimensions, initial_capacity=min(max_entries, 1024))
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._next_key = itertools.count()
+
+        # Metrics
+        self.lookups = 0
+        self.hits = 0
+        self.saved_tokens = 0
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _evict(self, key: str):
+        self._entries.pop(key, None)
+        self._vectors.delete([key])
+
+    def lookup(self, query_embedding: np.ndarray, context: FrozenSet[Tuple[str, str]]) -> Optional[str]:
+        """
+        Find a cached answer for a similar query over the same context
+
+        Args:
+            query_embedding: Embedding of the new query
+            context: Fingerprint of the retrieved chunks
+
+        Returns:
+            The cached answer, or None on a miss
+        """
+        self.lookups += 1
+        now = time.monotonic()
+        for key, similarity in self._vectors.search(self._normalize(query_embedding), CANDIDATES_PER_LOOKUP):
+            if similarity < self.threshold:
+                break
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            if now - entry["created_at"] > self.ttl_seconds:
+                self._evict(key)
+                continue
+            if entry["context"] != context:
+                continue
+
+            self.hits += 1
+            self.saved_tokens += entry["tokens"]
+            logger.info(f"Answer cache hit (similarity {similarity:.3f}, saved {entry['tokens']} tokens)")
+            return entry["answer"]
+        return None
+
+    def store(self,
+              query_embedding: np.ndarray,
+              context: FrozenSet[Tuple[str, str]],
+              answer: str,
+              tokens: int):
+        """Cache an answer generated for a query and its retrieved context"""
+        key = str(next(self._next_key))
+        self._vectors.add([key], self._normalize(query_embedding)[None, :])
+        self._entries[key] = {
+            "context": context,
+            "answer": answer,
+            "tokens": tokens,
+            "created_at": time.monotonic()
+        }
+        while len(self._entries) > self.max_entries:
+            self._evict(next(iter(self._entries)))
+
+    def clear(self):
+        """Drop all cached answers"""
+        self._entries.clear()
+        self._vectors.clear()
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get cache size and hit metrics"""
+        return {
+            "entries": len(self._entries),
+            "threshold": self.threshold,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_ratio": self.hits / self.lookups if self.lookups else 0.0,
+            "saved_tokens": self.saved_tokens
+        }
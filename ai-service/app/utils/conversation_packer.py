@@ -0,0 +1,225 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from collections import OrderedDict
+from datetime import datetime
+import logging
+import uuid
+
+from .vector_store import estimate_tokens, parse_timestamp
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+def message_time(metadata: Dict[str, Any], fallback: datetime) -> datetime:
+    """
+    Read a message's send time from its metadata
+
+    Accepts the formats of parse_timestamp under "timestamp" or "created_at",
+    as naive local time to compare with the processor's arrival times.
+    """
+    for key in ("timestamp", "created_at"):
+        epoch = parse_timestamp(metadata.get(key))
+        if epoch is None:
+            continue
+        try:
+            return datetime.fromtimestamp(epoch)
+        except (ValueError, OverflowError, OSError):
+            continue
+    return fallback
+
+class ConversationPacker:
+    """
+    Groups consecutive chat messages into conversation windows.
+
+    Messages are grouped by the values of `group_keys` in their metadata
+    (channel and thread by default). A group's open window keeps growing until
+    the next message arrives more than `max_gap_seconds` after the last one or
+    would push it past `max_tokens`; then a new window starts, seeded with the
+    last `overlap_messages` messages for context.
+
+    Each window has a stable vector ID, so re-adding it after new messages
+    arrive replaces its previous vector instead of adding another one.
+    Windows carry the group keys and `carry_keys` from their first message's
+    metadata. A window with messages added since it was last indexed (see
+    mark_indexed) is pending.
+    """
+
+    def __init__(self,
+                 group_keys: Sequence[str] = ("channel_id", "thread_id"),
+                 max_gap_seconds: float = 300,
+                 max_tokens: int = 256,
+                 overlap_messages: int = 1,
+                 max_tracked_windows: int = 10000,
+                 carry_keys: Sequence[str] = ("source",)):
+        self.group_keys = tuple(group_keys)
+        self.carry_keys = tuple(key for key in carry_keys if key not in self.group_keys)
+        self.max_gap_seconds = max_gap_seconds
+        self.max_tokens = max_tokens
+        self.overlap_messages = overlap_messages
+        self.max_tracked_windows = max_tracked_windows
+
+        # Open window per group, plus recently closed windows by ID
+        self._open: Dict[Tuple, Dict[str, Any]] = {}
+        self._windows: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+        # Metrics
+        self.messages_packed = 0
+        self.windows_created = 0
+
+    def _group(self, metadata: Dict[str, Any]) -> Tuple:
+        return tuple(metadata.get(key) for key in self.group_keys)
+
+    def _new_window(self, group: Tuple, metadata: Dict[str, Any], seed: List[Dict[str, Any]]) -> Dict[str, Any]:
+        window = {
+            "id": f"window-{uuid.uuid4()}",
+            "group": group,
+            "base_metadata": {
+                key: metadata[key]
+                for key in self.group_keys + self.carry_keys
+                if metadata.get(key) is not None
+            },
+            "messages": list(seed),
+            "tokens": sum(message["tokens"] for message in seed),
+            "duplicate_count": 0,
+            "unindexed_since": None
+        }
+        self._open[group] = window
+        self._windows[window["id"]] = window
+        self.windows_created += 1
+        while len(self._windows) > self.max_tracked_windows:
+            _, evicted = self._windows.popitem(last=False)
+            if self._open.get(evicted["group"]) is evicted:
+                del self._open[evicted["group"]]
+        return window
+
+    def add(self, text: str, metadata: Optional[Dict[str, Any]] = None,
+            arrived_at: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Add a message to its group's window
+
+        Returns:
+            The window the message was added to
+        """
+        metadata = metadata or {}
+        sent_at = message_time(metadata, arrived_at or datetime.now())
+        speaker = metadata.get("username") or metadata.get("user_id")
+        message = {
+            "text": f"{speaker}: {text}" if speaker else text,
+            "sent_at": sent_at,
+            "tokens": estimate_tokens(text)
+        }
+
+        group = self._group(metadata)
+        window = self._open.get(group)
+        if window is not None:
+            gap = (sent_at - window["messages"][-1]["sent_at"]).total_seconds()
+            if gap > self.max_gap_seconds or window["tokens"] + message["tokens"] > self.max_tokens:
+                seed = window["messages"][-self.overlap_messages:] if self.overlap_messages and gap <= self.max_gap_seconds else []
+                window = self._new_window(group, metadata, seed)
+        if window is None:
+            window = self._new_window(group, metadata, [])
+
+        window["messages"].append(message)
+        window["tokens"] += message["tokens"]
+        if window["unindexed_since"] is None:
+            window["unindexed_since"] = arrived_at or datetime.now()
+        self.messages_packed += 1
+        return window
+
+    def mark_indexed(self, window_ids: Sequence[str]):
+        """Record that the windows' current messages are indexed"""
+        for window_id in window_ids:
+            window = self._windows.get(window_id)
+            if window is not None:
+                window["unindexed_since"] = None
+
+    def unindexed_windows(self) -> List[Dict[str, Any]]:
+        """Windows with messages added since they were last indexed, oldest first"""
+        return [window for window in self._windows.values() if window["unindexed_since"] is not None]
+
+    def oldest_unindexed(self) -> Optional[datetime]:
+        """Arrival time of the oldest message in a pending window, if any"""
+        return min(
+            (window["unindexed_since"] for window in self._windows.values() if window["unindexed_since"] is not None),
+            default=None
+        )
+
+    def window_text(self, window: Dict[str, Any]) -> str:
+        """Text embedded for a window, one message per line"""
+        return "\n".join(message["text"] for message in window["messages"])
+
+    def window_metadata(self, window: Dict[str, Any]) -> Dict[str, Any]:
+        """Metadata stored with a window's vector"""
+        metadata = dict(window["base_metadata"])
+        metadata.update({
+            "packed": True,
+            "message_count": len(window["messages"]),
+            "window_start": window["messages"][0]["sent_at"].isoformat(),
+            "window_end": window["messages"][-1]["sent_at"].isoformat()
+        })
+        if window["duplicate_count"]:
+            metadata["duplicate_count"] = window["duplicate_count"]
+        return metadata
+
+    def add_duplicates(self, window_id: str, count: int) -> int:
+        """
+        Count suppressed duplicates against a window
+
+        Returns:
+            The window's total duplicate count
+        """
+        window = self._windows.get(window_id)
+        if window is None:
+            return count
+        window["duplicate_count"] += count
+        return window["duplicate_count"]
+
+    def dump(self) -> List[Dict[str, Any]]:
+        """Copy out tracked windows, oldest first, e.g. for a snapshot"""
+        open_ids = {window["id"] for window in self._open.values()}
+        return [
+            {
+                "id": window["id"],
+                "group": list(window["group"]),
+                "base_metadata": window["base_metadata"],
+                "messages": [
+                    {**message, "sent_at": message["sent_at"].isoformat()}
+                    for message in window["messages"]
+                ],
+                "tokens": window["tokens"],
+                "duplicate_count": window["duplicate_count"],
+                "unindexed_since": window["unindexed_since"].isoformat() if window["unindexed_since"] else None,
+                "open": window["id"] in open_ids
+            }
+            for window in self._windows.values()
+        ]
+
+    def restore(self, records):
+        """Replace tracked windows with ones produced by `dump`"""
+        self.clear()
+        for record in records:
+            window = dict(record)
+            window["group"] = tuple(window["group"])
+            window["messages"] = [
+                {**message, "sent_at": datetime.fromisoformat(message["sent_at"])}
+                for message in window["messages"]
+            ]
+            unindexed_since = window.get("unindexed_since")
+            window["unindexed_since"] = datetime.fromisoformat(unindexed_since) if unindexed_since else None
+            if window.pop("open"):
+                self._open[window["group"]] = window
+            self._windows[window["id"]] = window
+
+    def clear(self):
+        """Forget all windows, e.g. after the index is reset"""
+        self._open.clear()
+        self._windows.clear()
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get packing metrics"""
+        return {
+            "messages_packed": self.messages_packed,
+            "windows_created": self.windows_created,
+            "open_windows": len(self._open),
+            "pending_windows": sum(1 for window in self._windows.values() if window["unindexed_since"] is not None),
+            "vector_reduction": 1 - self.windows_created / self.messages_packed if self.messages_packed else 0.0
+        }
@@ -0,0 +1,186 @@
+from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict, defaultdict
+import hashlib
+import itertools
+import logging
+import re
+import time
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_BITS = 64
+_BIT_POSITIONS = np.arange(FINGERPRINT_BITS, dtype=np.uint64)
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+def normalize_text(text: str) -> List[str]:
+    """
+    Tokenize text for near-duplicate comparison
+
+    Case and punctuation are dropped. Numbers are kept: "PR #977 approved"
+    and "PR #412 approved" are different messages.
+    """
+    return _TOKEN_PATTERN.findall(text.lower())
+
+def _feature_hash(feature: str) -> int:
+    """Stable 64-bit hash of a feature"""
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+
+def simhash(text: str) -> int:
+    """
+    Compute a 64-bit SimHash over word unigrams and bigrams
+
+    Texts that share most of their features get fingerprints that differ in
+    only a few bits.
+    """
+    tokens = normalize_text(text)
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    if not features:
+        return 0
+
+    hashes = np.fromiter((_feature_hash(f) for f in features), dtype=np.uint64, count=len(features))
+    bits = (hashes[:, None] >> _BIT_POSITIONS) & np.uint64(1)
+    votes = (bits.astype(np.int32) * 2 - 1).sum(axis=0)
+    return int(((votes > 0).astype(np.uint64) << _BIT_POSITIONS).sum())
+
+class NearDuplicateDetector:
+    """
+    In-memory SimHash index with banded LSH lookup.
+
+    The fingerprint is split into max_distance + 1 bands, so by the pigeonhole
+    principle any fingerprint within max_distance bits of a stored one shares
+    at least one band with it. Only entries in matching band buckets are
+    compared exactly. The oldest entries are evicted beyond max_entries.
+
+    With `window_seconds`, a message only counts as a duplicate of one seen
+    at most that long ago: the scope is extended with the time window, and
+    older entries are evicted.
+    """
+
+    def __init__(self, max_distance: int = 3, max_entries: int = 100000,
+                 window_seconds: Optional[float] = None):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.window_seconds = window_seconds
+        self.band_count = max_distance + 1
+        self.band_bits = FINGERPRINT_BITS // self.band_count
+        self._buckets: Dict[Tuple, List[int]] = defaultdict(list)
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_id = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _band_keys(self, scope: str, fingerprint: int) -> List[Tuple]:
+        mask = (1 << self.band_bits) - 1
+        return [
+            (scope, band, (fingerprint >> (band * self.band_bits)) & mask)
+            for band in range(self.band_count)
+        ]
+
+    def _windowed_scopes(self, scope: str, now: float) -> List[str]:
+        """Scope to store under, then the previous window's scope to also search"""
+        if self.window_seconds is None:
+            return [scope]
+        window = int(now // self.window_seconds)
+        return [f"{scope}@{window}", f"{scope}@{window - 1}"]
+
+    def _expire(self, now: float):
+        if self.window_seconds is None:
+            return
+        # Entries are kept in insertion order, so the oldest are first
+        while self._entries:
+            entry_id, entry = next(iter(self._entries.items()))
+            if now - entry.get("added_at", 0) <= self.window_seconds:
+                break
+            self._evict(entry_id)
+
+    def _find(self, scope: str, fingerprint: int, now: float) -> Optional[Dict[str, Any]]:
+        for windowed_scope in self._windowed_scopes(scope, now):
+            for key in self._band_keys(windowed_scope, fingerprint):
+                for entry_id in self._buckets.get(key, ()):
+                    entry = self._entries[entry_id]
+                    if (entry["fingerprint"] ^ fingerprint).bit_count() <= self.max_distance:
+                        return entry
+        return None
+
+    def find(self, text: str, scope: str = "", now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Find a stored near-duplicate of the text within the same scope
+
+        Returns:
+            The matching entry, or None
+        """
+        now = time.time() if now is None else now
+        self._expire(now)
+        return self._find(scope, simhash(text), now)
+
+    def find_or_add(self, text: str, scope: str = "", now: Optional[float] = None) -> Tuple[Dict[str, Any], bool]:
+        """
+        Find a near-duplicate of the text, storing the text if there is none
+
+        Returns:
+            Tuple of (matching or new entry, whether it was a duplicate)
+        """
+        now = time.time() if now is None else now
+        self._expire(now)
+        fingerprint = simhash(text)
+        original = self._find(scope, fingerprint, now)
+        if original is not None:
+            return original, True
+
+        entry = {
+            "id": next(self._next_id),
+            "scope": self._windowed_scopes(scope, now)[0],
+            "fingerprint": fingerprint,
+            "added_at": now,
+            "duplicate_count": 0,
+            "vector_id": None
+        }
+        self._entries[entry["id"]] = entry
+        for key in self._band_keys(entry["scope"], fingerprint):
+            self._buckets[key].append(entry["id"])
+
+        while len(self._entries) > self.max_entries:
+            self._evict(next(iter(self._entries)))
+        return entry, False
+
+    def get(self, entry_id: int) -> Optional[Dict[str, Any]]:
+        """Get a stored entry by ID"""
+        return self._entries.get(entry_id)
+
+    def remove(self, entry_id: int):
+        """Forget a stored fingerprint"""
+        if entry_id in self._entries:
+            self._evict(entry_id)
+
+    def _evict(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        for key in self._band_keys(entry["scope"], entry["fingerprint"]):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.remove(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def dump(self) -> List[Dict[str, Any]]:
+        """Copy out stored entries, oldest first, e.g. for a snapshot"""
+        return [dict(entry) for entry in self._entries.values()]
+
+    def restore(self, entries):
+        """Replace stored entries with ones produced by `dump`"""
+        self.clear()
+        next_id = 0
+        for entry in entries:
+            self._entries[entry["id"]] = entry
+            for key in self._band_keys(entry["scope"], entry["fingerprint"]):
+                self._buckets[key].append(entry["id"])
+            next_id = max(next_id, entry["id"] + 1)
+        self._next_id = itertools.count(next_id)
+
+    def clear(self):
+        """Forget all fingerprints"""
+        self._buckets.clear()
+        self._entries.clear()
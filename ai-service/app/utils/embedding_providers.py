@@ -0,0 +1,144 @@
+from typing import Dict, List, Tuple
+from abc import ABC, abstractmethod
+import asyncio
+import re
+import zlib
+import numpy as np
+from langchain_openai import OpenAIEmbeddings
+
+from .resilience import get_dependency
+from ..config import get_settings
+
+settings = get_settings()
+
+class EmbeddingProvider(ABC):
+    """Interface for embedding backends"""
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+
+    @abstractmethod
+    async def embed_documents(self, texts: List[str]) -> np.ndarray:
+        """Embed texts into a float32 matrix of shape (len(texts), dimensions)"""
+
+    @abstractmethod
+    async def embed_query(self, text: str) -> np.ndarray:
+        """Embed a single query into a float32 vector"""
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """text-embedding-3-small through langchain, under the openai_embeddings policy"""
+
+    def __init__(self, dimensions: int):
+        super().__init__(dimensions)
+        self.model = OpenAIEmbeddings(
+            model="text-embedding-3-small",
+            openai_api_key=settings.openai_api_key,
+            dimensions=dimensions,  # Matches our Pinecone index unless coarse_dimensions is set
+            max_retries=0,  # Retries are handled by the resilience layer
+        )
+
+    async def embed_documents(self, texts: List[str]) -> np.ndarray:
+        vectors = await get_dependency("openai_embeddings").call(self.model.aembed_documents, texts)
+        return np.asarray(vectors, dtype=np.float32).reshape(len(texts), self.dimensions)
+
+    async def embed_query(self, text: str) -> np.ndarray:
+        dependency = get_dependency("openai_embeddings")
+        if settings.query_embedding_hedge_ms is not None:
+            # Query embeddings are on the request path, so hedge slow calls
+            vector = await dependency.hedged_call(
+                settings.query_embedding_hedge_ms / 1000, self.model.aembed_query, text
+            )
+        else:
+            vector = await dependency.call(self.model.aembed_query, text)
+        return np.asarray(vector, dtype=np.float32)
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Local, network-free embedder using signed feature hashing.
+
+    Each text is represented by its lowercased words plus character n-grams
+    of each word, hashed with CRC32 into a fixed number of buckets with a
+    hash-derived sign, then L2-normalized. Similar wording gives similar
+    vectors, which is enough for development, CI and load testing.
+    """
+
+    WORD_PATTERN = re.compile(r"\w+")
+
+    # Words whose hashed features are remembered; chat vocabulary repeats a lot
+    MAX_CACHED_WORDS = 100000
+
+    def __init__(self, dimensions: int, ngram_range: tuple = (3, 5), ngram_weight: float = 0.5):
+        super().__init__(dimensions)
+        self.ngram_range = ngram_range
+        self.ngram_weight = ngram_weight
+        self._word_cache: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def _word_features(self, word: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Get (bucket indices, signed weights) for a word and its n-grams"""
+        cached = self._word_cache.get(word)
+        if cached is not None:
+            return cached
+
+        features = [(f"w:{word}", 1.0)]
+        padded = f"<{word}>"
+        min_n, max_n = self.ngram_range
+        for n in range(min_n, max_n + 1):
+            for start in range(len(padded) - n + 1):
+                features.append((padded[start:start + n], self.ngram_weight))
+
+        buckets = np.empty(len(features), dtype=np.int64)
+        weights = np.empty(len(features), dtype=np.float64)
+        for i, (feature, weight) in enumerate(features):
+            digest = zlib.crc32(feature.encode("utf-8"))
+            buckets[i] = (digest >> 1) % self.dimensions
+            weights[i] = weight if digest & 1 else -weight
+
+        if len(self._word_cache) < self.MAX_CACHED_WORDS:
+            self._word_cache[word] = (buckets, weights)
+        return buckets, weights
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """Hash all texts into one matrix with a single bincount"""
+        index_parts = []
+        weight_parts = []
+        for row, text in enumerate(texts):
+            offset = row * self.dimensions
+            for word in self.WORD_PATTERN.findall(text.lower()):
+                buckets, weights = self._word_features(word)
+                index_parts.append(buckets + offset)
+                weight_parts.append(weights)
+
+        matrix = np.zeros(len(texts) * self.dimensions, dtype=np.float64)
+        if index_parts:
+            matrix = np.bincount(
+                np.concatenate(index_parts),
+                weights=np.concatenate(weight_parts),
+                minlength=len(texts) * self.dimensions
+            )
+        matrix = matrix.astype(np.float32).reshape(len(texts), self.dimensions)
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    async def embed_documents(self, texts: List[str]) -> np.ndarray:
+        # Large batches are CPU bound, so keep them off the event loop
+        return await asyncio.to_thread(self._embed, texts)
+
+    async def embed_query(self, text: str) -> np.ndarray:
+        return self._embed([text])[0]
+
+EMBEDDING_PROVIDERS = {
+    "openai": OpenAIEmbeddingProvider,
+    "hashing": HashingEmbeddingProvider,
+}
+
+_provider = None
+
+def get_embedding_provider() -> EmbeddingProvider:
+    """Get the embedding provider selected by settings.embedding_provider"""
+    global _provider
+    if _provider is None:
+        if settings.embedding_provider not in EMBEDDING_PROVIDERS:
+            raise ValueError(f"Unknown embedding provider: {settings.embedding_provider}")
+        _provider = EMBEDDING_PROVIDERS[settings.embedding_provider](settings.embedding_dimensions)
+    return _provider
@@ -1,17 +1,12 @@
-from langchain_openai import OpenAIEmbeddings
 from typing import List
-import base64
+import numpy as np
+from .embedding_providers import get_embedding_provider
 from ..config import get_settings
 
 settings = get_settings()
 
-def get_embeddings_model() -> OpenAIEmbeddings:
-    """Get the embeddings model instance"""
-    return OpenAIEmbeddings(
-        model="text-embedding-3-small",
-        openai_api_key=settings.openai_api_key,
-        dimensions=1536,  # Matches our Pinecone index
-    )
+# Full embedding size; 1536 for text-embedding-3-small
+FULL_DIMENSIONS = settings.embedding_dimensions
 
 async def get_embeddings(texts: List[str]) -> List[List[float]]:
     """
@@ -23,10 +18,24 @@ async def get_embeddings(texts: List[str]) -> List[List[float]]:
     Returns:
         List of embedding vectors
     """
-    embeddings = get_embeddings_model()
-    return await embeddings.aembed_documents(texts)
+    return (await get_embeddings_array(texts)).tolist()
 
-async def get_query_embedding(text: str) -> List[float]:
+async def get_embeddings_array(texts: List[str]) -> np.ndarray:
+    """
+    Get embeddings for a list of texts as a float32 matrix
+
+    Prefer this over get_embeddings when the vectors are kept around, since
+    a float32 row takes 4 bytes per component instead of a boxed Python float.
+    
+    Args:
+        texts: List of texts to embed
+        
+    Returns:
+        Matrix of shape (len(texts), dimensions)
+    """
+    return await get_embedding_provider().embed_documents(texts)
+
+async def get_query_embedding(text: str) -> np.ndarray:
     """
     Get embedding for a single query text
     
@@ -34,7 +43,24 @@ async def get_query_embedding(text: str) -> List[float]:
         text: Text to embed
         
     Returns:
-        Embedding vector
+        float32 embedding vector
+    """
+    return await get_embedding_provider().embed_query(text)
+
+def truncate_embeddings(embeddings: np.ndarray, dimensions: int) -> np.ndarray:
+    """
+    Truncate embeddings to their first `dimensions` components
+
+    text-embedding-3 models are trained so that a prefix of the vector is
+    itself a usable embedding once re-normalized to unit length.
+
+    Args:
+        embeddings: Vector or matrix of embeddings
+        dimensions: Number of leading components to keep
+
+    Returns:
+        Truncated, L2-normalized float32 embeddings
     """
-    embeddings = get_embeddings_model()
-    return await embeddings.aembed_query(text) 
\ No newline at end of file
+    truncated = np.asarray(embeddings, dtype=np.float32)[..., :dimensions]
+    norms = np.linalg.norm(truncated, axis=-1, keepdims=True)
+    return truncated / np.maximum(norms, 1e-12)
@@ -5,6 +5,7 @@ import magic
 import os
 import logging
 import json
+from .profiling import stage
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -23,14 +24,16 @@ async def extract_text_from_pdf(file_content: bytes) -> str:
     
     try:
         # Create PDF reader object
-        reader = PyPDF2.PdfReader(pdf_file)
-        logger.info(f"PDF has {len(reader.pages)} pages")
+        with stage("pdf_parse"):
+            reader = PyPDF2.PdfReader(pdf_file)
+            logger.info(f"PDF has {len(reader.pages)} pages")
         
         # Extract text from all pages
         text_content = []
         total_text_size = 0
         for i, page in enumerate(reader.pages):
-            text = page.extract_text()
+            with stage("pdf_extract_page"):
+                text = page.extract_text()
             if text:
                 text_content.append(text.strip())
                 total_text_size += len(text.encode('utf-8'))
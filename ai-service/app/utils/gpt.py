@@ -1,7 +1,8 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 import os
 import logging
 from openai import AsyncOpenAI
+from .resilience import get_dependency
 from ..config import get_settings
 
 logger = logging.getLogger(__name__)
@@ -13,7 +14,8 @@ if settings.openai_api_key:
 
 # Initialize OpenAI client with project-scoped key
 client = AsyncOpenAI(
-    api_key=settings.openai_api_key
+    api_key=settings.openai_api_key,
+    max_retries=0  # Retries are handled by the resilience layer
 )
 
 SYSTEM_PROMPT = """You are a helpful AI assistant that answers questions based on the provided context.
@@ -25,6 +27,10 @@ Your answers should be:
 
 If the context doesn't contain enough information to answer the question, say so clearly."""
 
+SUMMARY_PROMPT = """You summarize chat history for a search index.
+Write a concise summary of the messages that keeps decisions, answers, names,
+dates and other facts someone might search for later. Do not add information."""
+
 async def format_context(results: List[Dict[str, Any]]) -> str:
     """Format search results into a context string for GPT"""
     context_parts = []
@@ -36,24 +42,54 @@ async def format_context(results: List[Dict[str, Any]]) -> str:
     
     return "\n".join(context_parts)
 
-async def generate_response(query: str, context: str) -> str:
-    """Generate a response using GPT based on the query and context"""
+async def generate_response_with_usage(query: str, context: str) -> Tuple[str, int]:
+    """
+    Generate a response using GPT based on the query and context
+
+    Returns:
+        Tuple of (response text, total tokens used)
+    """
     messages = [
         {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {query}"}
     ]
     
-    response = await client.chat.completions.create(
+    response = await get_dependency("openai_chat").call(
+        client.chat.completions.create,
         model="gpt-4-turbo-preview",
         messages=messages,
         temperature=0.7,
         max_tokens=500
     )
     
-    return response.choices[0].message.content
+    total_tokens = response.usage.total_tokens if response.usage else 0
+    return response.choices[0].message.content, total_tokens
+
+async def generate_response(query: str, context: str) -> str:
+    """Generate a response using GPT based on the query and context"""
+    response, _ = await generate_response_with_usage(query, context)
+    return response
+
+async def process_query_with_usage(query: str, search_results: List[Dict[str, Any]]) -> Tuple[str, int]:
+    """Process a query and also return the total tokens used"""
+    context = await format_context(search_results)
+    return await generate_response_with_usage(query, context)
 
 async def process_query(query: str, search_results: List[Dict[str, Any]]) -> str:
     """Process a query using the search results to generate a response"""
-    context = await format_context(search_results)
-    response = await generate_response(query, context)
-    return response 
\ No newline at end of file
+    response, _ = await process_query_with_usage(query, search_results)
+    return response
+
+async def summarize_messages(messages: List[str]) -> str:
+    """Summarize chat messages into a short text that can replace them in the index"""
+    response = await get_dependency("openai_chat").call(
+        client.chat.completions.create,
+        model="gpt-4-turbo-preview",
+        messages=[
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": "\n".join(messages)}
+        ],
+        temperature=0.2,
+        max_tokens=500
+    )
+    return response.choices[0].message.content
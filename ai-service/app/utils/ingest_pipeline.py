@@ -0,0 +1,224 @@
+from typing import AsyncIterator, Dict, Any, List, Optional
+import asyncio
+import json
+import logging
+import uuid
+from datetime import datetime
+
+from .vector_store import get_pinecone, chunk_text, build_chunk_metadata, embed_window, upsert_window
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stage's output
+_DONE = object()
+
+# Keep only the most recent errors in the status view
+MAX_REPORTED_ERRORS = 20
+
+class StreamingIngestor:
+    """
+    Ingest an NDJSON stream of {"text": ..., "metadata": {...}} records.
+
+    Records are parsed as the body arrives and pipelined through chunking,
+    embedding and upsert stages connected by bounded queues, so memory use
+    depends on the queue sizes rather than on the size of the upload.
+    """
+
+    def __init__(self,
+                 job_id: str,
+                 start_offset: int = 0,
+                 batch_size: int = 64,
+                 queue_size: int = 8):
+        self.job_id = job_id
+        self.start_offset = start_offset
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+
+        # Progress tracking
+        self.state = "pending"
+        self.records_read = 0
+        self.records_invalid = 0
+        self.records_total: Optional[int] = None
+        self.chunks_embedded = 0
+        self.vectors_upserted = 0
+        self.checkpoint = start_offset
+        self.errors: List[str] = []
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+
+    def _record_error(self, message: str):
+        """Remember an error for the status view"""
+        logger.warning(f"Ingest job {self.job_id}: {message}")
+        self.errors.append(message)
+        del self.errors[:-MAX_REPORTED_ERRORS]
+
+    async def _read_records(self, byte_stream: AsyncIterator[bytes], record_queue: asyncio.Queue):
+        """Split the byte stream into lines and parse records incrementally"""
+        buffer = bytearray()
+        record_no = 0
+
+        async def handle_line(line: bytes):
+            nonlocal record_no
+            line = line.strip()
+            if not line:
+                return
+
+            current = record_no
+            record_no += 1
+            if current < self.start_offset:
+                # Already ingested by a previous attempt
+                return
+
+            self.records_read += 1
+            try:
+                record = json.loads(line)
+                text = record["text"]
+                metadata = record.get("metadata") or {}
+                if not isinstance(text, str):
+                    raise ValueError("'text' must be a string")
+                if not isinstance(metadata, dict):
+                    raise ValueError("'metadata' must be an object")
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                self.records_invalid += 1
+                self._record_error(f"Record {current} skipped: {str(e)}")
+                return
+
+            await record_queue.put((current, text, metadata))
+
+        async for piece in byte_stream:
+            buffer.extend(piece)
+            while True:
+                newline = buffer.find(b"\n")
+                if newline < 0:
+                    break
+                line = bytes(buffer[:newline])
+                del buffer[:newline + 1]
+                await handle_line(line)
+
+        if buffer:
+            await handle_line(bytes(buffer))
+
+        self.records_total = record_no
+        await record_queue.put(_DONE)
+
+    async def _chunk_records(self, record_queue: asyncio.Queue, chunk_queue: asyncio.Queue):
+        """Split each record into chunks with their metadata"""
+        while True:
+            item = await record_queue.get()
+            if item is _DONE:
+                await chunk_queue.put(_DONE)
+                return
+
+            record_no, text, metadata = item
+            chunks = chunk_text(text)
+            for j, chunk in enumerate(chunks):
+                is_last = j == len(chunks) - 1
+                chunk_metadata = build_chunk_metadata(metadata, chunk, j, len(chunks))
+                await chunk_queue.put((record_no, is_last, chunk, chunk_metadata))
+
+    async def _embed_batches(self, chunk_queue: asyncio.Queue, vector_queue: asyncio.Queue):
+        """Embed chunks in batches of up to batch_size"""
+        done = False
+        while not done:
+            item = await chunk_queue.get()
+            if item is _DONE:
+                break
+
+            # Take whatever else is already waiting, up to the batch size
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = chunk_queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if item is _DONE:
+                    done = True
+                    break
+                batch.append(item)
+
+            embeddings = await embed_window([chunk for _, _, chunk, _ in batch])
+            self.chunks_embedded += len(batch)
+            await vector_queue.put((batch, embeddings))
+
+        await vector_queue.put(_DONE)
+
+    async def _upsert_batches(self, vector_queue: asyncio.Queue):
+        """Upsert embedded batches and advance the checkpoint"""
+        _, index = get_pinecone()
+        while True:
+            item = await vector_queue.get()
+            if item is _DONE:
+                return
+
+            batch, embeddings = item
+            ids = [str(uuid.uuid4()) for _ in batch]
+            await upsert_window(index, ids, embeddings, [metadata for _, _, _, metadata in batch])
+            self.vectors_upserted += len(ids)
+
+            # Everything before the last record in the batch is fully upserted,
+            # and the last record is too if its final chunk was included
+            record_no, is_last, _, _ = batch[-1]
+            self.checkpoint = max(self.checkpoint, record_no + 1 if is_last else record_no)
+            logger.info(
+                f"Ingest job {self.job_id}: upserted {self.vectors_upserted} vectors, "
+                f"checkpoint at record {self.checkpoint}"
+            )
+
+    async def run(self, byte_stream: AsyncIterator[bytes]) -> Dict[str, Any]:
+        """
+        Run the pipeline over the given byte stream
+
+        Args:
+            byte_stream: Async iterator of raw NDJSON bytes
+
+        Returns:
+            Final job status
+        """
+        self.state = "running"
+        self.started_at = datetime.now()
+
+        record_queue = asyncio.Queue(maxsize=self.queue_size * self.batch_size)
+        chunk_queue = asyncio.Queue(maxsize=self.queue_size * self.batch_size)
+        vector_queue = asyncio.Queue(maxsize=self.queue_size)
+
+        tasks = [
+            asyncio.create_task(self._read_records(byte_stream, record_queue)),
+            asyncio.create_task(self._chunk_records(record_queue, chunk_queue)),
+            asyncio.create_task(self._embed_batches(chunk_queue, vector_queue)),
+            asyncio.create_task(self._upsert_batches(vector_queue)),
+        ]
+
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException as e:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.state = "failed"
+            self.finished_at = datetime.now()
+            self._record_error(f"Ingestion stopped: {str(e)}")
+            raise
+
+        # Trailing empty or invalid records need no further work
+        self.checkpoint = max(self.checkpoint, self.records_total or 0)
+        self.state = "complete"
+        self.finished_at = datetime.now()
+        logger.info(f"Ingest job {self.job_id} complete: {self.get_status()}")
+        return self.get_status()
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get current ingestion progress"""
+        return {
+            "job_id": self.job_id,
+            "state": self.state,
+            "start_offset": self.start_offset,
+            "checkpoint": self.checkpoint,
+            "records_read": self.records_read,
+            "records_invalid": self.records_invalid,
+            "chunks_embedded": self.chunks_embedded,
+            "vectors_upserted": self.vectors_upserted,
+            "errors": list(self.errors),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -0,0 +1,506 @@
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+import uuid
+
+import httpx
+import numpy as np
+
+BASE_URL = "http://localhost:8000"
+
+# Share of events per endpoint in synthetic traces
+DEFAULT_MIX = {"realtime": 0.85, "file": 0.02, "query": 0.13}
+
+# Targets checked when no SLO file is given; latencies are measured from
+# each request's scheduled send time, so client-side queueing counts
+DEFAULT_SLOS = {
+    "realtime": {"p99_ms": 500, "error_rate": 0.001},
+    "file": {"p95_ms": 10000, "error_rate": 0.01},
+    "query": {"p95_ms": 3000, "p99_ms": 6000, "error_rate": 0.01},
+    "prefetch": {"p99_ms": 200, "error_rate": 0.01},
+    "queue_lag_seconds": {"p95": 30, "max": 120}
+}
+
+PERCENTILES = (50, 90, 95, 99)
+
+TOPICS = [
+    ("deploy", ["the staging deploy", "the release pipeline", "a rollback", "the canary", "build 4182"]),
+    ("support", ["the customer ticket", "a refund request", "the login bug", "the escalation", "the SLA"]),
+    ("design", ["the new sidebar", "dark mode", "the onboarding flow", "icon sizes", "the mockups"]),
+    ("planning", ["the Q3 roadmap", "sprint scope", "the hiring plan", "the offsite", "OKRs"]),
+    ("random", ["lunch", "the coffee machine", "weekend plans", "the team photo", "a podcast"])
+]
+MESSAGE_TEMPLATES = [
+    "Has anyone looked at {subject} yet?",
+    "I think {subject} is ready, can someone double check?",
+    "Quick update: {subject} is blocked on review",
+    "{subject} went fine, thanks everyone",
+    "Can we talk about {subject} in standup tomorrow?",
+    "Heads up, {subject} slipped to next week",
+    "Notes from the call about {subject}: agreed to revisit after the metrics come in"
+]
+QUERY_TEMPLATES = [
+    "What is the status of {subject}?",
+    "Who is working on {subject}?",
+    "Summarize the discussion about {subject}",
+    "When was {subject} last mentioned?"
+]
+
+def _channel_weights(channels: int, skew: float) -> List[float]:
+    """Zipf-like popularity: a few busy channels and a long quiet tail"""
+    return [1 / (rank + 1) ** skew for rank in range(channels)]
+
+def _rate_at(t: float, rate: float, amplitude: float, period_seconds: float) -> float:
+    """Arrival rate following a daily-style wave, compressed into period_seconds"""
+    return rate * (1 + amplitude * math.sin(2 * math.pi * t / period_seconds))
+
+def generate_trace(duration_seconds: float,
+                   rate: float = 5.0,
+                   channels: int = 20,
+                   mix: Optional[Dict[str, float]] = None,
+                   channel_skew: float = 1.1,
+                   wave_amplitude: float = 0.5,
+                   wave_period_seconds: float = 120,
+                   bursts_per_minute: float = 2,
+                   burst_factor: float = 8,
+                   burst_seconds: float = 5,
+                   prefetch: bool = False,
+                   seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Generate a synthetic chat trace
+
+    Background traffic arrives as a Poisson process whose rate follows a
+    sine wave around `rate` events per second. On top of it, bursts start at
+    random (`bursts_per_minute`) and flood one channel with messages at
+    `burst_factor` times the base rate for `burst_seconds`, like an incident
+    thread. With `prefetch`, each query is preceded by prefetches of its
+    partial text as if typed over the previous two seconds.
+
+    Returns:
+        Events sorted by offset "t" in seconds
+    """
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    kinds, kind_weights = zip(*mix.items())
+    weights = _channel_weights(channels, channel_skew)
+    channel_topics = [TOPICS[rng.randrange(len(TOPICS))] for _ in range(channels)]
+    events = []
+
+    def event(kind: str, t: float, channel: int) -> Dict[str, Any]:
+        topic, subjects = channel_topics[channel]
+        subject = rng.choice(subjects)
+        channel_id = f"{topic}-{channel}"
+        if kind == "realtime":
+            return {"t": t, "type": kind, "channel_id": channel_id,
+                    "text": rng.choice(MESSAGE_TEMPLATES).format(subject=subject),
+                    "user_id": f"user-{rng.randrange(channels * 5)}"}
+        if kind == "file":
+            lines = [rng.choice(MESSAGE_TEMPLATES).format(subject=rng.choice(subjects)) for _ in range(rng.randint(20, 400))]
+            return {"t": t, "type": kind, "channel_id": channel_id,
+                    "filename": f"{topic}-notes-{rng.randrange(10 ** 6)}.txt", "text": "\n".join(lines)}
+        return {"t": t, "type": kind, "channel_id": channel_id,
+                "text": rng.choice(QUERY_TEMPLATES).format(subject=subject),
+                "scoped": rng.random() < 0.5}
+
+    # Background traffic by thinning a Poisson process at the peak rate
+    peak = rate * (1 + abs(wave_amplitude))
+    t = 0.0
+    while True:
+        t += rng.expovariate(peak)
+        if t >= duration_seconds:
+            break
+        if rng.random() * peak <= _rate_at(t, rate, wave_amplitude, wave_period_seconds):
+            kind = rng.choices(kinds, kind_weights)[0]
+            events.append(event(kind, t, rng.choices(range(channels), weights)[0]))
+
+    # Bursts of messages in one channel
+    t = 0.0
+    while bursts_per_minute > 0:
+        t += rng.expovariate(bursts_per_minute / 60)
+        if t >= duration_seconds:
+            break
+        channel = rng.choices(range(channels), weights)[0]
+        burst_t = t
+        end = min(t + burst_seconds, duration_seconds)
+        while True:
+            burst_t += rng.expovariate(rate * burst_factor)
+            if burst_t >= end:
+                break
+            events.append(event("realtime", burst_t, channel))
+
+    # Partial query text sent while typing
+    if prefetch:
+        for query in [e for e in events if e["type"] == "query"]:
+            query["session_id"] = uuid.UUID(int=rng.getrandbits(128)).hex
+            for share, lead in ((0.5, 2.0), (0.8, 1.0)):
+                events.append({
+                    **query,
+                    "t": max(0.0, query["t"] - lead),
+                    "type": "prefetch",
+                    "text": query["text"][:int(len(query["text"]) * share)]
+                })
+
+    events.sort(key=lambda e: e["t"])
+    return events
+
+def load_trace(path: str) -> List[Dict[str, Any]]:
+    """
+    Read a recorded trace: one JSON event per line
+
+    Events need a "type" (realtime, file, query or prefetch), "text", and
+    either an offset "t" in seconds or an epoch "ts"; "channel_id",
+    "user_id", "filename", "session_id" and "scoped" are optional.
+    """
+    events = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                events.append(json.loads(line))
+    if events and "t" not in events[0]:
+        start = min(e["ts"] for e in events)
+        for e in events:
+            e["t"] = e["ts"] - start
+    events.sort(key=lambda e: e["t"])
+    return events
+
+def save_trace(events: List[Dict[str, Any]], path: str):
+    """Write a trace in the format read by load_trace"""
+    with open(path, "w") as f:
+        for e in events:
+            f.write(json.dumps(e) + "\n")
+
+async def send_event(client: httpx.AsyncClient, event: Dict[str, Any]) -> httpx.Response:
+    """Issue the request an event stands for"""
+    kind = event["type"]
+    if kind == "realtime":
+        return await client.post("/index/realtime", json={
+            "texts": [event["text"]],
+            "metadata": [{
+                "channel_id": event.get("channel_id"),
+                "user_id": event.get("user_id"),
+                "source": "chat",
+                "timestamp": time.time()
+            }]
+        })
+    if kind == "file":
+        return await client.post("/index/file", files={
+            "file": (event.get("filename", "upload.txt"), event["text"].encode("utf-8"), "text/plain")
+        })
+
+    body = {"query": event["text"]}
+    if event.get("scoped") and event.get("channel_id"):
+        body["filter"] = {"channel_id": {"$eq": event["channel_id"]}}
+    if event.get("session_id"):
+        body["session_id"] = event["session_id"]
+    if kind == "prefetch":
+        return await client.post("/query/prefetch", json=body)
+    body["include_results"] = False
+    return await client.post("/query", json=body)
+
+def is_drained(status: Dict[str, Any]) -> bool:
+    """Whether a /status/processing response shows every queued message indexed"""
+    packing = status.get("packing") or {}
+    return (status["queue_size"] == 0 and not status.get("in_flight") and not status["is_processing"]
+            and not packing.get("pending_windows"))
+
+async def sample_status(client: httpx.AsyncClient, samples: List[Dict[str, Any]],
+                        start: float, interval_seconds: float):
+    """Record ingestion queue depth and lag until cancelled"""
+    while True:
+        try:
+            response = await client.get("/status/processing")
+            if response.status_code == 200:
+                status = response.json()
+                samples.append({
+                    "t": time.perf_counter() - start,
+                    "queue_size": status["queue_size"],
+                    "drained": is_drained(status),
+                    "queue_lag_seconds": status.get("queue_lag_seconds"),
+                    "processed_count": status["processed_count"],
+                    "failed_count": status["failed_count"]
+                })
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(interval_seconds)
+
+async def replay(client: httpx.AsyncClient,
+                 events: List[Dict[str, Any]],
+                 scale: float = 1.0,
+                 max_concurrency: int = 200,
+                 status_interval_seconds: float = 1.0,
+                 drain_timeout_seconds: float = 60) -> Dict[str, Any]:
+    """
+    Replay a trace open-loop and collect raw measurements
+
+    Each event is sent at its offset divided by `scale`, whether or not
+    earlier requests have finished. Latency is measured from that scheduled
+    time, so requests stuck behind the concurrency limit or a slow server
+    are not under-reported. After the last response, queue status keeps
+    being sampled until the ingestion queue drains or the timeout passes.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    records = []
+    samples: List[Dict[str, Any]] = []
+    start = time.perf_counter()
+    max_send_delay = 0.0
+
+    async def fire(event: Dict[str, Any], scheduled: float):
+        async with semaphore:
+            sent = time.perf_counter()
+            try:
+                response = await send_event(client, event)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            done = time.perf_counter()
+        records.append({
+            "type": event["type"],
+            "status": status,
+            "latency_ms": (done - scheduled) * 1000,
+            "service_ms": (done - sent) * 1000,
+            "completed_at": done - start
+        })
+
+    sampler = asyncio.create_task(sample_status(client, samples, start, status_interval_seconds))
+    try:
+        tasks = []
+        for event in events:
+            scheduled = start + event["t"] / scale
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                max_send_delay = max(max_send_delay, -delay)
+            tasks.append(asyncio.create_task(fire(event, scheduled)))
+        await asyncio.gather(*tasks)
+        traffic_seconds = time.perf_counter() - start
+
+        # Let the ingestion queue drain
+        drain_start = time.perf_counter()
+        drain_seconds = None
+        while time.perf_counter() - drain_start < drain_timeout_seconds:
+            await asyncio.sleep(status_interval_seconds)
+            if samples and samples[-1]["t"] > drain_start - start and samples[-1]["drained"]:
+                drain_seconds = time.perf_counter() - drain_start
+                break
+    finally:
+        sampler.cancel()
+        try:
+            await sampler
+        except asyncio.CancelledError:
+            pass
+
+    return {
+        "records": records,
+        "samples": samples,
+        "traffic_seconds": traffic_seconds,
+        "drain_seconds": drain_seconds,
+        "max_send_delay_ms": max_send_delay * 1000
+    }
+
+def _distribution(values: List[float], suffix: str = "") -> Dict[str, Optional[float]]:
+    if not values:
+        return {f"p{p}{suffix}": None for p in PERCENTILES} | {f"mean{suffix}": None, f"max{suffix}": None}
+    array = np.asarray(values, dtype=np.float64)
+    summary = {f"p{p}{suffix}": round(float(np.percentile(array, p)), 3) for p in PERCENTILES}
+    summary[f"mean{suffix}"] = round(float(array.mean()), 3)
+    summary[f"max{suffix}"] = round(float(array.max()), 3)
+    return summary
+
+def summarize(run: Dict[str, Any]) -> Dict[str, Any]:
+    """Throughput, latency percentiles and queue lag from a replay"""
+    duration = run["traffic_seconds"]
+    endpoints = {}
+    for kind in sorted({record["type"] for record in run["records"]}):
+        records = [r for r in run["records"] if r["type"] == kind]
+        errors = [r for r in records if not (isinstance(r["status"], int) and r["status"] < 400)]
+        statuses: Dict[str, int] = {}
+        for r in records:
+            statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+        endpoints[kind] = {
+            "requests": len(records),
+            "errors": len(errors),
+            "error_rate": round(len(errors) / len(records), 5),
+            "throughput_rps": round(len(records) / duration, 3) if duration else None,
+            "latency": _distribution([r["latency_ms"] for r in records], "_ms"),
+            "service_latency": _distribution([r["service_ms"] for r in records], "_ms"),
+            "status_codes": statuses
+        }
+
+    samples = run["samples"]
+    lags = [s["queue_lag_seconds"] for s in samples if s["queue_lag_seconds"] is not None]
+    processed = None
+    if len(samples) >= 2 and samples[-1]["t"] > samples[0]["t"]:
+        processed = round((samples[-1]["processed_count"] - samples[0]["processed_count"])
+                          / (samples[-1]["t"] - samples[0]["t"]), 3)
+    return {
+        "traffic_seconds": round(duration, 3),
+        "max_send_delay_ms": round(run["max_send_delay_ms"], 3),
+        "total": {
+            "requests": len(run["records"]),
+            "throughput_rps": round(len(run["records"]) / duration, 3) if duration else None
+        },
+        "endpoints": endpoints,
+        "queue": {
+            "samples": len(samples),
+            "lag": _distribution(lags, "") if lags else None,
+            "max_size": max((s["queue_size"] for s in samples), default=None),
+            "processed_per_second": processed,
+            "failed": samples[-1]["failed_count"] - samples[0]["failed_count"] if samples else None,
+            "drain_seconds": round(run["drain_seconds"], 3) if run["drain_seconds"] is not None else None
+        }
+    }
+
+def check_slos(summary: Dict[str, Any], slos: Dict[str, Dict[str, float]]) -> Dict[str, Any]:
+    """
+    Compare a summary against SLO targets
+
+    Endpoint targets are "pNN_ms", "mean_ms", "max_ms" and "error_rate";
+    "queue_lag_seconds" takes "pNN", "mean" and "max". Targets for
+    endpoints that saw no traffic, or metrics that were not measured, are
+    reported as skipped rather than passed.
+    """
+    checks = []
+    for name, targets in slos.items():
+        for metric, target in targets.items():
+            if name == "queue_lag_seconds":
+                source = summary["queue"]["lag"]
+            else:
+                endpoint = summary["endpoints"].get(name)
+                source = None if endpoint is None else (
+                    {"error_rate": endpoint["error_rate"]} if metric == "error_rate" else endpoint["latency"]
+                )
+            actual = source.get(metric) if source is not None else None
+            checks.append({
+                "slo": name,
+                "metric": metric,
+                "target": target,
+                "actual": actual,
+                "status": "skipped" if actual is None else ("passed" if actual <= target else "failed")
+            })
+    return {
+        "passed": all(check["status"] != "failed" for check in checks),
+        "checks": checks
+    }
+
+def print_report(report: Dict[str, Any]):
+    """Human-readable summary of a report"""
+    summary = report["summary"]
+    print(f"\n=== Load Test ({report['config']['events']} events over {summary['traffic_seconds']:.1f}s, "
+          f"scale {report['config']['scale']}) ===", file=sys.stderr)
+    print(f"{'endpoint':<10} {'requests':>8} {'rps':>8} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}",
+          file=sys.stderr)
+    for kind, endpoint in summary["endpoints"].items():
+        latency = endpoint["latency"]
+        print(f"{kind:<10} {endpoint['requests']:>8} {endpoint['throughput_rps']:>8.2f} {endpoint['errors']:>7} "
+              f"{latency['p50_ms']:>9.1f} {latency['p95_ms']:>9.1f} {latency['p99_ms']:>9.1f}", file=sys.stderr)
+
+    queue = summary["queue"]
+    print("\n=== Ingestion Queue ===", file=sys.stderr)
+    if queue["lag"] is not None:
+        print(f"Lag p50/p95/max: {queue['lag']['p50']:.2f}/{queue['lag']['p95']:.2f}/{queue['lag']['max']:.2f}s",
+              file=sys.stderr)
+    drained = f"{queue['drain_seconds']}s" if queue["drain_seconds"] is not None else "not drained"
+    print(f"Max size: {queue['max_size']}, processed/s: {queue['processed_per_second']}, "
+          f"drained in: {drained}", file=sys.stderr)
+
+    print("\n=== SLOs ===", file=sys.stderr)
+    for check in report["slo"]["checks"]:
+        mark = {"passed": "✅", "failed": "❌", "skipped": "➖"}[check["status"]]
+        print(f"{mark} {check['slo']}.{check['metric']}: {check['actual']} (target {check['target']})", file=sys.stderr)
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Parse "realtime=0.85,file=0.02,query=0.13" """
+    mix = {}
+    for part in value.split(","):
+        kind, share = part.split("=")
+        mix[kind.strip()] = float(share)
+    return mix
+
+async def run_load_test(args) -> Dict[str, Any]:
+    """Build or load the trace, replay it and assemble the report"""
+    if args.trace:
+        events = load_trace(args.trace)
+    else:
+        events = generate_trace(
+            args.duration,
+            rate=args.rate,
+            channels=args.channels,
+            mix=parse_mix(args.mix),
+            bursts_per_minute=args.bursts_per_minute,
+            burst_factor=args.burst_factor,
+            burst_seconds=args.burst_seconds,
+            prefetch=args.prefetch,
+            seed=args.seed
+        )
+    if args.save_trace:
+        save_trace(events, args.save_trace)
+
+    slos = DEFAULT_SLOS
+    if args.slo:
+        with open(args.slo) as f:
+            slos = json.load(f)
+
+    limits = httpx.Limits(max_connections=args.max_concurrency, max_keepalive_connections=args.max_concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        run = await replay(client, events, args.scale, args.max_concurrency,
+                           args.status_interval, args.drain_timeout)
+
+    summary = summarize(run)
+    return {
+        "config": {
+            "base_url": args.base_url,
+            "trace": args.trace or "synthetic",
+            "events": len(events),
+            "scale": args.scale,
+            "max_concurrency": args.max_concurrency,
+            "seed": None if args.trace else args.seed
+        },
+        "summary": summary,
+        "slo": check_slos(summary, slos)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay chat traffic against the AI service and check SLOs")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--trace", help="Recorded trace (JSON lines) to replay instead of a synthetic one")
+    parser.add_argument("--save-trace", help="Write the replayed trace here for later runs")
+    parser.add_argument("--duration", type=float, default=60, help="Synthetic trace length in seconds")
+    parser.add_argument("--rate", type=float, default=5, help="Mean synthetic events per second")
+    parser.add_argument("--channels", type=int, default=20)
+    parser.add_argument("--mix", default=",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()))
+    parser.add_argument("--bursts-per-minute", type=float, default=2)
+    parser.add_argument("--burst-factor", type=float, default=8)
+    parser.add_argument("--burst-seconds", type=float, default=5)
+    parser.add_argument("--prefetch", action="store_true", help="Send /query/prefetch while queries are typed")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scale", type=float, default=1.0, help="Replay speed-up: 2 sends twice the traffic per second")
+    parser.add_argument("--max-concurrency", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--status-interval", type=float, default=1.0)
+    parser.add_argument("--drain-timeout", type=float, default=60)
+    parser.add_argument("--slo", help="JSON file of SLO targets (see DEFAULT_SLOS)")
+    parser.add_argument("--output", help="Write the JSON report here; '-' for stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load_test(args))
+    print_report(report)
+    if args.output == "-":
+        print(json.dumps(report, indent=2))
+    elif args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if report["slo"]["passed"]:
+        print("\n✅ Load test met its SLOs", file=sys.stderr)
+    else:
+        print("\n❌ Load test missed its SLOs", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from pathlib import Path
+import json
+import logging
+import threading
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Storage dtypes and the numpy type used for their codes
+STORAGE_DTYPES = {
+    "float32": np.float32,
+    "float16": np.float16,
+    "int8": np.int8,
+}
+
+# Rows converted to float32 at a time during search
+SEARCH_BLOCK_ROWS = 4096
+
+class LocalVectorStore:
+    """
+    In-process vector store keyed by vector ID.
+
+    Vectors live in one contiguous matrix that grows geometrically, with a
+    dict mapping IDs to rows. Deleted rows are reused by later adds.
+
+    Vectors can be stored as float32, float16, or int8 codes with a float32
+    scale per vector (symmetric quantization to [-127, 127]). numpy has no
+    fast float16 or int8 matrix product, so search converts the codes to
+    float32 block by block: about 10x slower than float32 storage with
+    float16 and 2x with int8, trading search latency for memory.
+
+    If `journal` is set, every change is also passed to its log_add,
+    log_delete and log_clear methods, e.g. to append it to a write-ahead log.
+    """
+
+    def __init__(self, dimensions: int, dtype: str = "float32", initial_capacity: int = 1024):
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Unsupported storage dtype: {dtype}")
+        self.dimensions = dimensions
+        self.dtype = dtype
+        self._codes = np.zeros((initial_capacity, dimensions), dtype=STORAGE_DTYPES[dtype])
+        self._scales = np.ones(initial_capacity, dtype=np.float32)
+        self._rows: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = [None] * initial_capacity
+        self._free_rows: List[int] = []
+        self._size = 0
+        self._lock = threading.Lock()
+        self.journal = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, vector_id: str) -> bool:
+        return vector_id in self._rows
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes used by the vector codes and scales"""
+        return self._codes.nbytes + self._scales.nbytes
+
+    def _grow(self, required: int):
+        """Grow the matrix to hold at least `required` rows"""
+        capacity = len(self._codes)
+        if required <= capacity:
+            return
+        new_capacity = max(required, capacity * 2, 64)
+        codes = np.zeros((new_capacity, self.dimensions), dtype=self._codes.dtype)
+        codes[:self._size] = self._codes[:self._size]
+        scales = np.ones(new_capacity, dtype=np.float32)
+        scales[:self._size] = self._scales[:self._size]
+        self._codes = codes
+        self._scales = scales
+        self._ids.extend([None] * (new_capacity - capacity))
+
+    def _encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Convert float32 vectors to storage codes and per-vector scales"""
+        if self.dtype != "int8":
+            return vectors.astype(self._codes.dtype), np.ones(len(vectors), dtype=np.float32)
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def _decode(self, codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+        """Convert storage codes back to float32 vectors"""
+        vectors = codes.astype(np.float32)
+        if self.dtype == "int8":
+            vectors *= scales[:, None]
+        return vectors
+
+    def add(self, ids: List[str], vectors: np.ndarray):
+        """Add or replace vectors"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[1] != self.dimensions:
+            raise ValueError(f"Expected vectors of dimension {self.dimensions}, got shape {vectors.shape}")
+        codes, scales = self._encode(vectors)
+
+        with self._lock:
+            for vector_id, code, scale in zip(ids, codes, scales):
+                row = self._rows.get(vector_id)
+                if row is None:
+                    if self._free_rows:
+                        row = self._free_rows.pop()
+                    else:
+                        self._grow(self._size + 1)
+                        row = self._size
+                        self._size += 1
+                    self._rows[vector_id] = row
+                    self._ids[row] = vector_id
+                self._codes[row] = code
+                self._scales[row] = scale
+            if self.journal is not None:
+                self.journal.log_add(ids, vectors)
+
+    def get(self, ids: Iterable[str]) -> Tuple[List[str], np.ndarray]:
+        """
+        Get the vectors that are present for the given IDs
+
+        Returns:
+            Tuple of (found IDs, float32 matrix of their vectors)
+        """
+        with self._lock:
+            found = [vector_id for vector_id in ids if vector_id in self._rows]
+            rows = [self._rows[vector_id] for vector_id in found]
+            return found, self._decode(self._codes[rows], self._scales[rows])
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        """
+        Find the k vectors with the highest dot product with the query
+
+        Args:
+            query: Query vector
+            k: Number of results to return
+
+        Returns:
+            List of (ID, score) pairs, best first
+        """
+        query = np.asarray(query, dtype=np.float32)
+        with self._lock:
+            scores = np.full(self._size, -np.inf, dtype=np.float32)
+            # Quantized blocks are converted into one reused float32 buffer
+            buffer = None
+            if self._codes.dtype != np.float32:
+                buffer = np.empty((min(SEARCH_BLOCK_ROWS, self._size), self.dimensions), dtype=np.float32)
+            for start in range(0, self._size, SEARCH_BLOCK_ROWS):
+                end = min(start + SEARCH_BLOCK_ROWS, self._size)
+                block = self._codes[start:end]
+                if buffer is not None:
+                    block = buffer[:end - start]
+                    np.copyto(block, self._codes[start:end])
+                block_scores = block @ query
+                if self.dtype == "int8":
+                    block_scores *= self._scales[start:end]
+                scores[start:end] = block_scores
+
+            # Deleted rows must never be returned
+            if self._free_rows:
+                scores[self._free_rows] = -np.inf
+
+            k = min(k, len(self._rows))
+            if k <= 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self._ids[row], float(scores[row])) for row in top]
+
+    def delete(self, ids: Iterable[str]):
+        """Delete vectors by ID"""
+        ids = list(ids)
+        with self._lock:
+            for vector_id in ids:
+                row = self._rows.pop(vector_id, None)
+                if row is not None:
+                    self._ids[row] = None
+                    self._free_rows.append(row)
+            if self.journal is not None:
+                self.journal.log_delete(ids)
+
+    def clear(self):
+        """Delete all vectors"""
+        with self._lock:
+            self._rows.clear()
+            self._ids = [None] * len(self._codes)
+            self._free_rows = []
+            self._size = 0
+            if self.journal is not None:
+                self.journal.log_clear()
+
+    def export(self) -> Tuple[List[str], np.ndarray]:
+        """
+        Copy out all stored vectors
+
+        Returns:
+            Tuple of (IDs, float32 matrix of their vectors), without free rows
+        """
+        with self._lock:
+            rows = sorted(self._rows.values())
+            ids = [self._ids[row] for row in rows]
+            return ids, self._decode(self._codes[rows], self._scales[rows])
+
+    @classmethod
+    def from_vectors(cls, ids: List[str], vectors: np.ndarray, dtype: str = "float32") -> "LocalVectorStore":
+        """
+        Build a store around an existing float32 matrix, e.g. a memory-mapped file
+
+        With dtype="float32" the matrix is used as-is without copying, so a
+        copy-on-write mapping is paged in lazily; other dtypes are encoded.
+        """
+        store = cls(vectors.shape[1], dtype=dtype, initial_capacity=0)
+        if dtype == "float32":
+            store._codes = vectors
+            store._scales = np.ones(len(ids), dtype=np.float32)
+            store._ids = list(ids)
+            store._size = len(ids)
+            store._rows = {vector_id: row for row, vector_id in enumerate(ids)}
+        else:
+            for start in range(0, len(ids), SEARCH_BLOCK_ROWS):
+                store.add(ids[start:start + SEARCH_BLOCK_ROWS], vectors[start:start + SEARCH_BLOCK_ROWS])
+        return store
+
+    def save(self, path: str):
+        """
+        Write the store to a directory as raw .npy files plus an ID list
+
+        The files can be memory-mapped by `load` without reading them fully.
+        """
+        directory = Path(path)
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            np.save(directory / "codes.npy", self._codes[:self._size])
+            np.save(directory / "scales.npy", self._scales[:self._size])
+            with open(directory / "ids.json", "w") as f:
+                json.dump({
+                    "dimensions": self.dimensions,
+                    "dtype": self.dtype,
+                    "ids": self._ids[:self._size]
+                }, f)
+        logger.info(f"Saved {len(self)} vectors ({self.dtype}) to {directory}")
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "LocalVectorStore":
+        """
+        Load a store written by `save`
+
+        With mmap=True the matrix is mapped copy-on-write, so pages are read
+        lazily and later writes stay in memory without touching the file.
+        """
+        directory = Path(path)
+        with open(directory / "ids.json") as f:
+            header = json.load(f)
+
+        store = cls(header["dimensions"], dtype=header["dtype"], initial_capacity=0)
+        mmap_mode = "c" if mmap else None
+        store._codes = np.load(directory / "codes.npy", mmap_mode=mmap_mode)
+        store._scales = np.load(directory / "scales.npy", mmap_mode=mmap_mode)
+        store._ids = header["ids"]
+        store._size = len(store._ids)
+        for row, vector_id in enumerate(store._ids):
+            if vector_id is None:
+                store._free_rows.append(row)
+            else:
+                store._rows[vector_id] = row
+        logger.info(f"Loaded {len(store)} vectors ({store.dtype}) from {directory}")
+        return store
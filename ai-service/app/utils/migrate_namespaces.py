@@ -0,0 +1,121 @@
+from typing import Any, Dict, List, Optional
+from collections import defaultdict
+import argparse
+import asyncio
+import logging
+import time
+
+import numpy as np
+
+from .vector_store import fetch_vectors, get_pinecone, namespace_for, update_centroids
+from .resilience import get_dependency
+from ..config import get_settings
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+async def migrate_batch(index, ids: List[str], dry_run: bool = False) -> Dict[str, int]:
+    """
+    Move one batch of default-namespace vectors into their namespaces
+
+    Vectors are copied before the originals are deleted, so an interrupted
+    run leaves duplicates rather than losing vectors; re-running it is safe.
+
+    Returns:
+        Vectors moved per target namespace
+    """
+    pinecone = get_dependency("pinecone")
+    fetched = await pinecone.call_sync(index.fetch, ids=ids, namespace="")
+
+    by_namespace = defaultdict(list)
+    for vector_id, vector in fetched.vectors.items():
+        metadata = vector.metadata or {}
+        namespace = namespace_for(metadata)
+        if namespace:
+            by_namespace[namespace].append({"id": vector_id, "values": list(vector.values), "metadata": metadata})
+
+    moved = {namespace: len(vectors) for namespace, vectors in by_namespace.items()}
+    if dry_run or not by_namespace:
+        return moved
+
+    # Copies left by an interrupted run must not be counted in centroids twice
+    replaced = []
+    if settings.route_top_n is not None:
+        for namespace, vectors in by_namespace.items():
+            replaced += await fetch_vectors(index, [vector["id"] for vector in vectors], namespace)
+    for namespace, vectors in by_namespace.items():
+        await pinecone.call_sync(index.upsert, vectors=vectors, namespace=namespace)
+    if settings.route_top_n is not None:
+        vectors = [vector for namespace_vectors in by_namespace.values() for vector in namespace_vectors]
+        await update_centroids(
+            index,
+            np.asarray([vector["values"] for vector in vectors], dtype=np.float32),
+            [vector["metadata"] for vector in vectors],
+            replaced
+        )
+    await pinecone.call_sync(
+        index.delete,
+        ids=[vector["id"] for vectors in by_namespace.values() for vector in vectors],
+        namespace=""
+    )
+    return moved
+
+async def migrate_namespaces(batch_size: int = 100, dry_run: bool = False,
+                             max_vectors: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Move vectors indexed before namespaces were enabled into their namespaces
+
+    Walks the default namespace in pages of `batch_size` IDs; vectors
+    without settings.namespace_key in their metadata stay where they are.
+    Centroids of moved vectors are rebuilt in their new namespaces; the old
+    default-namespace centroids are left in place and route to nothing.
+    """
+    if settings.namespace_key is None:
+        raise ValueError("Set NAMESPACE_KEY before migrating")
+
+    _, index = get_pinecone()
+    started = time.perf_counter()
+    scanned = 0
+    totals: Dict[str, int] = defaultdict(int)
+
+    # Deleting while paging would shift later pages, so collect IDs first
+    ids = await get_dependency("pinecone").call_sync(
+        lambda: [vector_id for page in index.list(namespace="", limit=batch_size) for vector_id in page]
+    )
+    if max_vectors is not None:
+        ids = ids[:max_vectors]
+
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        moved = await migrate_batch(index, batch, dry_run)
+        scanned += len(batch)
+        for namespace, count in moved.items():
+            totals[namespace] += count
+        logger.info(f"Migrated {sum(totals.values())} of {scanned} scanned vectors")
+
+    return {
+        "dry_run": dry_run,
+        "scanned": scanned,
+        "moved": sum(totals.values()),
+        "namespaces": dict(totals),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Move existing vectors into per-channel namespaces")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--max-vectors", type=int, default=None)
+    parser.add_argument("--dry-run", action="store_true", help="Report what would move without writing")
+    args = parser.parse_args()
+
+    result = asyncio.run(migrate_namespaces(args.batch_size, args.dry_run, args.max_vectors))
+    print(f"\n=== Namespace Migration{' (dry run)' if result['dry_run'] else ''} ===")
+    print(f"Scanned {result['scanned']} vectors, moved {result['moved']} in {result['duration_ms']:.0f} ms")
+    for namespace, count in sorted(result["namespaces"].items(), key=lambda item: -item[1]):
+        print(f"  {namespace}: {count}")
+
+if __name__ == "__main__":
+    main()
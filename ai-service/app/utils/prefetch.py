@@ -0,0 +1,179 @@
+from typing import Any, Awaitable, Callable, Dict, Optional
+from collections import OrderedDict
+from difflib import SequenceMatcher
+import asyncio
+import logging
+import time
+
+from .profiling import create_background_task
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+def normalize_query(text: str) -> str:
+    """Lowercase and collapse whitespace so trivial edits compare equal"""
+    return " ".join(text.lower().split())
+
+def text_similarity(a: str, b: str) -> float:
+    """Similarity of two normalized texts between 0 and 1"""
+    return SequenceMatcher(None, a, b).ratio()
+
+class QueryPrefetcher:
+    """
+    Per-session cache of speculative retrievals for queries still being typed.
+
+    Each session holds at most one prefetch: a newer text for the session
+    cancels the previous one unless it normalizes to the same text. The
+    final query takes its session's prefetch and uses the result if the
+    submitted text is at least `min_similarity` similar to the prefetched
+    text and the retrieval parameters match; otherwise the prefetch is
+    cancelled. Prefetches expire after `ttl_seconds`, and the least recently
+    used sessions are dropped beyond `max_sessions`.
+
+    Sessions are held in process memory, so a prefetch is only found by a
+    final query handled by the same worker.
+    """
+
+    def __init__(self,
+                 ttl_seconds: float = 30,
+                 min_similarity: float = 0.85,
+                 max_sessions: int = 1000,
+                 min_chars: int = 8):
+        self.ttl_seconds = ttl_seconds
+        self.min_similarity = min_similarity
+        self.max_sessions = max_sessions
+        self.min_chars = min_chars
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+        # Metrics
+        self.started = 0
+        self.reused = 0
+        self.superseded = 0
+        self.expired = 0
+        self.hits = 0
+        self.exact_hits = 0
+        self.misses = 0
+        self.failed = 0
+        self.saved_ms = 0.0
+
+    async def _run(self, entry: Dict[str, Any], run: Callable[[], Awaitable[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        try:
+            return await run()
+        except Exception as e:
+            # Nothing awaits an abandoned prefetch, so failures end here
+            logger.warning(f"Prefetch failed: {str(e)}")
+            return None
+        finally:
+            entry["finished"] = time.monotonic()
+
+    def _drop(self, entry: Dict[str, Any]):
+        if not entry["task"].done():
+            entry["task"].cancel()
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl_seconds
+        for session_id, entry in list(self._sessions.items()):
+            if entry["started"] < cutoff:
+                self._drop(self._sessions.pop(session_id))
+                self.expired += 1
+
+    def prefetch(self, session_id: str, text: str, params: Dict[str, Any],
+                 run: Callable[[], Awaitable[Dict[str, Any]]]) -> str:
+        """
+        Start a speculative retrieval for a session's partial query
+
+        Args:
+            session_id: Identifies the composing user and conversation
+            text: Query text typed so far
+            params: Retrieval parameters the final query must match
+            run: Coroutine function performing the retrieval
+
+        Returns:
+            "started", "reused" if the same text is already prefetched,
+            or "skipped" if the text is too short to be worth retrieving
+        """
+        self._expire()
+        normalized = normalize_query(text)
+        if len(normalized) < self.min_chars:
+            return "skipped"
+
+        entry = self._sessions.get(session_id)
+        if entry is not None:
+            if entry["text"] == normalized and entry["params"] == params:
+                self._sessions.move_to_end(session_id)
+                self.reused += 1
+                return "reused"
+            self._drop(entry)
+            self.superseded += 1
+
+        entry = {"text": normalized, "params": params, "started": time.monotonic(), "finished": None}
+        entry["task"] = create_background_task(self._run(entry, run))
+        self._sessions[session_id] = entry
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            _, evicted = self._sessions.popitem(last=False)
+            self._drop(evicted)
+        self.started += 1
+        return "started"
+
+    async def take(self, session_id: str, text: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Claim a session's prefetch for its final query
+
+        Waits for a prefetch that is still running if it is close enough to
+        `text`, so the final query only pays for the remaining time.
+
+        Returns:
+            The prefetch result plus "exact", "similarity" and "saved_ms",
+            or None if there was no usable prefetch
+        """
+        self._expire()
+        entry = self._sessions.pop(session_id, None)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        normalized = normalize_query(text)
+        similarity = 1.0 if entry["text"] == normalized else text_similarity(entry["text"], normalized)
+        if similarity < self.min_similarity or entry["params"] != params:
+            self._drop(entry)
+            self.misses += 1
+            return None
+
+        # Time spent before the final query arrived is latency it does not see
+        now = time.monotonic()
+        saved_ms = ((entry["finished"] or now) - entry["started"]) * 1000
+        result = await entry["task"]
+        if result is None:
+            self.failed += 1
+            return None
+
+        self.hits += 1
+        if similarity == 1.0:
+            self.exact_hits += 1
+        self.saved_ms += saved_ms
+        return {**result, "exact": similarity == 1.0, "similarity": round(similarity, 3), "saved_ms": round(saved_ms, 1)}
+
+    def clear(self):
+        """Cancel and forget all prefetches, e.g. after the index is reset"""
+        for entry in self._sessions.values():
+            self._drop(entry)
+        self._sessions.clear()
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get prefetch hit rate and latency saved"""
+        claimed = self.hits + self.misses + self.failed
+        return {
+            "sessions": len(self._sessions),
+            "started": self.started,
+            "reused": self.reused,
+            "superseded": self.superseded,
+            "expired": self.expired,
+            "hits": self.hits,
+            "exact_hits": self.exact_hits,
+            "misses": self.misses,
+            "failed": self.failed,
+            "hit_ratio": self.hits / claimed if claimed else 0.0,
+            "saved_ms": round(self.saved_ms, 1),
+            "avg_saved_ms": round(self.saved_ms / self.hits, 1) if self.hits else 0.0
+        }
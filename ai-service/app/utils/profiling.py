@@ -0,0 +1,299 @@
+from typing import Any, Dict, List, Optional
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from datetime import datetime
+from pathlib import Path
+import asyncio
+import hmac
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Stacks and functions kept in a saved profile
+MAX_PROFILE_STACKS = 200
+MAX_HOT_FUNCTIONS = 25
+
+_current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar("current_trace", default=None)
+
+class RequestTrace:
+    """Per-request record of named stage timings"""
+
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+        self.stages: List[Dict[str, Any]] = []
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000
+
+    def stage_totals(self) -> Dict[str, Dict[str, float]]:
+        """Total time and count per stage name"""
+        totals: Dict[str, Dict[str, float]] = {}
+        for entry in self.stages:
+            total = totals.setdefault(entry["name"], {"ms": 0.0, "count": 0})
+            total["ms"] = round(total["ms"] + entry["ms"], 3)
+            total["count"] += 1
+        return totals
+
+def create_background_task(coro) -> asyncio.Task:
+    """
+    Start a task that may outlive the current request
+
+    Tasks copy the context they are created in, so without this a task
+    started while handling a request would keep timing stages into that
+    request's trace after it has been saved.
+    """
+    context = copy_context()
+    context.run(_current_trace.set, None)
+    return asyncio.create_task(coro, context=context)
+
+@contextmanager
+def stage(name: str):
+    """
+    Time a block as a named stage of the current request's trace
+
+    Costs one context variable lookup when the request is not traced.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    offset = trace.elapsed_ms()
+    try:
+        yield
+    finally:
+        trace.stages.append({
+            "name": name,
+            "offset_ms": round(offset, 3),
+            "ms": round(trace.elapsed_ms() - offset, 3)
+        })
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    path = Path(code.co_filename)
+    return f"{code.co_name} ({path.parent.name}/{path.name}:{code.co_firstlineno})"
+
+class StackSampler:
+    """
+    Samples one thread's Python stack at a fixed interval from a helper thread.
+
+    Samples are aggregated as collapsed stacks ("outer;...;inner" -> count),
+    the format flame graph tools read. Everything running on the sampled
+    thread is captured, so on the event loop thread concurrent requests show
+    up in each other's profiles.
+    """
+
+    def __init__(self, thread_id: int, interval_seconds: float = 0.005, max_depth: int = 64):
+        self.thread_id = thread_id
+        self.interval_seconds = interval_seconds
+        self.max_depth = max_depth
+        self.samples = 0
+        self._stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None and len(labels) < self.max_depth:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            if labels:
+                self._stacks[";".join(reversed(labels))] += 1
+                self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Dict[str, Any]:
+        """Stop sampling and summarize the profile"""
+        self._stop.set()
+        self._thread.join()
+
+        # Self time counts only the innermost frame; inclusive time counts
+        # every frame on the stack
+        own: Counter = Counter()
+        inclusive: Counter = Counter()
+        for stack, count in self._stacks.items():
+            labels = stack.split(";")
+            own[labels[-1]] += count
+            for label in set(labels):
+                inclusive[label] += count
+
+        def ranked(counts: Counter) -> List[Dict[str, Any]]:
+            return [
+                {"function": label, "samples": count, "share": round(count / self.samples, 3)}
+                for label, count in counts.most_common(MAX_HOT_FUNCTIONS)
+            ]
+
+        return {
+            "samples": self.samples,
+            "interval_ms": self.interval_seconds * 1000,
+            "self_functions": ranked(own),
+            "hot_functions": ranked(inclusive),
+            "stacks": dict(self._stacks.most_common(MAX_PROFILE_STACKS))
+        }
+
+class TraceStore:
+    """
+    Bounded on-disk ring buffer of request traces.
+
+    Each trace is one JSON file named by time and trace ID; once more than
+    `max_traces` files exist the oldest are deleted. The directory is
+    created when the first trace is saved.
+    """
+
+    def __init__(self, directory: str, max_traces: int = 200):
+        self.directory = Path(directory)
+        self.max_traces = max_traces
+        self._lock = threading.Lock()
+
+    def _files(self) -> List[Path]:
+        return sorted(self.directory.glob("*.json"))
+
+    def save(self, trace: Dict[str, Any]):
+        """Write a trace and drop the oldest beyond the limit"""
+        name = f"{int(time.time() * 1000):013d}-{trace['id']}.json"
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.directory / f".{name}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(trace, f)
+            os.replace(tmp_path, self.directory / name)
+            files = self._files()
+            for path in files[:max(0, len(files) - self.max_traces)]:
+                path.unlink(missing_ok=True)
+
+    def path(self, trace_id: str) -> Optional[Path]:
+        """File of a saved trace, if it is still in the buffer"""
+        if not trace_id.isalnum():
+            return None
+        matches = list(self.directory.glob(f"*-{trace_id}.json"))
+        return matches[0] if matches else None
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Summaries of saved traces, newest first"""
+        summaries = []
+        for path in reversed(self._files()):
+            try:
+                with open(path) as f:
+                    trace = json.load(f)
+            except (OSError, ValueError):
+                continue
+            summaries.append({
+                "id": trace["id"],
+                "method": trace["method"],
+                "path": trace["path"],
+                "status": trace["status"],
+                "started_at": trace["started_at"],
+                "duration_ms": trace["duration_ms"],
+                "reason": trace["reason"],
+                "profiled": trace["profile"] is not None
+            })
+        return summaries
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that traces requests and keeps the slow ones.
+
+    Every request under a traced path records stage timings (see `stage`).
+    A `sample_rate` fraction of requests, and with `header_enabled` those
+    sent with `X-Profile: 1` (or `X-Profile: <header_token>` when a token is
+    set), also run under a StackSampler and get an X-Trace-Id response
+    header. Traces of profiled requests and of requests slower than
+    `slow_request_ms` are saved to the TraceStore.
+    """
+
+    def __init__(self, app, store: TraceStore,
+                 sample_rate: float = 0.0,
+                 header_enabled: bool = False,
+                 header_token: Optional[str] = None,
+                 slow_request_ms: Optional[float] = None,
+                 interval_ms: float = 5,
+                 max_concurrent_profiles: int = 4,
+                 excluded_prefixes: tuple = ("/admin", "/health")):
+        self.app = app
+        self.store = store
+        self.sample_rate = sample_rate
+        self.header_enabled = header_enabled
+        self.header_token = header_token
+        self.slow_request_ms = slow_request_ms
+        self.interval_seconds = interval_ms / 1000
+        self.max_concurrent_profiles = max_concurrent_profiles
+        self.excluded_prefixes = excluded_prefixes
+        self._active_profiles = 0
+
+    def _wants_profile(self, scope) -> bool:
+        if self.header_enabled:
+            for name, value in scope.get("headers", []):
+                if name == b"x-profile":
+                    if self.header_token is not None:
+                        return hmac.compare_digest(value.strip(), self.header_token.encode())
+                    return value.strip() in (b"1", b"true")
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.excluded_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace(scope["method"], scope["path"])
+        token = _current_trace.set(trace)
+        sampler = None
+        if self._wants_profile(scope) and self._active_profiles < self.max_concurrent_profiles:
+            sampler = StackSampler(threading.get_ident(), self.interval_seconds)
+            self._active_profiles += 1
+            sampler.start()
+
+        status = 500
+
+        async def send_traced(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if sampler is not None:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-trace-id", trace.id.encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_traced)
+        finally:
+            _current_trace.reset(token)
+            duration_ms = trace.elapsed_ms()
+            profile = None
+            if sampler is not None:
+                profile = sampler.stop()
+                self._active_profiles -= 1
+
+            slow = self.slow_request_ms is not None and duration_ms >= self.slow_request_ms
+            if slow or profile is not None:
+                try:
+                    await asyncio.to_thread(self.store.save, {
+                        "id": trace.id,
+                        "method": trace.method,
+                        "path": trace.path,
+                        "status": status,
+                        "started_at": trace.started_at.isoformat(),
+                        "duration_ms": round(duration_ms, 3),
+                        "reason": "slow" if slow else "profiled",
+                        "stage_totals": trace.stage_totals(),
+                        "stages": trace.stages,
+                        "profile": profile
+                    })
+                except OSError as e:
+                    logger.error(f"Error saving trace: {str(e)}")
@@ -2,19 +2,35 @@ from typing import List, Dict, Any, Optional
 import asyncio
 from datetime import datetime, timedelta
 import logging
+import time
 from collections import deque
 
-from .vector_store import add_texts
+from .vector_store import add_texts, chunk_text, estimate_tokens, namespace_for, set_vector_metadata
+from .dedup import NearDuplicateDetector
+from .conversation_packer import ConversationPacker
+from .shared_queue import SharedIngestQueue, default_worker_id
+from .profiling import create_background_task
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Seconds between stats reports to the shared queue while idle
+SHARED_REPORT_SECONDS = 10
+
 class RealTimeProcessor:
     def __init__(self, 
                  batch_size: int = 10,
                  rate_limit_per_minute: int = 100,
-                 max_queue_size: int = 1000):
+                 max_queue_size: int = 1000,
+                 dedup_policy: Optional[str] = None,
+                 dedup_max_distance: int = 3,
+                 dedup_max_entries: int = 100000,
+                 dedup_scope_key: Optional[str] = "channel_id",
+                 dedup_window_seconds: Optional[float] = 600,
+                 packer: Optional[ConversationPacker] = None,
+                 shared_queue: Optional[SharedIngestQueue] = None,
+                 shared_poll_seconds: float = 0.5):
         # Queue for incoming content
         self.queue = deque(maxlen=max_queue_size)
         
@@ -26,26 +42,84 @@ class RealTimeProcessor:
         # Rate limiting
         self.request_times = deque(maxlen=rate_limit_per_minute)
         
+        # Near-duplicate suppression: "skip" drops duplicates, "merge" also
+        # counts them on the original's vector as duplicate_count
+        if dedup_policy not in (None, "skip", "merge"):
+            raise ValueError(f"Unknown dedup policy: {dedup_policy}")
+        self.dedup_policy = dedup_policy
+        self.dedup_scope_key = dedup_scope_key
+        self.detector = NearDuplicateDetector(
+            dedup_max_distance, dedup_max_entries, dedup_window_seconds
+        ) if dedup_policy else None
+        self._pending_merges: Dict[int, Dict[str, Any]] = {}
+        
+        # Conversation packing: messages are embedded as part of a window
+        # of their channel's conversation instead of one vector each
+        self.packer = packer
+        
+        # Cross-process coordination: with a shared queue, items from every
+        # worker go through one SQLite queue and rate-limit budget, and each
+        # worker consumes it from a background task started by start().
+        # Windows are per process and a channel's messages would be claimed
+        # by different workers, each packing its own fragments, so the two
+        # cannot be combined
+        if shared_queue is not None and packer is not None:
+            raise ValueError("Conversation packing cannot be used with a shared queue")
+        self.shared_queue = shared_queue
+        self.shared_poll_seconds = shared_poll_seconds
+        self.worker_id = default_worker_id()
+        self._shared_task: Optional[asyncio.Task] = None
+        
         # Status tracking
+        self.in_flight: List[datetime] = []
         self.processed_count = 0
         self.failed_count = 0
+        self.suppressed_count = 0
+        self.saved_tokens = 0
         self.last_processed_time = None
     
     async def add_to_queue(self, content: str, metadata: Optional[Dict[str, Any]] = None) -> bool:
         """Add content to the processing queue"""
-        if len(self.queue) >= self.queue.maxlen:
+        if self.shared_queue is None and len(self.queue) >= self.queue.maxlen:
             logger.warning("Queue is full, content rejected")
             return False
             
+        dedup_entry = None
+        if self.detector is not None:
+            scope = str((metadata or {}).get(self.dedup_scope_key, "")) if self.dedup_scope_key else ""
+            dedup_entry, is_duplicate = self.detector.find_or_add(content, scope)
+            if is_duplicate:
+                self.suppressed_count += 1
+                self.saved_tokens += estimate_tokens(content)
+                if self.dedup_policy == "merge":
+                    dedup_entry["duplicate_count"] += 1
+                    self._pending_merges[dedup_entry["id"]] = dedup_entry
+                return True
+        
+        if self.shared_queue is not None:
+            queued = await asyncio.to_thread(
+                self.shared_queue.enqueue,
+                self.worker_id,
+                content,
+                metadata or {},
+                dedup_entry["id"] if dedup_entry is not None else None
+            )
+            if not queued:
+                logger.warning("Queue is full, content rejected")
+                if dedup_entry is not None:
+                    self.detector.remove(dedup_entry["id"])
+            return queued
+            
         self.queue.append({
             "content": content,
             "metadata": metadata or {},
-            "timestamp": datetime.now()
+            "timestamp": datetime.now(),
+            "dedup_entry": dedup_entry
         })
         
         # Start processing if not already running
         if not self.processing:
-            asyncio.create_task(self._process_queue())
+            create_background_task(self._process_queue())
         
         return True
     
@@ -74,31 +148,9 @@ class RealTimeProcessor:
                     continue
                 
                 # Process items in batches
-                batch = []
-                batch_metadata = []
-                
-                for _ in range(min(self.batch_size, len(self.queue))):
-                    if not self.queue:
-                        break
-                    
-                    item = self.queue.popleft()
-                    batch.append(item["content"])
-                    batch_metadata.append(item["metadata"])
-                
-                if batch:
-                    try:
-                        # Add to vector store
-                        await add_texts(texts=batch, metadatas=batch_metadata)
-                        
-                        # Update stats
-                        self.processed_count += len(batch)
-                        self.last_processed_time = datetime.now()
-                        self.request_times.append(datetime.now())
-                        
-                        logger.info(f"Processed batch of {len(batch)} items")
-                    except Exception as e:
-                        self.failed_count += len(batch)
-                        logger.error(f"Error processing batch: {str(e)}")
+                items = [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+                if items:
+                    await self._process_batch(items)
                 
                 # Small delay between batches
                 await asyncio.sleep(0.1)
@@ -106,12 +158,292 @@ class RealTimeProcessor:
         finally:
             self.processing = False
     
+    async def _process_batch(self, items: List[Dict[str, Any]]) -> bool:
+        """Index a batch of queued items and update stats, returning whether it was indexed"""
+        batch = [item["content"] for item in items]
+        batch_metadata = [item["metadata"] for item in items]
+        batch_entries = [item.get("dedup_entry") for item in items]
+        batch_timestamps = [item["timestamp"] for item in items]
+        self.in_flight = batch_timestamps
+        
+        try:
+            # Add to vector store
+            if self.packer is not None:
+                await self._add_packed(batch, batch_metadata, batch_timestamps, batch_entries)
+            else:
+                ids = await add_texts(texts=batch, metadatas=batch_metadata)
+                self._record_vector_ids(batch, batch_metadata, batch_entries, ids)
+            
+            # Update stats
+            self.processed_count += len(batch)
+            self.last_processed_time = datetime.now()
+            self.request_times.append(datetime.now())
+            
+            logger.info(f"Processed batch of {len(batch)} items")
+            indexed = True
+        except Exception as e:
+            self.failed_count += len(batch)
+            logger.error(f"Error processing batch: {str(e)}")
+            
+            # Unindexed messages must not suppress later copies; entries of
+            # other workers' items are removed by those workers
+            for entry in batch_entries:
+                if entry is not None and self.detector.get(entry["id"]) is entry:
+                    self.detector.remove(entry["id"])
+                    self._pending_merges.pop(entry["id"], None)
+            indexed = False
+        finally:
+            self.in_flight = []
+        
+        await self._flush_merges()
+        return indexed
+    
+    async def _process_shared_queue(self):
+        """Claim and process batches from the shared queue until stopped"""
+        last_report = 0.0
+        reported = None
+        while True:
+            try:
+                # Empty while the shared rate budget is used up
+                rows = await asyncio.to_thread(
+                    self.shared_queue.claim, self.worker_id, self.batch_size, self.rate_limit_per_minute
+                )
+                if rows:
+                    items = [self._shared_item(row) for row in rows]
+                    self.processing = True
+                    try:
+                        indexed = await self._process_batch(items)
+                    finally:
+                        self.processing = False
+                    
+                    # Other workers' deduplicated items get their vector IDs back
+                    dedup_results = [
+                        (row["enqueued_by"], row["dedup_entry_id"],
+                         item["dedup_entry"]["vector_id"] if indexed else None,
+                         item["dedup_entry"].get("namespace", ""))
+                        for row, item in zip(rows, items)
+                        if row["dedup_entry_id"] is not None and row["enqueued_by"] != self.worker_id
+                    ]
+                    await asyncio.to_thread(self.shared_queue.complete, [row["id"] for row in rows], dedup_results)
+                
+                if self.detector is not None:
+                    await self._collect_dedup_results()
+                
+                # Publish counters when they change, and at least every few seconds as a heartbeat
+                state = self.dump_state()
+                if state != reported or time.monotonic() - last_report > SHARED_REPORT_SECONDS:
+                    await asyncio.to_thread(self.shared_queue.report_stats, self.worker_id, state)
+                    reported, last_report = state, time.monotonic()
+                
+                if not rows:
+                    await asyncio.sleep(self.shared_poll_seconds)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error processing shared queue: {str(e)}")
+                await asyncio.sleep(1)
+    
+    def _shared_item(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a claimed row to a queue item"""
+        # Fingerprints are per worker: another worker's item gets a stand-in
+        # entry that only collects the vector ID to post back
+        dedup_entry = None
+        if row["dedup_entry_id"] is not None and row["enqueued_by"] == self.worker_id:
+            dedup_entry = self.detector.get(row["dedup_entry_id"])
+        elif row["dedup_entry_id"] is not None:
+            dedup_entry = {"id": row["dedup_entry_id"], "vector_id": None}
+        return {
+            "content": row["content"],
+            "metadata": row["metadata"],
+            "timestamp": datetime.fromtimestamp(row["enqueued_at"]),
+            "dedup_entry": dedup_entry
+        }
+    
+    async def _collect_dedup_results(self):
+        """Attach vector IDs of this worker's items indexed by other workers, then flush merges"""
+        results = await asyncio.to_thread(self.shared_queue.take_dedup_results, self.worker_id)
+        for result in results:
+            entry = self.detector.get(result["dedup_entry_id"])
+            if entry is None:
+                continue
+            if result["vector_id"] is None:
+                self.detector.remove(entry["id"])
+                self._pending_merges.pop(entry["id"], None)
+            else:
+                entry["vector_id"] = result["vector_id"]
+                entry["namespace"] = result["namespace"]
+        if results:
+            await self._flush_merges()
+    
+    def start(self):
+        """Start consuming the shared queue on the running event loop"""
+        if self.shared_queue is not None and self._shared_task is None:
+            self._shared_task = asyncio.create_task(self._process_shared_queue())
+    
+    async def stop(self):
+        """Stop consuming the shared queue"""
+        if self._shared_task is not None:
+            self._shared_task.cancel()
+            try:
+                await self._shared_task
+            except asyncio.CancelledError:
+                pass
+            self._shared_task = None
+    
+    def _record_vector_ids(self, batch: List[str], metadatas: List[Dict[str, Any]],
+                           entries: List[Optional[Dict[str, Any]]], ids: List[str]):
+        """Remember the first chunk's vector ID and namespace for each deduplicated message"""
+        position = 0
+        for text, metadata, entry in zip(batch, metadatas, entries):
+            chunk_count = len(chunk_text(text))
+            if entry is not None and chunk_count:
+                entry["vector_id"] = ids[position]
+                entry["namespace"] = namespace_for(metadata)
+            position += chunk_count
+    
+    async def _add_packed(self, batch: List[str], metadatas: List[Dict[str, Any]],
+                          timestamps: List[datetime], entries: List[Optional[Dict[str, Any]]]):
+        """Add messages to their conversation windows and re-embed each changed window once"""
+        await self._retry_unindexed_windows()
+        
+        windows = {}
+        for text, metadata, timestamp, entry in zip(batch, metadatas, timestamps, entries):
+            window = self.packer.add(text, metadata, timestamp)
+            windows[window["id"]] = window
+            if entry is not None:
+                entry["vector_id"] = window["id"]
+                entry["namespace"] = namespace_for(window["base_metadata"])
+        
+        await add_texts(
+            texts=[self.packer.window_text(w) for w in windows.values()],
+            metadatas=[self.packer.window_metadata(w) for w in windows.values()],
+            ids=list(windows)
+        )
+        self.packer.mark_indexed(list(windows))
+    
+    async def _retry_unindexed_windows(self):
+        """
+        Re-index windows left unindexed by a failed batch or restored from a snapshot
+
+        They go in their own upsert, so a window that keeps failing cannot
+        take the next batch down with it; on failure they stay pending.
+        """
+        windows = self.packer.unindexed_windows()
+        if not windows:
+            return
+        try:
+            await add_texts(
+                texts=[self.packer.window_text(w) for w in windows],
+                metadatas=[self.packer.window_metadata(w) for w in windows],
+                ids=[w["id"] for w in windows]
+            )
+        except Exception as e:
+            logger.error(f"Error re-indexing {len(windows)} conversation windows: {str(e)}")
+            return
+        self.packer.mark_indexed([w["id"] for w in windows])
+        logger.info(f"Re-indexed {len(windows)} conversation windows")
+    
+    async def _flush_merges(self):
+        """Write merged duplicate counts to the original messages' vectors"""
+        for entry_id, entry in list(self._pending_merges.items()):
+            if entry["vector_id"] is None:
+                # Original is still queued
+                continue
+            try:
+                duplicate_count = entry["duplicate_count"]
+                if self.packer is not None:
+                    # A window's count covers duplicates of all its messages
+                    flushed = entry.get("flushed_count", 0)
+                    duplicate_count = self.packer.add_duplicates(entry["vector_id"], duplicate_count - flushed)
+                    entry["flushed_count"] = entry["duplicate_count"]
+                await set_vector_metadata(
+                    entry["vector_id"],
+                    {"duplicate_count": duplicate_count},
+                    namespace=entry.get("namespace", "")
+                )
+                del self._pending_merges[entry_id]
+            except Exception as e:
+                logger.error(f"Error updating duplicate count: {str(e)}")
+                return
+    
+    def clear_dedup(self):
+        """Forget seen messages and open windows, e.g. after the index is reset"""
+        if self.detector is not None:
+            self.detector.clear()
+        self._pending_merges.clear()
+        if self.packer is not None:
+            self.packer.clear()
+    
+    def dump_state(self) -> Dict[str, Any]:
+        """Counters to carry across restarts"""
+        state = {
+            "processed_count": self.processed_count,
+            "failed_count": self.failed_count,
+            "suppressed_count": self.suppressed_count,
+            "saved_tokens": self.saved_tokens,
+            "last_processed": self.last_processed_time.isoformat() if self.last_processed_time else None
+        }
+        if self.packer is not None:
+            state["messages_packed"] = self.packer.messages_packed
+            state["windows_created"] = self.packer.windows_created
+        return state
+    
+    def restore_state(self, state: Dict[str, Any]):
+        """Restore counters saved by `dump_state`"""
+        self.processed_count = state["processed_count"]
+        self.failed_count = state["failed_count"]
+        self.suppressed_count = state["suppressed_count"]
+        self.saved_tokens = state["saved_tokens"]
+        if state["last_processed"]:
+            self.last_processed_time = datetime.fromisoformat(state["last_processed"])
+        if self.packer is not None:
+            self.packer.messages_packed = state.get("messages_packed", 0)
+            self.packer.windows_created = state.get("windows_created", 0)
+    
+    async def get_aggregated_status(self) -> Dict[str, Any]:
+        """
+        Get processing status across all workers
+
+        Without a shared queue this is the same as get_status.
+        """
+        status = self.get_status()
+        if self.shared_queue is None:
+            return status
+        
+        shared = await asyncio.to_thread(self.shared_queue.get_status)
+        status.update({
+            "queue_size": shared["queue_size"],
+            "processed_count": shared.get("processed_count", 0),
+            "failed_count": shared.get("failed_count", 0),
+            "suppressed_count": shared.get("suppressed_count", 0),
+            "saved_tokens": shared.get("saved_tokens", 0),
+            "last_processed": datetime.fromisoformat(shared["last_processed"]) if shared["last_processed"] else None,
+            "workers": shared["workers"],
+            # Claimed rows stay queued until completed, so the shared lag covers them
+            "queue_lag_seconds": max(shared["queue_lag_seconds"], status["queue_lag_seconds"])
+        })
+        return status
+    
+    def queue_lag_seconds(self) -> float:
+        """Age of the oldest message not yet indexed: queued, in a batch in flight, or in a pending window"""
+        pending = [self.queue[0]["timestamp"]] if self.queue else []
+        pending += self.in_flight
+        oldest_window = self.packer.oldest_unindexed() if self.packer is not None else None
+        if oldest_window is not None:
+            pending.append(oldest_window)
+        return (datetime.now() - min(pending)).total_seconds() if pending else 0.0
+    
     def get_status(self) -> Dict[str, Any]:
         """Get current processing status"""
         return {
             "queue_size": len(self.queue),
+            "in_flight": len(self.in_flight),
             "processed_count": self.processed_count,
             "failed_count": self.failed_count,
+            "suppressed_count": self.suppressed_count,
+            "saved_tokens": self.saved_tokens,
             "last_processed": self.last_processed_time,
-            "is_processing": self.processing
+            "is_processing": self.processing,
+            "queue_lag_seconds": self.queue_lag_seconds(),
+            "packing": self.packer.get_status() if self.packer is not None else None
         } 
\ No newline at end of file
@@ -0,0 +1,323 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import logging
+import random
+import time
+
+try:
+    from urllib3.exceptions import HTTPError as TransportError
+except ImportError:
+    TransportError = OSError
+
+from ..config import get_settings
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+class DependencyUnavailableError(Exception):
+    """Raised when an upstream dependency cannot serve a call"""
+
+class CircuitOpenError(DependencyUnavailableError):
+    """Raised when the circuit breaker is rejecting calls"""
+
+class DependencyBusyError(DependencyUnavailableError):
+    """Raised when no concurrency slot frees up before the deadline"""
+
+class DependencyTimeoutError(DependencyUnavailableError):
+    """Raised when a call exceeds its deadline"""
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Whether an error says the dependency is unhealthy rather than the call bad
+
+    Timeouts, connection errors, 429 and 5xx responses are transient. Other
+    HTTP errors (e.g. a 400 for an invalid filter) and validation errors are
+    the caller's fault: retrying cannot help, and they must not trip the
+    breaker for everyone else.
+    """
+    if isinstance(error, (DependencyTimeoutError, asyncio.TimeoutError, TimeoutError, ConnectionError, TransportError)):
+        return True
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    # SDK errors raised before any response, e.g. openai.APIConnectionError
+    name = type(error).__name__
+    return "Timeout" in name or "Connection" in name
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    fail fast. Once `reset_timeout` seconds have passed a single trial call is
+    let through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    def allow_request(self) -> bool:
+        """Check whether a call may proceed"""
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self._trial_in_flight = False
+        if self.state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def cancel_trial(self):
+        """Release a half-open trial slot whose call never reached upstream"""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        """Record a successful call"""
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+        if self.state != "closed":
+            logger.info(f"{self.name} circuit closed")
+        self.state = "closed"
+
+    def record_failure(self):
+        """Record a failed call"""
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning(f"{self.name} circuit opened after {self.consecutive_failures} consecutive failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+class Dependency:
+    """
+    Resilience policy for one upstream dependency.
+
+    Every call gets one deadline of `timeout` seconds that covers all of its
+    attempts. Each attempt waits for one of `max_concurrency` slots, and
+    transient failures are retried with jittered exponential backoff while
+    time remains, so a timed-out attempt is never retried. Outcomes feed a
+    circuit breaker shared by all callers. Caller errors (see
+    `is_transient`) are raised at once and leave the breaker alone.
+    """
+
+    def __init__(self,
+                 name: str,
+                 timeout: float,
+                 max_concurrency: int,
+                 max_retries: int = 0,
+                 failure_threshold: int = 5,
+                 reset_timeout: float = 30.0):
+        self.name = name
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        # Metrics
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.client_errors = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.rejected_open = 0
+        self.rejected_busy = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def _release_slot(self, task: Optional[asyncio.Future] = None):
+        if task is not None and not task.cancelled():
+            # Retrieve a late failure so it is not logged as unhandled
+            task.exception()
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    async def _attempt(self, fn: Callable[..., Awaitable[Any]], args: tuple, kwargs: Dict[str, Any],
+                       deadline: float, blocking: bool = False) -> Any:
+        """
+        Run a single attempt under the breaker, semaphore and the call's deadline
+
+        With `blocking`, fn runs a worker thread that cannot be interrupted,
+        so on timeout or cancellation its slot is only freed once the thread
+        returns.
+        """
+        if not self.breaker.allow_request():
+            self.rejected_open += 1
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), max(deadline - time.monotonic(), 0.001))
+        except asyncio.TimeoutError:
+            self.rejected_busy += 1
+            # Nothing was sent upstream, so leave the breaker as it was
+            self.breaker.cancel_trial()
+            raise DependencyBusyError(f"{self.name} has {self.max_concurrency} calls in flight")
+
+        self.in_flight += 1
+        self.calls += 1
+        task = asyncio.ensure_future(fn(*args, **kwargs))
+        release = True
+        try:
+            result = await asyncio.wait_for(
+                asyncio.shield(task) if blocking else task,
+                max(deadline - time.monotonic(), 0.001)
+            )
+        except asyncio.TimeoutError:
+            release = not blocking
+            self.timeouts += 1
+            self.failures += 1
+            self.breaker.record_failure()
+            raise DependencyTimeoutError(f"{self.name} call exceeded {self.timeout}s")
+        except asyncio.CancelledError:
+            release = not blocking
+            self.breaker.cancel_trial()
+            raise
+        except Exception as e:
+            if is_transient(e):
+                self.failures += 1
+                self.breaker.record_failure()
+            else:
+                self.client_errors += 1
+                self.breaker.cancel_trial()
+            raise
+        finally:
+            if release:
+                self._release_slot()
+            else:
+                task.add_done_callback(self._release_slot)
+
+        self.breaker.record_success()
+        return result
+
+    async def call(self, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        Call an async function under this dependency's policy
+
+        Args:
+            fn: Coroutine function to call
+            *args, **kwargs: Passed to fn
+
+        Returns:
+            The function's result
+        """
+        return await self._call(fn, args, kwargs)
+
+    async def _call(self, fn: Callable[..., Awaitable[Any]], args: tuple, kwargs: Dict[str, Any],
+                    blocking: bool = False) -> Any:
+        deadline = time.monotonic() + self.timeout
+        attempt = 0
+        while True:
+            try:
+                return await self._attempt(fn, args, kwargs, deadline, blocking)
+            except (CircuitOpenError, DependencyBusyError, DependencyTimeoutError):
+                raise
+            except Exception as e:
+                if attempt >= self.max_retries or not is_transient(e):
+                    raise
+                backoff = min(0.2 * 2 ** attempt, 2.0) * random.uniform(0.5, 1.0)
+                if time.monotonic() + backoff >= deadline:
+                    # No time left for another attempt
+                    raise
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"{self.name} call failed ({str(e)}), retry {attempt} in {backoff:.2f}s")
+                await asyncio.sleep(backoff)
+
+    async def call_sync(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Call a blocking function in a worker thread under this dependency's policy
+
+        A timed-out thread cannot be interrupted; it finishes in the background
+        and holds its concurrency slot until it does, so stuck calls cannot
+        pile up more threads than `max_concurrency`.
+        """
+        return await self._call(asyncio.to_thread, (fn,) + args, kwargs, blocking=True)
+
+    async def hedged_call(self, hedge_after: float, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        Call fn, starting a second identical call if the first has not
+        finished after `hedge_after` seconds, and return whichever succeeds first
+
+        Only use this for idempotent calls.
+        """
+        first = asyncio.create_task(self.call(fn, *args, **kwargs))
+        pending = {first}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=hedge_after)
+            if done:
+                return first.result()
+
+            self.hedges += 1
+            second = asyncio.create_task(self.call(fn, *args, **kwargs))
+            pending = {first, second}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get breaker state and call metrics"""
+        return {
+            "name": self.name,
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "timeout": self.timeout,
+            "calls": self.calls,
+            "failures": self.failures,
+            "client_errors": self.client_errors,
+            "timeouts": self.timeouts,
+            "retries": self.retries,
+            "rejected_open": self.rejected_open,
+            "rejected_busy": self.rejected_busy,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins
+        }
+
+_dependencies: Dict[str, Dependency] = {}
+
+def get_dependency(name: str) -> Dependency:
+    """Get or create the shared policy for a named dependency"""
+    if name not in _dependencies:
+        if name.startswith("openai"):
+            timeout = settings.openai_chat_timeout if name == "openai_chat" else settings.openai_embedding_timeout
+            max_concurrency = settings.openai_max_concurrency
+        else:
+            timeout = settings.pinecone_timeout
+            max_concurrency = settings.pinecone_max_concurrency
+        _dependencies[name] = Dependency(
+            name,
+            timeout=timeout,
+            max_concurrency=max_concurrency,
+            max_retries=settings.upstream_max_retries,
+            failure_threshold=settings.circuit_failure_threshold,
+            reset_timeout=settings.circuit_reset_seconds
+        )
+    return _dependencies[name]
+
+def get_dependency_status() -> List[Dict[str, Any]]:
+    """Get status of every dependency used so far"""
+    return [dependency.get_status() for dependency in _dependencies.values()]
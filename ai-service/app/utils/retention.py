@@ -0,0 +1,319 @@
+from typing import Any, Dict, List, Optional
+from collections import defaultdict, deque
+from datetime import datetime
+from pathlib import Path
+import asyncio
+import fcntl
+import hashlib
+import logging
+import time
+
+from .vector_store import (
+    add_texts, delete_vectors, find_vectors, get_namespace_stats, get_vector_count, parse_timestamp,
+    set_vector_metadata
+)
+from .gpt import summarize_messages
+from ..config import get_settings
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+RETENTION_ACTIONS = ("delete", "summarize")
+
+def summary_id(source_ids: List[str]) -> str:
+    """
+    Stable ID for the summary of a set of vectors
+
+    A pass that fails after indexing a summary but before deleting its
+    sources finds the same sources on retry and overwrites that summary
+    instead of adding a second one. This holds for a group's first batch
+    in a pass; later batches are folded into that summary's ID.
+    """
+    digest = hashlib.sha1("\n".join(sorted(source_ids)).encode("utf-8")).hexdigest()
+    return f"summary-{digest[:32]}"
+
+class RetentionPolicy:
+    """
+    Expire vectors matching `match` once they are older than `max_age_days`.
+
+    `match` is a metadata equality filter such as {"source": "chat"} or
+    {"channel_id": "c42"}; an empty match applies to every vector. The
+    "delete" action drops expired vectors. The "summarize" action first
+    replaces them with one summary vector per `group_key` value per
+    compaction pass, and never expires summaries itself, so a longer
+    "delete" policy can age them out.
+    """
+
+    def __init__(self,
+                 max_age_days: float,
+                 match: Optional[Dict[str, Any]] = None,
+                 action: str = "delete",
+                 group_key: str = "channel_id"):
+        if action not in RETENTION_ACTIONS:
+            raise ValueError(f"Unknown retention action: {action}")
+        self.max_age_days = max_age_days
+        self.match = match or {}
+        self.action = action
+        self.group_key = group_key
+
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any]) -> "RetentionPolicy":
+        return cls(**config)
+
+    def build_filter(self, now: float) -> Dict[str, Any]:
+        """Metadata filter for vectors this policy has expired"""
+        filter = {key: {"$eq": value} for key, value in self.match.items()}
+        filter["indexed_at"] = {"$lt": int(now - self.max_age_days * 86400)}
+        if self.action == "summarize":
+            filter["summary"] = {"$ne": True}
+        return filter
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "match": self.match,
+            "max_age_days": self.max_age_days,
+            "action": self.action
+        }
+
+class RetentionCompactor:
+    """
+    Applies retention policies to the index in the background.
+
+    Each pass finds expired vectors in batches of `batch_size` and deletes
+    them batch by batch, yielding to the event loop in between so request
+    handling is not blocked. At most `max_deletes_per_run` vectors are removed
+    per pass; the rest wait for the next one. The index size after each pass
+    is kept in a bounded history.
+
+    Vectors indexed before `indexed_at` was recorded never match an age
+    filter, so each pass first backfills it from their "timestamp"
+    metadata, or from the time of the pass when they have none.
+
+    With `lock_path` set, a compactor only runs passes while it holds an
+    exclusive lock on that file, so of several uvicorn workers one compacts
+    and the others skip their passes until it exits and one takes over.
+    """
+
+    def __init__(self,
+                 policies: List[RetentionPolicy],
+                 interval_seconds: float = 3600,
+                 batch_size: int = 100,
+                 max_deletes_per_run: int = 10000,
+                 history_size: int = 168,
+                 lock_path: Optional[str] = None):
+        self.policies = policies
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.max_deletes_per_run = max_deletes_per_run
+        self.history = deque(maxlen=history_size)
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.lock_path = lock_path
+        self._lock_file = None
+
+        # Metrics
+        self.runs = 0
+        self.skipped_runs = 0
+        self.deleted_count = 0
+        self.summarized_count = 0
+        self.summaries_created = 0
+        self.backfilled_count = 0
+        self.last_error: Optional[str] = None
+
+    async def _summarize(self, policy: RetentionPolicy, batch: List[tuple],
+                         summaries: Dict[Any, Dict[str, Any]]) -> int:
+        """
+        Fold one batch of expired vectors into their groups' summaries
+
+        `summaries` holds this pass's summary of each group so far. A group
+        seen in an earlier batch has that summary re-summarized together with
+        the new messages and overwritten under the same ID, so each group
+        ends the pass with one summary vector. Returns the number of new
+        summaries.
+        """
+        groups = defaultdict(list)
+        source_ids = defaultdict(list)
+        for vector_id, metadata in batch:
+            groups[metadata.get(policy.group_key)].append(metadata)
+            source_ids[metadata.get(policy.group_key)].append(vector_id)
+
+        created = 0
+        texts, metadatas, ids = [], [], []
+        for group, members in groups.items():
+            members.sort(key=lambda m: m.get("indexed_at", 0))
+            previous = summaries.get(group)
+            contents = [m.get("content", "") for m in members]
+            summary_metadata = {
+                "summary": True,
+                "summarized_count": len(members),
+                "period_start": members[0].get("indexed_at", 0),
+                "period_end": members[-1].get("indexed_at", 0)
+            }
+            if previous is None:
+                created += 1
+                vector_id = summary_id(source_ids[group])
+            else:
+                vector_id = previous["id"]
+                contents.insert(0, previous["text"])
+                summary_metadata.update({
+                    "summarized_count": previous["metadata"]["summarized_count"] + len(members),
+                    "period_start": min(previous["metadata"]["period_start"], summary_metadata["period_start"]),
+                    "period_end": max(previous["metadata"]["period_end"], summary_metadata["period_end"])
+                })
+            if group is not None:
+                summary_metadata[policy.group_key] = group
+            # Keep the summary in its messages' namespace
+            for key in ("source", settings.namespace_key):
+                if key is not None and members[0].get(key) is not None:
+                    summary_metadata[key] = members[0][key]
+
+            text = await summarize_messages(contents)
+            summaries[group] = {"id": vector_id, "text": text, "metadata": summary_metadata}
+            texts.append(text)
+            metadatas.append(summary_metadata)
+            ids.append(vector_id)
+
+        await add_texts(texts=texts, metadatas=metadatas, ids=ids)
+        return created
+
+    async def _backfill(self, now: float, namespace: str = "") -> int:
+        """Give vectors without indexed_at one, returning how many were updated"""
+        updated = set()
+        while len(updated) < self.max_deletes_per_run:
+            batch = await find_vectors({"indexed_at": {"$exists": False}}, self.batch_size, namespace=namespace)
+            # Updates are eventually consistent, so a query can still return them
+            batch = [(vector_id, metadata) for vector_id, metadata in batch if vector_id not in updated]
+            if not batch:
+                break
+            for vector_id, metadata in batch:
+                # The same rule build_chunk_metadata applies to new vectors
+                sent_at = parse_timestamp(metadata.get("timestamp"))
+                await set_vector_metadata(
+                    vector_id,
+                    {"indexed_at": int(sent_at if sent_at is not None else now)},
+                    namespace=namespace
+                )
+                updated.add(vector_id)
+            await asyncio.sleep(0)
+        self.backfilled_count += len(updated)
+        return len(updated)
+
+    async def _apply(self, policy: RetentionPolicy, now: float, budget: int, namespace: str = "") -> int:
+        """Expire vectors for one policy in one namespace, returning how many were deleted"""
+        filter = policy.build_filter(now)
+        deleted = set()
+        summaries: Dict[Any, Dict[str, Any]] = {}
+        while len(deleted) < budget:
+            batch = await find_vectors(filter, min(self.batch_size, budget - len(deleted)), namespace=namespace)
+            # Deletes are eventually consistent, so a query can still return them
+            batch = [(vector_id, metadata) for vector_id, metadata in batch if vector_id not in deleted]
+            if not batch:
+                break
+
+            if policy.action == "summarize":
+                self.summaries_created += await self._summarize(policy, batch, summaries)
+                self.summarized_count += len(batch)
+
+            ids = [vector_id for vector_id, _ in batch]
+            await delete_vectors(ids, namespace=namespace)
+            deleted.update(ids)
+            self.deleted_count += len(ids)
+            await asyncio.sleep(0)
+        return len(deleted)
+
+    async def run_once(self) -> Dict[str, Any]:
+        """Apply every policy once and record the resulting index size"""
+        async with self._lock:
+            if not self._take_compaction_lock():
+                self.skipped_runs += 1
+                return {
+                    "time": datetime.now().isoformat(),
+                    "skipped": True,
+                    "reason": "Another worker holds the compaction lock"
+                }
+            started = time.perf_counter()
+            now = time.time()
+            deleted = 0
+            try:
+                namespaces = list(await get_namespace_stats()) or [""]
+                if self.policies:
+                    for namespace in namespaces:
+                        await self._backfill(now, namespace)
+                for policy in self.policies:
+                    for namespace in namespaces:
+                        deleted += await self._apply(policy, now, self.max_deletes_per_run - deleted, namespace)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Error compacting index: {str(e)}")
+
+            vector_count = None
+            try:
+                vector_count = await get_vector_count()
+            except Exception as e:
+                logger.error(f"Error reading index size: {str(e)}")
+
+            run = {
+                "time": datetime.now().isoformat(),
+                "deleted": deleted,
+                "vector_count": vector_count,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+            }
+            self.runs += 1
+            self.history.append(run)
+            logger.info(f"Retention pass deleted {deleted} vectors, index size: {vector_count}")
+            return run
+
+    def _take_compaction_lock(self) -> bool:
+        """Hold the lock file for as long as this compactor runs, unless another process has it"""
+        if self.lock_path is None or self._lock_file is not None:
+            return True
+        Path(self.lock_path).parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    async def _run_forever(self):
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        """Start periodic compaction on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self):
+        """Stop periodic compaction"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get compaction metrics and index size history"""
+        return {
+            "policies": [policy.describe() for policy in self.policies],
+            "runs": self.runs,
+            "skipped_runs": self.skipped_runs,
+            "holds_lock": self.lock_path is None or self._lock_file is not None,
+            "deleted_count": self.deleted_count,
+            "summarized_count": self.summarized_count,
+            "summaries_created": self.summaries_created,
+            "backfilled_count": self.backfilled_count,
+            "last_error": self.last_error,
+            "history": list(self.history)
+        }
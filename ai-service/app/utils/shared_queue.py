@@ -0,0 +1,267 @@
+from typing import Any, Dict, List, Optional
+from contextlib import contextmanager
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Workers that have not reported for this long are not counted as active
+WORKER_TIMEOUT_SECONDS = 60
+
+# Stats of workers silent for this long are folded into one retired row
+WORKER_RETIRE_SECONDS = 3600
+RETIRED_WORKER_ID = "retired"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    content TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    enqueued_by TEXT NOT NULL,
+    dedup_entry_id INTEGER,
+    claimed_by TEXT,
+    claimed_at REAL
+);
+CREATE INDEX IF NOT EXISTS queue_claimed ON queue (claimed_by, id);
+CREATE TABLE IF NOT EXISTS rate_events (
+    at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS worker_stats (
+    worker_id TEXT PRIMARY KEY,
+    stats TEXT NOT NULL,
+    reported_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dedup_results (
+    enqueued_by TEXT NOT NULL,
+    dedup_entry_id INTEGER NOT NULL,
+    vector_id TEXT,
+    namespace TEXT NOT NULL,
+    completed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS dedup_results_worker ON dedup_results (enqueued_by);
+"""
+
+def default_worker_id() -> str:
+    """Identify this process among the workers sharing a queue"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def merge_stats(reports: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Sum numeric counters over worker reports, keeping the latest last_processed"""
+    totals: Dict[str, Any] = {}
+    for stats in reports:
+        for key, value in stats.items():
+            if key == "last_processed":
+                if value and (totals.get(key) is None or value > totals[key]):
+                    totals[key] = value
+            elif isinstance(value, (int, float)):
+                totals[key] = totals.get(key, 0) + value
+    return totals
+
+class SharedIngestQueue:
+    """
+    Ingestion queue, rate-limit budget and worker stats shared through SQLite.
+
+    Every uvicorn worker opens the same database file. Workers claim batches
+    of queued items inside an immediate transaction, so each item goes to one
+    worker; a claim not completed within `lease_seconds` (e.g. because the
+    worker died) is handed out again. Rate-limit slots are taken from one
+    sliding one-minute window shared by all workers, in the same transaction
+    as the claim, so a lease never runs while its worker waits for a slot.
+
+    Fingerprints for near-duplicate suppression stay in the enqueuing
+    worker, so the worker that indexes a deduplicated message posts its
+    vector ID back for the enqueuing worker to collect.
+
+    Methods block on SQLite and are meant to be called with asyncio.to_thread.
+    """
+
+    def __init__(self, path: str, max_size: int = 1000, lease_seconds: float = 300):
+        self.path = path
+        self.max_size = max_size
+        self.lease_seconds = lease_seconds
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction that holds the database lock from the start"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, worker_id: str, content: str, metadata: Dict[str, Any],
+                dedup_entry_id: Optional[int] = None) -> bool:
+        """
+        Add an item unless the queue is full
+
+        Returns:
+            Whether the item was queued
+        """
+        with self._transaction() as conn:
+            (size,) = conn.execute("SELECT COUNT(*) FROM queue").fetchone()
+            if size >= self.max_size:
+                return False
+            conn.execute(
+                "INSERT INTO queue (content, metadata, enqueued_at, enqueued_by, dedup_entry_id) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (content, json.dumps(metadata), time.time(), worker_id, dedup_entry_id)
+            )
+        return True
+
+    def claim(self, worker_id: str, limit: int, limit_per_minute: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Claim up to `limit` of the oldest unclaimed or expired items
+
+        With `limit_per_minute`, a batch is only claimed if a slot of the
+        shared per-minute budget is free, and it takes that slot.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT id, content, metadata, enqueued_at, enqueued_by, dedup_entry_id FROM queue "
+                "WHERE claimed_by IS NULL OR claimed_at < ? ORDER BY id LIMIT ?",
+                (now - self.lease_seconds, limit)
+            ).fetchall()
+            if rows and limit_per_minute is not None and not self._take_rate_slot(conn, now, limit_per_minute):
+                return []
+            conn.executemany(
+                "UPDATE queue SET claimed_by = ?, claimed_at = ? WHERE id = ?",
+                [(worker_id, now, row[0]) for row in rows]
+            )
+        return [
+            {
+                "id": row[0],
+                "content": row[1],
+                "metadata": json.loads(row[2]),
+                "enqueued_at": row[3],
+                "enqueued_by": row[4],
+                "dedup_entry_id": row[5]
+            }
+            for row in rows
+        ]
+
+    def complete(self, ids: List[int], dedup_results: Optional[List[tuple]] = None):
+        """
+        Remove processed items
+
+        Args:
+            ids: Queue IDs of the items
+            dedup_results: (enqueued_by, dedup_entry_id, vector_id, namespace)
+                for items deduplicated by another worker; vector_id is None
+                if the item could not be indexed
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany("DELETE FROM queue WHERE id = ?", [(item_id,) for item_id in ids])
+            conn.executemany(
+                "INSERT INTO dedup_results (enqueued_by, dedup_entry_id, vector_id, namespace, completed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [result + (now,) for result in dedup_results or []]
+            )
+
+    def take_dedup_results(self, worker_id: str) -> List[Dict[str, Any]]:
+        """Collect results posted for this worker's deduplicated items"""
+        now = time.time()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT dedup_entry_id, vector_id, namespace FROM dedup_results WHERE enqueued_by = ?",
+                (worker_id,)
+            ).fetchall()
+            # Results for workers that stopped collecting them are dropped
+            conn.execute(
+                "DELETE FROM dedup_results WHERE enqueued_by = ? OR completed_at < ?",
+                (worker_id, now - WORKER_RETIRE_SECONDS)
+            )
+        return [{"dedup_entry_id": row[0], "vector_id": row[1], "namespace": row[2]} for row in rows]
+
+    def _take_rate_slot(self, conn: sqlite3.Connection, now: float, limit_per_minute: int) -> bool:
+        """Take a slot from the shared per-minute budget if one is free"""
+        conn.execute("DELETE FROM rate_events WHERE at <= ?", (now - 60,))
+        (used,) = conn.execute("SELECT COUNT(*) FROM rate_events").fetchone()
+        if used >= limit_per_minute:
+            return False
+        conn.execute("INSERT INTO rate_events (at) VALUES (?)", (now,))
+        return True
+
+    def report_stats(self, worker_id: str, stats: Dict[str, Any]):
+        """
+        Publish this worker's counters
+
+        Rows of workers that have been silent for WORKER_RETIRE_SECONDS are
+        folded into a single retired row, so the table does not grow with
+        every restart and totals do not drop.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO worker_stats (worker_id, stats, reported_at) VALUES (?, ?, ?)",
+                (worker_id, json.dumps(stats), now)
+            )
+            stale = conn.execute(
+                "SELECT worker_id, stats FROM worker_stats WHERE reported_at < ? AND worker_id != ?",
+                (now - WORKER_RETIRE_SECONDS, RETIRED_WORKER_ID)
+            ).fetchall()
+            if stale:
+                row = conn.execute(
+                    "SELECT stats FROM worker_stats WHERE worker_id = ?", (RETIRED_WORKER_ID,)
+                ).fetchone()
+                reports = [json.loads(row[0])] if row else []
+                retired = merge_stats(reports + [json.loads(stats_json) for _, stats_json in stale])
+                conn.execute(
+                    "INSERT OR REPLACE INTO worker_stats (worker_id, stats, reported_at) VALUES (?, ?, ?)",
+                    (RETIRED_WORKER_ID, json.dumps(retired), now)
+                )
+                conn.executemany("DELETE FROM worker_stats WHERE worker_id = ?", [(w,) for w, _ in stale])
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        Queue depth and counters summed over all workers
+
+        Counters of workers that stopped reporting are still included, so
+        totals do not drop when a worker restarts under a new ID.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            (size,) = conn.execute("SELECT COUNT(*) FROM queue").fetchone()
+            (claimed,) = conn.execute(
+                "SELECT COUNT(*) FROM queue WHERE claimed_by IS NOT NULL AND claimed_at >= ?",
+                (now - self.lease_seconds,)
+            ).fetchone()
+            (oldest,) = conn.execute("SELECT MIN(enqueued_at) FROM queue").fetchone()
+            workers = conn.execute("SELECT worker_id, stats, reported_at FROM worker_stats").fetchall()
+
+        totals = merge_stats([json.loads(stats) for _, stats, _ in workers])
+        last_processed = totals.pop("last_processed", None)
+        active = sum(
+            1 for worker_id, _, reported_at in workers
+            if worker_id != RETIRED_WORKER_ID and reported_at >= now - WORKER_TIMEOUT_SECONDS
+        )
+
+        return {
+            "queue_size": size,
+            "claimed": claimed,
+            "queue_lag_seconds": now - oldest if oldest is not None else 0.0,
+            "workers": active,
+            "last_processed": last_processed,
+            **totals
+        }
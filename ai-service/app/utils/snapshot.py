@@ -0,0 +1,463 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from datetime import datetime
+from pathlib import Path
+import asyncio
+import fcntl
+import itertools
+import json
+import logging
+import mmap
+import shutil
+import struct
+import threading
+import time
+import numpy as np
+
+from .local_store import LocalVectorStore
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+LOCK_NAME = "worker.lock"
+
+# WAL entry frame: header length, payload length
+_FRAME = struct.Struct("<II")
+
+def write_section(directory: Path, name: str, records: List[Dict[str, Any]],
+                  vectors: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """
+    Write one snapshot section
+
+    Records are stored back to back as JSON in <name>.records, with their
+    byte offsets (count + 1 uint64 values) in <name>.offsets. Vectors, if
+    any, are stored row-major as raw float32 in <name>.vectors, row i
+    belonging to record i.
+
+    Returns:
+        The section's manifest entry
+    """
+    offsets = np.zeros(len(records) + 1, dtype=np.uint64)
+    with open(directory / f"{name}.records", "wb") as f:
+        for i, record in enumerate(records):
+            f.write(json.dumps(record, separators=(",", ":")).encode("utf-8"))
+            offsets[i + 1] = f.tell()
+    offsets.tofile(directory / f"{name}.offsets")
+
+    entry = {"count": len(records), "dimensions": None}
+    if vectors is not None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if len(vectors) != len(records):
+            raise ValueError(f"Section {name} has {len(records)} records but {len(vectors)} vectors")
+        vectors.tofile(directory / f"{name}.vectors")
+        entry["dimensions"] = int(vectors.shape[1])
+    return entry
+
+class SnapshotSection:
+    """
+    Read side of a snapshot section.
+
+    Vectors are memory-mapped copy-on-write and records are decoded on
+    access, so opening a section costs the same regardless of its size.
+    """
+
+    def __init__(self, directory: Path, name: str, entry: Dict[str, Any]):
+        self.name = name
+        self.count = entry["count"]
+        self.offsets = np.fromfile(directory / f"{name}.offsets", dtype=np.uint64)
+
+        self._records_file = open(directory / f"{name}.records", "rb")
+        size = int(self.offsets[-1])
+        self._records = mmap.mmap(self._records_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+        self.vectors = None
+        if entry["dimensions"] is not None and self.count:
+            self.vectors = np.memmap(directory / f"{name}.vectors", dtype=np.float32, mode="c",
+                                     shape=(self.count, entry["dimensions"]))
+        elif entry["dimensions"] is not None:
+            # Zero-length files cannot be mapped
+            self.vectors = np.zeros((0, entry["dimensions"]), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def record(self, i: int) -> Dict[str, Any]:
+        """Decode record i"""
+        return json.loads(self._records[int(self.offsets[i]):int(self.offsets[i + 1])])
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """Decode all records in order"""
+        for i in range(self.count):
+            yield self.record(i)
+
+class WriteAheadLog:
+    """
+    Append-only log of changes to journaled vector stores.
+
+    Each entry is a JSON header naming the store and operation, followed by
+    the added vectors as raw float32. Entries are flushed as they are
+    written; a torn entry at the end of a file (from a crash mid-write) is
+    ignored on replay.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries = 0
+        self._lock = threading.Lock()
+        self._file = open(path, "ab")
+
+    def append(self, header: Dict[str, Any], vectors: Optional[np.ndarray] = None):
+        """Append one entry"""
+        header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        payload = np.ascontiguousarray(vectors, dtype=np.float32).tobytes() if vectors is not None else b""
+        with self._lock:
+            self._file.write(_FRAME.pack(len(header_bytes), len(payload)) + header_bytes + payload)
+            self._file.flush()
+            self.entries += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    @staticmethod
+    def replay(path: Path) -> Iterator[Tuple[Dict[str, Any], Optional[np.ndarray]]]:
+        """Yield (header, vectors) for each complete entry in a log file"""
+        with open(path, "rb") as f:
+            data = f.read()
+        position = 0
+        while position + _FRAME.size <= len(data):
+            header_length, payload_length = _FRAME.unpack_from(data, position)
+            end = position + _FRAME.size + header_length + payload_length
+            if end > len(data):
+                logger.warning(f"Ignoring torn entry at the end of {path}")
+                break
+            header = json.loads(data[position + _FRAME.size:position + _FRAME.size + header_length])
+            vectors = None
+            if payload_length:
+                vectors = np.frombuffer(data, dtype=np.float32, count=payload_length // 4,
+                                        offset=position + _FRAME.size + header_length).reshape(len(header["ids"]), -1)
+            yield header, vectors
+            position = end
+
+class StoreJournal:
+    """Journal for one LocalVectorStore, tagging its WAL entries with the store's name"""
+
+    def __init__(self, manager: "SnapshotManager", name: str):
+        self.manager = manager
+        self.name = name
+
+    def log_add(self, ids: List[str], vectors: np.ndarray):
+        self.manager.wal.append({"store": self.name, "op": "add", "ids": list(ids)}, vectors)
+
+    def log_delete(self, ids: List[str]):
+        self.manager.wal.append({"store": self.name, "op": "delete", "ids": ids})
+
+    def log_clear(self):
+        self.manager.wal.append({"store": self.name, "op": "clear"})
+
+class SnapshotManager:
+    """
+    Persists in-process state to a versioned snapshot directory.
+
+    Each snapshot is a directory snapshot-<sequence> holding a manifest,
+    small JSON state blobs and record/vector sections (see write_section).
+    Vector stores registered with register_store are restored by mapping
+    their vector file, then replaying the write-ahead log of changes made
+    since the snapshot, so no vectors need to be re-fetched or re-embedded.
+    Other state is only as fresh as the latest snapshot.
+
+    The WAL is rotated at the start of every snapshot, and older logs and
+    snapshots beyond `keep` are removed once the new snapshot is complete.
+
+    Each process holds the state of its own uvicorn worker, so on restore it
+    locks the first free worker-<n> subdirectory and keeps its snapshots and
+    logs there. A restarted worker takes over the slot its predecessor
+    released, together with that worker's state.
+    """
+
+    def __init__(self, directory: str, interval_seconds: float = 300, keep: int = 2):
+        self.root = Path(directory)
+        self.directory = self.root
+        self.interval_seconds = interval_seconds
+        self.keep = keep
+        self.sequence = 0
+        self.wal: Optional[WriteAheadLog] = None
+        self._stores: Dict[str, Tuple[Callable, Callable]] = {}
+        self._sections: Dict[str, Tuple[Callable, Callable]] = {}
+        self._states: Dict[str, Tuple[Callable, Callable]] = {}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._lock_file = None
+
+        # Metrics
+        self.last_snapshot: Optional[Dict[str, Any]] = None
+        self.last_restore: Optional[Dict[str, Any]] = None
+        self.last_error: Optional[str] = None
+
+    def register_store(self, name: str,
+                       get_store: Callable[[], Optional[LocalVectorStore]],
+                       set_store: Callable[[LocalVectorStore], None]):
+        """Snapshot a vector store and journal its changes to the WAL"""
+        self._stores[name] = (get_store, set_store)
+
+    def register_section(self, name: str,
+                         dump: Callable[[], List[Dict[str, Any]]],
+                         restore: Callable[[Iterator[Dict[str, Any]]], None]):
+        """Snapshot a list of JSON records"""
+        self._sections[name] = (dump, restore)
+
+    def register_state(self, name: str,
+                       dump: Callable[[], Dict[str, Any]],
+                       restore: Callable[[Dict[str, Any]], None]):
+        """Snapshot a small JSON object inside the manifest"""
+        self._states[name] = (dump, restore)
+
+    def _snapshot_dirs(self) -> List[Tuple[int, Path]]:
+        found = []
+        for path in self.directory.glob("snapshot-*"):
+            suffix = path.name[len("snapshot-"):]
+            if suffix.isdigit() and (path / MANIFEST_NAME).exists():
+                found.append((int(suffix), path))
+        return sorted(found)
+
+    def _wal_files(self) -> List[Tuple[int, Path]]:
+        found = []
+        for path in self.directory.glob("wal-*.log"):
+            suffix = path.stem[len("wal-"):]
+            if suffix.isdigit():
+                found.append((int(suffix), path))
+        return sorted(found)
+
+    def _load_manifest(self, path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path / MANIFEST_NAME) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping unreadable snapshot {path}: {str(e)}")
+            return None
+        if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+            logger.warning(f"Skipping snapshot {path} with format version {manifest.get('format_version')}")
+            return None
+        return manifest
+
+    def _claim_worker_dir(self) -> Path:
+        """Lock the first worker subdirectory no other process holds"""
+        for slot in itertools.count():
+            path = self.root / f"worker-{slot}"
+            path.mkdir(parents=True, exist_ok=True)
+            lock_file = open(path / LOCK_NAME, "a")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                continue
+            self._lock_file = lock_file
+            return path
+
+    def _attach_journals(self):
+        for name, (get_store, _) in self._stores.items():
+            store = get_store()
+            if store is not None:
+                store.journal = StoreJournal(self, name)
+
+    def restore(self) -> Dict[str, Any]:
+        """
+        Restore registered state from the newest usable snapshot plus the WAL
+
+        Call once at startup, before the registered objects are used.
+        """
+        started = time.perf_counter()
+        if self._lock_file is None:
+            self.directory = self._claim_worker_dir()
+
+        manifest, snapshot_dir = None, None
+        for sequence, path in reversed(self._snapshot_dirs()):
+            manifest = self._load_manifest(path)
+            if manifest is not None:
+                snapshot_dir = path
+                break
+
+        stores: Dict[str, LocalVectorStore] = {}
+        restored = {"snapshot": None, "records": 0, "wal_entries": 0}
+        if manifest is not None:
+            for name, (_, set_store) in self._stores.items():
+                entry = manifest["sections"].get(f"store.{name}")
+                if entry is None:
+                    continue
+                section = SnapshotSection(snapshot_dir, f"store.{name}", entry)
+                ids = [record["id"] for record in section.records()]
+                store = LocalVectorStore.from_vectors(ids, section.vectors, manifest["stores"][name]["dtype"])
+                set_store(store)
+                stores[name] = store
+                restored["records"] += len(section)
+            for name, (_, restore) in self._sections.items():
+                entry = manifest["sections"].get(name)
+                if entry is not None:
+                    section = SnapshotSection(snapshot_dir, name, entry)
+                    restore(section.records())
+                    restored["records"] += len(section)
+            for name, (_, restore) in self._states.items():
+                if name in manifest["state"]:
+                    restore(manifest["state"][name])
+            restored["snapshot"] = manifest["sequence"]
+            self.sequence = manifest["sequence"]
+
+        # Replay changes made after the snapshot
+        first_wal = manifest["wal_sequence"] if manifest is not None else 0
+        for sequence, path in self._wal_files():
+            self.sequence = max(self.sequence, sequence)
+            if sequence < first_wal:
+                continue
+            for header, vectors in WriteAheadLog.replay(path):
+                store = stores.get(header["store"])
+                if store is None:
+                    get_store = self._stores.get(header["store"], (lambda: None, None))[0]
+                    store = get_store()
+                    if store is None:
+                        continue
+                    stores[header["store"]] = store
+                if header["op"] == "add":
+                    store.add(header["ids"], vectors)
+                elif header["op"] == "delete":
+                    store.delete(header["ids"])
+                elif header["op"] == "clear":
+                    store.clear()
+                restored["wal_entries"] += 1
+
+        # New changes go to a fresh log
+        self.sequence += 1
+        self.wal = WriteAheadLog(self.directory / f"wal-{self.sequence}.log")
+        self._attach_journals()
+
+        restored["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        self.last_restore = restored
+        logger.info(f"Restored snapshot {restored['snapshot']} with {restored['records']} records "
+                    f"and {restored['wal_entries']} WAL entries in {restored['duration_ms']} ms")
+        return restored
+
+    def _write(self, sequence: int, stores: Dict[str, LocalVectorStore], sections: Dict[str, List],
+               state: Dict[str, Any]) -> int:
+        """Export stores and write a snapshot directory, returning its size in bytes"""
+        final_dir = self.directory / f"snapshot-{sequence}"
+        tmp_dir = self.directory / f"snapshot-{sequence}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+
+        manifest = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "sequence": sequence,
+            "wal_sequence": sequence,
+            "created_at": datetime.now().isoformat(),
+            "stores": {},
+            "sections": {},
+            "state": state
+        }
+        for name, store in stores.items():
+            # Stores lock themselves, so they can be copied off the event loop
+            ids, vectors = store.export()
+            manifest["stores"][name] = {"dtype": store.dtype}
+            manifest["sections"][f"store.{name}"] = write_section(
+                tmp_dir, f"store.{name}", [{"id": vector_id} for vector_id in ids], vectors
+            )
+        for name, records in sections.items():
+            manifest["sections"][name] = write_section(tmp_dir, name, records)
+
+        # The manifest is written last, so a snapshot without one is incomplete
+        with open(tmp_dir / MANIFEST_NAME, "w") as f:
+            json.dump(manifest, f)
+        tmp_dir.rename(final_dir)
+        return sum(path.stat().st_size for path in final_dir.iterdir())
+
+    def _prune(self):
+        """Remove snapshots beyond `keep` and logs older than the oldest kept snapshot"""
+        snapshots = self._snapshot_dirs()
+        for _, path in snapshots[:-self.keep]:
+            shutil.rmtree(path, ignore_errors=True)
+        oldest_kept = snapshots[-self.keep:][0][0] if snapshots else 0
+        for sequence, path in self._wal_files():
+            if sequence < oldest_kept:
+                path.unlink(missing_ok=True)
+
+    async def snapshot(self) -> Dict[str, Any]:
+        """Write a new snapshot of all registered state"""
+        async with self._lock:
+            started = time.perf_counter()
+            try:
+                # Rotate first: every change after this point is in the new log,
+                # and replaying it over the snapshot is idempotent
+                sequence = self.sequence + 1
+                previous_wal, self.wal = self.wal, WriteAheadLog(self.directory / f"wal-{sequence}.log")
+                self.sequence = sequence
+                if previous_wal is not None:
+                    previous_wal.close()
+
+                # Other state is copied on the event loop, where it is mutated;
+                # stores are exported and everything written in a thread
+                stores = {}
+                for name, (get_store, _) in self._stores.items():
+                    store = get_store()
+                    if store is not None:
+                        stores[name] = store
+                sections = {name: dump() for name, (dump, _) in self._sections.items()}
+                state = {name: dump() for name, (dump, _) in self._states.items()}
+
+                size = await asyncio.to_thread(self._write, sequence, stores, sections, state)
+                await asyncio.to_thread(self._prune)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Error writing snapshot: {str(e)}")
+                raise
+
+            self.last_snapshot = {
+                "sequence": sequence,
+                "time": datetime.now().isoformat(),
+                "bytes": size,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+            }
+            logger.info(f"Wrote snapshot {sequence} ({size} bytes)")
+            return self.last_snapshot
+
+    async def _run_forever(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.snapshot()
+            except Exception:
+                pass
+
+    def start(self):
+        """Start periodic snapshots on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self):
+        """Stop periodic snapshots"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def close(self):
+        """Close the WAL and release this worker's subdirectory"""
+        if self.wal is not None:
+            self.wal.close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get snapshot and restore metrics"""
+        return {
+            "directory": str(self.directory),
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "sequence": self.sequence,
+            "wal_entries": self.wal.entries if self.wal is not None else 0,
+            "last_snapshot": self.last_snapshot,
+            "last_restore": self.last_restore,
+            "last_error": self.last_error
+        }
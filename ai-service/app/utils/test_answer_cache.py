@@ -0,0 +1,79 @@
+import asyncio
+import time
+import numpy as np
+
+from .answer_cache import SemanticAnswerCache, context_fingerprint
+
+DIMENSIONS = 64
+
+def unit(vector: np.ndarray) -> np.ndarray:
+    return (vector / np.linalg.norm(vector)).astype(np.float32)
+
+def similar_to(vector: np.ndarray, similarity: float, rng: np.random.Generator) -> np.ndarray:
+    """A unit vector with the given cosine similarity to `vector`"""
+    noise = rng.standard_normal(DIMENSIONS)
+    noise -= noise @ vector * vector
+    return unit(similarity * vector + np.sqrt(1 - similarity ** 2) * unit(noise))
+
+async def test_threshold_and_context():
+    """Hit only above the similarity threshold and over the same retrieved chunks"""
+    rng = np.random.default_rng(0)
+    cache = SemanticAnswerCache(DIMENSIONS, threshold=0.95, ttl_seconds=60)
+    query = unit(rng.standard_normal(DIMENSIONS))
+    chunks = [({"id": "a", "content": "deploy notes"}, 0.9), ({"id": "b", "content": "rollback plan"}, 0.8)]
+    context = context_fingerprint(chunks)
+    cache.store(query, context, "cached answer", tokens=120)
+
+    print("\n=== Threshold and Context ===")
+    near = cache.lookup(similar_to(query, 0.97, rng), context)
+    far = cache.lookup(similar_to(query, 0.90, rng), context)
+    reordered = cache.lookup(query, context_fingerprint(list(reversed(chunks))))
+    edited = cache.lookup(query, context_fingerprint([({"id": "a", "content": "deploy notes v2"}, 0.9), chunks[1]]))
+    other_chunk = cache.lookup(query, context_fingerprint(chunks[:1]))
+    print(f"0.97 similar: {near!r}, 0.90 similar: {far!r}")
+    print(f"Same chunks reordered: {reordered!r}, chunk text edited: {edited!r}, chunk missing: {other_chunk!r}")
+    print(f"Status: {cache.get_status()}")
+    return (near == "cached answer" and far is None and reordered == "cached answer"
+            and edited is None and other_chunk is None
+            and cache.hits == 2 and cache.saved_tokens == 240)
+
+async def test_ttl_and_eviction():
+    """Expire entries after the TTL and evict the oldest beyond max_entries"""
+    rng = np.random.default_rng(1)
+    context = context_fingerprint([({"id": "a", "content": "x"}, 1.0)])
+
+    print("\n=== TTL and Eviction ===")
+    cache = SemanticAnswerCache(DIMENSIONS, ttl_seconds=0.05)
+    query = unit(rng.standard_normal(DIMENSIONS))
+    cache.store(query, context, "short lived", tokens=10)
+    fresh = cache.lookup(query, context)
+    time.sleep(0.06)
+    expired = cache.lookup(query, context)
+    print(f"Before TTL: {fresh!r}, after TTL: {expired!r}, entries left: {len(cache._entries)}")
+
+    bounded = SemanticAnswerCache(DIMENSIONS, max_entries=2)
+    queries = [unit(rng.standard_normal(DIMENSIONS)) for _ in range(3)]
+    for i, q in enumerate(queries):
+        bounded.store(q, context, f"answer {i}", tokens=1)
+    results = [bounded.lookup(q, context) for q in queries]
+    print(f"After 3 stores with max_entries=2: {results}")
+
+    bounded.clear()
+    cleared = bounded.lookup(queries[2], context)
+    return (fresh == "short lived" and expired is None and len(cache._entries) == 0
+            and results == [None, "answer 1", "answer 2"] and cleared is None)
+
+async def run_tests():
+    """Run all answer cache tests"""
+    if await test_threshold_and_context():
+        print("\n✅ Threshold and context test completed")
+    else:
+        print("\n❌ Threshold and context test failed")
+
+    if await test_ttl_and_eviction():
+        print("\n✅ TTL and eviction test completed")
+    else:
+        print("\n❌ TTL and eviction test failed")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
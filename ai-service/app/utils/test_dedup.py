@@ -0,0 +1,106 @@
+import asyncio
+import random
+import time
+
+from .dedup import NearDuplicateDetector, simhash
+from .vector_store import estimate_tokens
+
+def generate_chat_traffic(count: int, seed: int = 0) -> list:
+    """Mix of unique messages, short acknowledgements, bot echoes and pasted logs"""
+    rng = random.Random(seed)
+    subjects = ["the build", "the deploy", "the migration", "the on-call rotation", "the API docs",
+                "the search index", "the billing page", "the mobile app", "the release notes"]
+    verbs = ["is blocked on", "needs a review of", "just finished", "found a bug in", "is rewriting"]
+    people = ["Ana", "Ben", "Chen", "Dara", "Eli", "Fay"]
+    vocabulary = ["cache", "latency", "flaky", "rollback", "schema", "token", "webhook", "retry",
+                  "timeout", "pager", "staging", "config", "quota", "index", "cron", "ticket"]
+    messages = []
+    for i in range(count):
+        kind = rng.random()
+        if kind < 0.2:
+            messages.append(rng.choice(["thanks!", "Thanks", "thanks :)", "ok", "OK!", "lgtm", "LGTM 👍"]))
+        elif kind < 0.35:
+            messages.append(f"[bot] Build #{rng.randint(1000, 9999)} passed on main in {rng.randint(60, 900)}s")
+        elif kind < 0.45:
+            messages.append(f"ERROR 2024-01-{rng.randint(10, 28)} 12:{rng.randint(10, 59)}:07 worker-{rng.randint(1, 9)} "
+                            "connection reset by peer while reading response from upstream")
+        else:
+            messages.append(f"{rng.choice(people)} {rng.choice(verbs)} {rng.choice(subjects)} "
+                            f"because of the {' '.join(rng.sample(vocabulary, 4))} issue")
+    return messages
+
+async def test_near_duplicates():
+    """Check that near-identical variants collide and distinct messages do not"""
+    pairs = [
+        ("[bot] Build #1234 passed on main in 312s", "[bot] Build #1234 passed on main in 312s!", True),
+        ("thanks!", "Thanks", True),
+        ("Ana is blocked on the deploy", "Ben just finished the migration", False),
+        # Messages that differ only in numbers are distinct and must be kept
+        ("[bot] Build #1234 passed on main in 312s", "[bot] Build #9876 passed on main in 95s", False),
+        ("PR #977 approved", "PR #412 approved", False),
+        ("Invoice total is $99", "Invoice total is $1200", False),
+    ]
+    print("\n=== SimHash Pairs ===")
+    ok = True
+    for a, b, expected in pairs:
+        detector = NearDuplicateDetector(max_distance=3)
+        detector.find_or_add(a)
+        _, is_duplicate = detector.find_or_add(b)
+        distance = (simhash(a) ^ simhash(b)).bit_count()
+        print(f"distance {distance:>2}, duplicate {is_duplicate!s:>5} | {a!r} vs {b!r}")
+        ok = ok and is_duplicate == expected
+    return ok
+
+async def test_time_window():
+    """Only messages within the window of each other count as duplicates"""
+    detector = NearDuplicateDetector(max_distance=3, window_seconds=600)
+    start = 1_700_000_000.0
+    detector.find_or_add("deploy is done", "general", now=start)
+    _, soon = detector.find_or_add("deploy is done", "general", now=start + 300)
+    _, later = detector.find_or_add("deploy is done", "general", now=start + 1500)
+    print("\n=== Time Window ===")
+    print(f"Repeat after 5 min: duplicate {soon}; after 25 min: duplicate {later}; stored: {len(detector)}")
+    return soon and not later and len(detector) == 1
+
+async def test_suppression_counts():
+    """Report suppressed items and saved embedding tokens on synthetic traffic"""
+    messages = generate_chat_traffic(20000)
+    detector = NearDuplicateDetector(max_distance=3)
+    suppressed = 0
+    saved_tokens = 0
+
+    start = time.perf_counter()
+    for message in messages:
+        _, is_duplicate = detector.find_or_add(message, scope="general")
+        if is_duplicate:
+            suppressed += 1
+            saved_tokens += estimate_tokens(message)
+    elapsed = time.perf_counter() - start
+
+    total_tokens = sum(estimate_tokens(m) for m in messages)
+    print("\n=== Suppression on Synthetic Traffic ===")
+    print(f"Messages: {len(messages)}, stored fingerprints: {len(detector)}")
+    print(f"Suppressed: {suppressed} ({suppressed / len(messages):.1%})")
+    print(f"Saved embedding tokens: {saved_tokens} of {total_tokens}")
+    print(f"Throughput: {len(messages) / elapsed:,.0f} messages/s")
+    return suppressed > 0
+
+async def run_tests():
+    """Run all near-duplicate tests"""
+    if await test_near_duplicates():
+        print("\n✅ SimHash pair test completed")
+    else:
+        print("\n❌ SimHash pair test failed")
+
+    if await test_time_window():
+        print("\n✅ Time window test completed")
+    else:
+        print("\n❌ Time window test failed")
+
+    if await test_suppression_counts():
+        print("\n✅ Suppression count test completed")
+    else:
+        print("\n❌ Suppression count test failed")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
@@ -0,0 +1,54 @@
+import asyncio
+import time
+import numpy as np
+
+from .embedding_providers import HashingEmbeddingProvider
+
+async def test_hashing_similarity():
+    """Check that the local embedder ranks related texts above unrelated ones"""
+    provider = HashingEmbeddingProvider(dimensions=1536)
+    texts = [
+        "The deploy to production failed because of a missing environment variable",
+        "Production deployment broke: an environment variable was missing",
+        "Who wants to get tacos for lunch today?",
+    ]
+    vectors = await provider.embed_documents(texts)
+    query = await provider.embed_query("why did the production deploy fail")
+
+    print("\n=== Hashing Embedder Similarity ===")
+    print(f"Shape: {vectors.shape}, norms: {np.linalg.norm(vectors, axis=1).round(3)}")
+    scores = vectors @ query
+    for text, score in zip(texts, scores):
+        print(f"{score:.3f} | {text}")
+
+    return scores[0] > scores[2] and scores[1] > scores[2]
+
+async def test_hashing_throughput():
+    """Measure local embedding throughput for chat-sized and chunk-sized texts"""
+    provider = HashingEmbeddingProvider(dimensions=1536)
+    message = "Can someone review the PR for the flaky integration tests before standup?"
+    chunk = " ".join([message] * 12)
+
+    print("\n=== Hashing Embedder Throughput ===")
+    for label, text, count in [("message", message, 5000), ("1KB chunk", chunk, 1000)]:
+        start = time.perf_counter()
+        await provider.embed_documents([text] * count)
+        elapsed = time.perf_counter() - start
+        print(f"{label:>10}: {count / elapsed:,.0f} texts/s")
+
+    return True
+
+async def run_tests():
+    """Run all embedding provider tests"""
+    if await test_hashing_similarity():
+        print("\n✅ Hashing similarity test completed")
+    else:
+        print("\n❌ Hashing similarity test failed")
+
+    if await test_hashing_throughput():
+        print("\n✅ Hashing throughput test completed")
+    else:
+        print("\n❌ Hashing throughput test failed")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
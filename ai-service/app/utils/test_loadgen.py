@@ -0,0 +1,106 @@
+import asyncio
+from collections import Counter
+
+from .loadgen import check_slos, generate_trace, is_drained, summarize
+
+async def test_generate_trace():
+    """Traces are reproducible, sorted, follow the mix and put prefetches before their query"""
+    print("\n=== Generate Trace ===")
+    mix = {"realtime": 0.8, "query": 0.2}
+    events = generate_trace(60, rate=10, mix=mix, bursts_per_minute=0, wave_amplitude=0, seed=7)
+    again = generate_trace(60, rate=10, mix=mix, bursts_per_minute=0, wave_amplitude=0, seed=7)
+    kinds = Counter(event["type"] for event in events)
+    realtime_share = kinds["realtime"] / len(events)
+
+    bursty = generate_trace(60, rate=10, mix=mix, bursts_per_minute=6, burst_factor=10, wave_amplitude=0, seed=7)
+    with_prefetch = generate_trace(60, rate=10, mix=mix, bursts_per_minute=0, wave_amplitude=0, prefetch=True, seed=7)
+    queries = {e["session_id"]: e for e in with_prefetch if e["type"] == "query"}
+    prefetches = [e for e in with_prefetch if e["type"] == "prefetch"]
+    ordered = all(
+        p["t"] <= queries[p["session_id"]]["t"] and queries[p["session_id"]]["text"].startswith(p["text"])
+        for p in prefetches
+    )
+    print(f"{len(events)} events ({dict(kinds)}), realtime share {realtime_share:.2f}, same seed same trace: {events == again}")
+    print(f"With bursts: {len(bursty)} events; with prefetch: {len(prefetches)} prefetches for {len(queries)} queries, "
+          f"all before and a prefix of their query: {ordered}")
+    return (events == again and all(a["t"] <= b["t"] for a, b in zip(events, events[1:]))
+            and set(kinds) == {"realtime", "query"} and 0.7 < realtime_share < 0.9
+            and 400 < len(events) < 800 and len(bursty) > len(events)
+            and len(prefetches) == 2 * len(queries) and ordered)
+
+def fake_run():
+    """A replay of 100 queries over 10 s, one slow and two failed, and 3 status samples"""
+    records = [
+        {"type": "query", "status": 200, "latency_ms": 100.0 + i, "service_ms": 90.0, "completed_at": i / 10}
+        for i in range(97)
+    ]
+    records.append({"type": "query", "status": 200, "latency_ms": 5000.0, "service_ms": 4900.0, "completed_at": 9.8})
+    records += [{"type": "query", "status": 503, "latency_ms": 50.0, "service_ms": 40.0, "completed_at": 9.9}] * 2
+    samples = [
+        {"t": 0.0, "queue_size": 0, "drained": True, "queue_lag_seconds": 0.0, "processed_count": 0, "failed_count": 0},
+        {"t": 5.0, "queue_size": 40, "drained": False, "queue_lag_seconds": 4.0, "processed_count": 50, "failed_count": 1},
+        {"t": 10.0, "queue_size": 0, "drained": True, "queue_lag_seconds": 0.0, "processed_count": 100, "failed_count": 1}
+    ]
+    return {"records": records, "samples": samples, "traffic_seconds": 10.0, "drain_seconds": 1.5,
+            "max_send_delay_ms": 2.0}
+
+async def test_summarize():
+    """Throughput, error rate, percentiles and queue stats from raw measurements"""
+    print("\n=== Summarize ===")
+    summary = summarize(fake_run())
+    query = summary["endpoints"]["query"]
+    queue = summary["queue"]
+    print(f"Query: {query['requests']} requests, {query['throughput_rps']} rps, error rate {query['error_rate']}, "
+          f"p50 {query['latency']['p50_ms']} ms, max {query['latency']['max_ms']} ms, codes {query['status_codes']}")
+    print(f"Queue: {queue}")
+    return (query["requests"] == 100 and query["throughput_rps"] == 10.0 and query["errors"] == 2
+            and query["error_rate"] == 0.02 and query["latency"]["max_ms"] == 5000.0
+            and query["status_codes"] == {"200": 98, "503": 2}
+            and queue["lag"]["max"] == 4.0 and queue["max_size"] == 40
+            and queue["processed_per_second"] == 10.0 and queue["failed"] == 1 and queue["drain_seconds"] == 1.5)
+
+async def test_check_slos():
+    """Targets pass, fail, or are skipped when nothing was measured"""
+    print("\n=== Check SLOs ===")
+    summary = summarize(fake_run())
+    result = check_slos(summary, {
+        "query": {"p50_ms": 200, "max_ms": 1000, "error_rate": 0.05},
+        "file": {"p95_ms": 10000},
+        "queue_lag_seconds": {"max": 5}
+    })
+    statuses = {f"{check['slo']}.{check['metric']}": check["status"] for check in result["checks"]}
+    passing = check_slos(summary, {"query": {"p50_ms": 200}, "file": {"p95_ms": 10000}})
+    print(f"Checks: {statuses}, passed: {result['passed']}; with only passing or skipped targets: {passing['passed']}")
+    return (statuses == {"query.p50_ms": "passed", "query.max_ms": "failed", "query.error_rate": "passed",
+                         "file.p95_ms": "skipped", "queue_lag_seconds.max": "passed"}
+            and not result["passed"] and passing["passed"])
+
+async def test_is_drained():
+    """The queue is only drained when nothing is queued, in flight or in a pending window"""
+    print("\n=== Drain Check ===")
+    idle = {"queue_size": 0, "in_flight": 0, "is_processing": False, "packing": {"pending_windows": 0}}
+    busy = [
+        {**idle, "in_flight": 10, "is_processing": True},
+        {**idle, "packing": {"pending_windows": 2}},
+        {**idle, "queue_size": 3}
+    ]
+    unpacked = {"queue_size": 0, "is_processing": False, "packing": None}
+    print(f"Idle: {is_drained(idle)}, without packing: {is_drained(unpacked)}, "
+          f"busy (in flight, pending window, queued): {[is_drained(status) for status in busy]}")
+    return is_drained(idle) and is_drained(unpacked) and not any(is_drained(status) for status in busy)
+
+async def run_tests():
+    """Run all load generator tests"""
+    for name, test in [
+        ("Generate trace", test_generate_trace),
+        ("Summarize", test_summarize),
+        ("Check SLOs", test_check_slos),
+        ("Drain check", test_is_drained)
+    ]:
+        if await test():
+            print(f"\n✅ {name} test completed")
+        else:
+            print(f"\n❌ {name} test failed")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
@@ -0,0 +1,80 @@
+import asyncio
+import random
+import time
+import numpy as np
+
+from .embeddings import get_embeddings, truncate_embeddings, FULL_DIMENSIONS
+
+TOPICS = [
+    "deploying the web app", "the quarterly roadmap", "database migrations",
+    "the onboarding checklist", "flaky integration tests", "customer support tickets",
+    "the design review", "vector search latency", "team lunch plans", "the release schedule"
+]
+TEMPLATES = [
+    "Can someone take a look at {topic} before Friday?",
+    "I pushed a fix related to {topic}, please review.",
+    "Notes from today's meeting about {topic} are in the doc.",
+    "Is anyone else blocked on {topic} right now?",
+    "Quick update: {topic} is mostly done, a few edge cases left.",
+    "We should revisit {topic} next sprint."
+]
+DIMENSIONS = [128, 256, 512, 768, FULL_DIMENSIONS]
+K = 5
+RESCORE_FACTOR = 4
+
+def generate_texts(count: int, seed: int) -> list:
+    """Generate chat-like sentences"""
+    rng = random.Random(seed)
+    return [
+        f"{rng.choice(TEMPLATES).format(topic=rng.choice(TOPICS))} (#{i})"
+        for i in range(count)
+    ]
+
+def top_k(corpus: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    """Exact top-k row indices by dot product"""
+    scores = corpus @ query
+    candidates = np.argpartition(-scores, min(k, len(scores) - 1))[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+async def benchmark_dimensions():
+    """Compare recall, latency and memory of coarse and two-stage search"""
+    print("Embedding corpus and queries...")
+    corpus = np.asarray(await get_embeddings(generate_texts(500, seed=1)), dtype=np.float32)
+    queries = np.asarray(await get_embeddings(generate_texts(50, seed=2)), dtype=np.float32)
+    truth = [set(top_k(corpus, query, K).tolist()) for query in queries]
+
+    print(f"\n=== Matryoshka Benchmark (n={len(corpus)}, k={K}) ===")
+    print(f"{'dims':>6} {'coarse recall':>14} {'2-stage recall':>15} {'ms/query':>9} {'index MB':>9} {'local MB':>9}")
+    for dims in DIMENSIONS:
+        coarse_corpus = truncate_embeddings(corpus, dims)
+        coarse_queries = truncate_embeddings(queries, dims)
+
+        coarse_hits = 0
+        rescored_hits = 0
+        start = time.perf_counter()
+        for query, coarse_query, expected in zip(queries, coarse_queries, truth):
+            coarse = top_k(coarse_corpus, coarse_query, K)
+            coarse_hits += len(expected & set(coarse.tolist()))
+
+            candidates = top_k(coarse_corpus, coarse_query, K * 2 * RESCORE_FACTOR)
+            rescored = candidates[np.argsort(-(corpus[candidates] @ query))[:K]]
+            rescored_hits += len(expected & set(rescored.tolist()))
+        elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        total = K * len(queries)
+        index_mb = coarse_corpus.nbytes / 1e6
+        local_mb = corpus.nbytes / 1e6 if dims < FULL_DIMENSIONS else 0.0
+        print(f"{dims:>6} {coarse_hits / total:>14.3f} {rescored_hits / total:>15.3f} "
+              f"{elapsed_ms:>9.3f} {index_mb:>9.2f} {local_mb:>9.2f}")
+
+    return True
+
+async def run_tests():
+    """Run the Matryoshka retrieval benchmark"""
+    if await benchmark_dimensions():
+        print("\n✅ Matryoshka benchmark completed")
+    else:
+        print("\n❌ Matryoshka benchmark failed")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
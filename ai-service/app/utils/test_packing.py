@@ -0,0 +1,129 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+from . import realtime_processor
+from .conversation_packer import ConversationPacker
+from .realtime_processor import RealTimeProcessor
+from .vector_store import estimate_tokens
+
+BATCH_SIZE = 10
+
+def generate_conversations(count: int, channels: int = 8, seed: int = 0) -> list:
+    """Short chat messages across channels, in bursts separated by quiet periods"""
+    rng = random.Random(seed)
+    words = ["deploy", "build", "review", "merge", "cache", "latency", "rollback", "ticket",
+             "staging", "schema", "flaky", "test", "pager", "config", "release", "docs"]
+    people = ["ana", "ben", "chen", "dara", "eli", "fay"]
+    now = datetime(2024, 1, 15, 9, 0)
+    messages = []
+    for _ in range(count):
+        # Mostly seconds apart, occasionally a long pause
+        now += timedelta(seconds=rng.choice([rng.randint(2, 40)] * 19 + [rng.randint(600, 3600)]))
+        channel = f"channel-{min(int(rng.expovariate(0.5)), channels - 1)}"
+        text = " ".join(rng.choices(words, k=rng.randint(3, 14)))
+        messages.append((text, {
+            "channel_id": channel,
+            "username": rng.choice(people),
+            "source": "chat",
+            "timestamp": now.isoformat()
+        }))
+    return messages
+
+async def test_window_boundaries():
+    """Check that gaps, token limits and channels split windows"""
+    packer = ConversationPacker(max_gap_seconds=60, max_tokens=20, overlap_messages=1)
+    start = datetime(2024, 1, 1, 12, 0)
+    meta = lambda channel, seconds: {"channel_id": channel, "timestamp": (start + timedelta(seconds=seconds)).isoformat()}
+
+    a = packer.add("hello there", meta("a", 0))
+    b = packer.add("hi, how are you", meta("a", 10))
+    other = packer.add("different channel", meta("b", 12))
+    after_gap = packer.add("back after lunch", meta("a", 4000))
+    long = packer.add("x" * 100, meta("a", 4010))
+
+    print("\n=== Window Boundaries ===")
+    print(f"Same window within gap: {a['id'] == b['id']}")
+    print(f"Separate window per channel: {other['id'] != a['id']}")
+    print(f"New window after gap: {after_gap['id'] != a['id']}, carried overlap: {len(after_gap['messages']) == 1}")
+    print(f"New window past token limit: {long['id'] != after_gap['id']}, carried overlap: {len(long['messages']) == 2}")
+    print(f"Window text:\n{packer.window_text(b)}")
+    return (a["id"] == b["id"] and other["id"] != a["id"] and after_gap["id"] != a["id"]
+            and len(after_gap["messages"]) == 1 and long["id"] != after_gap["id"] and len(long["messages"]) == 2)
+
+async def test_failed_window_retry():
+    """Windows whose upsert failed are re-indexed with the next batch"""
+    upserts = []
+    failures = {"left": 1}
+
+    async def flaky_add_texts(texts, metadatas=None, ids=None):
+        if failures["left"]:
+            failures["left"] -= 1
+            raise ConnectionError("pinecone unavailable")
+        upserts.append(ids)
+        return ids
+
+    original = realtime_processor.add_texts
+    realtime_processor.add_texts = flaky_add_texts
+    try:
+        processor = RealTimeProcessor(packer=ConversationPacker())
+        start = datetime.now()
+        item = lambda text, channel: {"content": text, "metadata": {"channel_id": channel}, "timestamp": start}
+
+        print("\n=== Failed Window Retry ===")
+        failed = not await processor._process_batch([item("deploy failed", "a")])
+        pending = processor.packer.get_status()["pending_windows"]
+        retried = await processor._process_batch([item("lunch?", "b")])
+        status = processor.packer.get_status()
+        print(f"First batch failed: {failed}, windows pending: {pending}; next batch indexed: {retried}, "
+              f"upserts: {len(upserts)}, windows pending after: {status['pending_windows']}")
+        return (failed and pending == 1 and retried and len(upserts) == 2
+                and status["pending_windows"] == 0 and processor.queue_lag_seconds() == 0.0)
+    finally:
+        realtime_processor.add_texts = original
+
+async def benchmark_vector_reduction():
+    """Compare vectors stored and upserts issued with and without packing"""
+    messages = generate_conversations(10000)
+    packer = ConversationPacker()
+
+    upserts = 0
+    embedded_tokens = 0
+    for start in range(0, len(messages), BATCH_SIZE):
+        # Like RealTimeProcessor: each changed window is re-embedded once per batch
+        windows = {}
+        for text, metadata in messages[start:start + BATCH_SIZE]:
+            window = packer.add(text, metadata)
+            windows[window["id"]] = window
+        upserts += len(windows)
+        embedded_tokens += sum(estimate_tokens(packer.window_text(w)) for w in windows.values())
+
+    message_tokens = sum(estimate_tokens(text) for text, _ in messages)
+    status = packer.get_status()
+    print("\n=== Vector Count on Synthetic Chat Traffic ===")
+    print(f"Messages: {len(messages)}")
+    print(f"Vectors stored: {len(messages)} unpacked vs {status['windows_created']} packed "
+          f"({status['vector_reduction']:.1%} fewer)")
+    print(f"Upserts issued: {len(messages)} unpacked vs {upserts} packed")
+    print(f"Embedded tokens: {message_tokens} unpacked vs {embedded_tokens} packed")
+    return status["windows_created"] < len(messages)
+
+async def run_tests():
+    """Run all packing tests"""
+    if await test_window_boundaries():
+        print("\n✅ Window boundary test completed")
+    else:
+        print("\n❌ Window boundary test failed")
+
+    if await test_failed_window_retry():
+        print("\n✅ Failed window retry test completed")
+    else:
+        print("\n❌ Failed window retry test failed")
+
+    if await benchmark_vector_reduction():
+        print("\n✅ Vector reduction benchmark completed")
+    else:
+        print("\n❌ Vector reduction benchmark failed")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
@@ -0,0 +1,95 @@
+import asyncio
+
+from .prefetch import QueryPrefetcher
+
+PARAMS = {"k": 4, "filter": None, "namespace": None}
+
+class FakeRetrieval:
+    """Stand-in retrieval that records which texts ran to completion"""
+
+    def __init__(self, delay: float = 0.02):
+        self.delay = delay
+        self.finished = []
+
+    def __call__(self, text: str):
+        async def run():
+            await asyncio.sleep(self.delay)
+            self.finished.append(text)
+            return {"results": [f"result for {text}"]}
+        return run
+
+async def test_supersede_and_reuse():
+    """A newer text cancels the session's prefetch; the same text reuses it"""
+    prefetcher = QueryPrefetcher(min_similarity=0.85)
+    retrieval = FakeRetrieval()
+
+    print("\n=== Supersede and Reuse ===")
+    statuses = [
+        prefetcher.prefetch("s1", text, PARAMS, retrieval(text))
+        for text in ["how do I deplo", "how do I deploy to", "How do I  deploy to", "hi"]
+    ]
+    result = await prefetcher.take("s1", "how do I deploy to", PARAMS)
+    await asyncio.sleep(retrieval.delay * 2)
+    print(f"Statuses: {statuses}, retrievals finished: {retrieval.finished}")
+    print(f"Taken: {result}")
+    return (statuses == ["started", "started", "reused", "skipped"]
+            and retrieval.finished == ["how do I deploy to"]
+            and result["exact"] and result["results"] == ["result for how do I deploy to"]
+            and prefetcher.superseded == 1 and prefetcher.reused == 1)
+
+async def test_similarity_and_params():
+    """Close final texts use the prefetch; distant texts or other parameters do not"""
+    prefetcher = QueryPrefetcher(min_similarity=0.85)
+    retrieval = FakeRetrieval()
+
+    print("\n=== Similarity and Parameters ===")
+    prefetcher.prefetch("close", "how do I deploy to stag", PARAMS, retrieval("close"))
+    prefetcher.prefetch("far", "what is for lunch today", PARAMS, retrieval("far"))
+    prefetcher.prefetch("params", "how do I deploy to staging", PARAMS, retrieval("params"))
+    # Unusable prefetches still running are cancelled
+    far = await prefetcher.take("far", "how do I deploy to staging", PARAMS)
+    other_params = await prefetcher.take("params", "how do I deploy to staging", {**PARAMS, "k": 8})
+    close = await prefetcher.take("close", "How do I deploy to staging?", PARAMS)
+    await asyncio.sleep(retrieval.delay * 2)
+    print(f"Close: exact={close['exact']}, similarity={close['similarity']}; far: {far}; other params: {other_params}")
+    print(f"Retrievals finished: {retrieval.finished}, status: {prefetcher.get_status()}")
+    return (close is not None and not close["exact"] and close["similarity"] >= 0.85
+            and far is None and other_params is None
+            and retrieval.finished == ["close"]
+            and prefetcher.hits == 1 and prefetcher.misses == 2)
+
+async def test_ttl_and_eviction():
+    """Prefetches expire after the TTL, and the least recently used sessions are dropped"""
+    retrieval = FakeRetrieval(delay=0)
+
+    print("\n=== TTL and Eviction ===")
+    expiring = QueryPrefetcher(ttl_seconds=0.05)
+    expiring.prefetch("s1", "how do I deploy to staging", PARAMS, retrieval("s1"))
+    await asyncio.sleep(0.06)
+    expired = await expiring.take("s1", "how do I deploy to staging", PARAMS)
+
+    bounded = QueryPrefetcher(max_sessions=2)
+    for session in ["a", "b", "c"]:
+        bounded.prefetch(session, f"query for session {session}", PARAMS, retrieval(session))
+    # "a" was dropped for "c"; touching "b" makes "c" the next to go
+    bounded.prefetch("b", "query for session b", PARAMS, retrieval("b"))
+    bounded.prefetch("d", "query for session d", PARAMS, retrieval("d"))
+    kept = sorted(bounded._sessions)
+    print(f"After TTL: {expired}, expired count: {expiring.expired}; sessions kept with max_sessions=2: {kept}")
+    bounded.clear()
+    return expired is None and expiring.expired == 1 and kept == ["b", "d"] and not bounded._sessions
+
+async def run_tests():
+    """Run all prefetch tests"""
+    for name, test in [
+        ("Supersede and reuse", test_supersede_and_reuse),
+        ("Similarity and parameters", test_similarity_and_params),
+        ("TTL and eviction", test_ttl_and_eviction)
+    ]:
+        if await test():
+            print(f"\n✅ {name} test completed")
+        else:
+            print(f"\n❌ {name} test failed")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
@@ -0,0 +1,71 @@
+import asyncio
+import sys
+import tempfile
+import time
+import numpy as np
+
+from .local_store import LocalVectorStore, STORAGE_DTYPES
+
+DIMENSIONS = 1536
+CORPUS_SIZE = 20000
+QUERY_COUNT = 100
+K = 10
+
+def generate_vectors(count: int, rng: np.random.Generator, centers: np.ndarray) -> np.ndarray:
+    """Generate unit vectors clustered around topic centers, like chat embeddings"""
+    assignments = rng.integers(0, len(centers), size=count)
+    vectors = centers[assignments] + 0.6 * rng.standard_normal((count, DIMENSIONS)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def python_list_bytes(vectors: np.ndarray) -> int:
+    """Approximate footprint of the same vectors held as lists of Python floats"""
+    row = vectors[0].tolist()
+    return len(vectors) * (sys.getsizeof(row) + sum(sys.getsizeof(x) for x in row))
+
+async def benchmark_quantization():
+    """Compare memory, search latency and recall across storage dtypes"""
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((50, DIMENSIONS)).astype(np.float32)
+    corpus = generate_vectors(CORPUS_SIZE, rng, centers)
+    queries = generate_vectors(QUERY_COUNT, rng, centers)
+    ids = [f"vec-{i}" for i in range(CORPUS_SIZE)]
+
+    exact = LocalVectorStore(DIMENSIONS, dtype="float32")
+    exact.add(ids, corpus)
+    truth = [set(vector_id for vector_id, _ in exact.search(query, K)) for query in queries]
+
+    print(f"\n=== Quantization Benchmark (n={CORPUS_SIZE}, d={DIMENSIONS}, k={K}) ===")
+    print(f"Python lists: {python_list_bytes(corpus) / 1e6:.1f} MB")
+    print(f"{'dtype':>8} {'MB':>8} {'recall':>8} {'ms/query':>9} {'mmap load ms':>13}")
+    for dtype in STORAGE_DTYPES:
+        store = LocalVectorStore(DIMENSIONS, dtype=dtype)
+        store.add(ids, corpus)
+
+        start = time.perf_counter()
+        results = [store.search(query, K) for query in queries]
+        search_ms = (time.perf_counter() - start) * 1000 / QUERY_COUNT
+
+        hits = sum(len(expected & set(vector_id for vector_id, _ in found))
+                   for expected, found in zip(truth, results))
+
+        with tempfile.TemporaryDirectory() as directory:
+            store.save(directory)
+            start = time.perf_counter()
+            mapped = LocalVectorStore.load(directory, mmap=True)
+            load_ms = (time.perf_counter() - start) * 1000
+            assert mapped.search(queries[0], K) == results[0]
+
+        print(f"{dtype:>8} {store.nbytes / 1e6:>8.1f} {hits / (K * QUERY_COUNT):>8.3f} "
+              f"{search_ms:>9.2f} {load_ms:>13.1f}")
+
+    return True
+
+async def run_tests():
+    """Run the quantization benchmark"""
+    if await benchmark_quantization():
+        print("\n✅ Quantization benchmark completed")
+    else:
+        print("\n❌ Quantization benchmark failed")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
@@ -0,0 +1,161 @@
+import asyncio
+import threading
+import time
+
+from .resilience import CircuitBreaker, CircuitOpenError, Dependency, DependencyTimeoutError, is_transient
+
+class FakeApiError(Exception):
+    """Stand-in for an SDK error carrying an HTTP status"""
+
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+async def test_breaker_cycle():
+    """Open after the failure threshold, let one trial through, then close"""
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=0.05)
+    print("\n=== Circuit Breaker Cycle ===")
+    states = []
+    for _ in range(3):
+        breaker.record_failure()
+        states.append(breaker.state)
+    rejected = not breaker.allow_request()
+
+    await asyncio.sleep(0.06)
+    trial = breaker.allow_request()
+    second_trial = breaker.allow_request()
+    half_open = breaker.state
+    breaker.record_failure()
+    reopened = breaker.state
+
+    await asyncio.sleep(0.06)
+    breaker.allow_request()
+    breaker.record_success()
+    print(f"States: {states}, rejected while open: {rejected}, half-open: {half_open}, "
+          f"one trial only: {trial and not second_trial}, failed trial: {reopened}, after success: {breaker.state}")
+    return (states == ["closed", "closed", "open"] and rejected and trial and not second_trial
+            and half_open == "half_open" and reopened == "open" and breaker.state == "closed")
+
+async def test_error_classification():
+    """Retry transient errors; raise caller errors at once without tripping the breaker"""
+    dependency = Dependency("test", timeout=1, max_concurrency=2, max_retries=2, failure_threshold=2)
+    calls = {"bad": 0, "flaky": 0}
+
+    async def bad_filter():
+        calls["bad"] += 1
+        raise FakeApiError(400)
+
+    async def flaky():
+        calls["flaky"] += 1
+        if calls["flaky"] < 2:
+            raise FakeApiError(503)
+        return "ok"
+
+    print("\n=== Error Classification ===")
+    for _ in range(5):
+        try:
+            await dependency.call(bad_filter)
+        except FakeApiError:
+            pass
+    result = await dependency.call(flaky)
+    print(f"400s: {calls['bad']} calls, breaker {dependency.breaker.state}, client errors {dependency.client_errors}")
+    print(f"503 then success: {calls['flaky']} calls, result {result!r}, retries {dependency.retries}")
+    print(f"Transient: 429={is_transient(FakeApiError(429))}, 404={is_transient(FakeApiError(404))}, "
+          f"timeout={is_transient(TimeoutError())}, ValueError={is_transient(ValueError())}")
+    return (calls["bad"] == 5 and dependency.breaker.state == "closed" and dependency.client_errors == 5
+            and result == "ok" and calls["flaky"] == 2
+            and is_transient(FakeApiError(429)) and not is_transient(FakeApiError(404))
+            and is_transient(TimeoutError()) and not is_transient(ValueError()))
+
+async def test_deadline_covers_retries():
+    """A call's attempts and backoffs share one deadline, and timeouts are not retried"""
+    dependency = Dependency("test", timeout=0.5, max_concurrency=2, max_retries=5, failure_threshold=10)
+    calls = {"hang": 0, "flaky": 0}
+
+    async def hang():
+        calls["hang"] += 1
+        await asyncio.sleep(1)
+
+    async def flaky():
+        calls["flaky"] += 1
+        raise FakeApiError(503)
+
+    print("\n=== Deadline Across Retries ===")
+    timings = {}
+    for name, fn, error in [("hang", hang, DependencyTimeoutError), ("flaky", flaky, FakeApiError)]:
+        start = time.perf_counter()
+        try:
+            await dependency.call(fn)
+        except error:
+            pass
+        timings[name] = (time.perf_counter() - start) * 1000
+    print(f"Hanging call: {calls['hang']} attempt(s) in {timings['hang']:.0f} ms; "
+          f"failing call: {calls['flaky']} attempt(s) in {timings['flaky']:.0f} ms (timeout 500 ms, 5 retries)")
+    return calls["hang"] == 1 and timings["hang"] < 550 and 1 < calls["flaky"] < 6 and timings["flaky"] < 550
+
+async def test_blocking_slot_held():
+    """A timed-out worker thread keeps its concurrency slot until it returns"""
+    dependency = Dependency("test", timeout=0.05, max_concurrency=1, failure_threshold=10)
+    release = threading.Event()
+
+    print("\n=== Blocking Call Timeout ===")
+    try:
+        await dependency.call_sync(release.wait, 5)
+        timed_out = False
+    except DependencyTimeoutError:
+        timed_out = True
+    held = dependency.in_flight
+
+    # The only slot is still taken, so the next call is rejected as busy
+    start = time.perf_counter()
+    try:
+        await dependency.call_sync(lambda: "late")
+        busy = False
+    except Exception as e:
+        busy = type(e).__name__ == "DependencyBusyError"
+    waited_ms = (time.perf_counter() - start) * 1000
+
+    release.set()
+    await asyncio.sleep(0.05)
+    result = await dependency.call_sync(lambda: "free")
+    print(f"Timed out: {timed_out}, slots held after timeout: {held}, next call busy: {busy} "
+          f"after {waited_ms:.0f} ms, after thread returned: {result!r} (in flight {dependency.in_flight})")
+    return timed_out and held == 1 and busy and result == "free" and dependency.in_flight == 0
+
+async def test_open_circuit_rejects():
+    """Transient failures open the circuit and later calls fail fast"""
+    dependency = Dependency("test", timeout=1, max_concurrency=2, failure_threshold=2, reset_timeout=60)
+
+    async def down():
+        raise ConnectionError("connection refused")
+
+    print("\n=== Open Circuit ===")
+    for _ in range(2):
+        try:
+            await dependency.call(down)
+        except ConnectionError:
+            pass
+    try:
+        await dependency.call(down)
+        rejected = False
+    except CircuitOpenError:
+        rejected = True
+    print(f"Breaker: {dependency.breaker.state}, fast rejection: {rejected}, rejected_open: {dependency.rejected_open}")
+    return dependency.breaker.state == "open" and rejected
+
+async def run_tests():
+    """Run all resilience tests"""
+    for name, test in [
+        ("Circuit breaker cycle", test_breaker_cycle),
+        ("Error classification", test_error_classification),
+        ("Deadline across retries", test_deadline_covers_retries),
+        ("Blocking slot", test_blocking_slot_held),
+        ("Open circuit", test_open_circuit_rejects)
+    ]:
+        if await test():
+            print(f"\n✅ {name} test completed")
+        else:
+            print(f"\n❌ {name} test failed")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
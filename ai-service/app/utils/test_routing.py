@@ -0,0 +1,80 @@
+import asyncio
+import time
+import numpy as np
+
+from .local_store import LocalVectorStore
+
+DIMENSIONS = 256
+CHUNKS_PER_DOCUMENT = 40
+QUERY_COUNT = 100
+K = 10
+ROUTE_TOP_N = 8
+
+def generate_corpus(documents: int, rng: np.random.Generator):
+    """Chunks of each document scatter around its own topic, like files and channels"""
+    topics = rng.standard_normal((documents, DIMENSIONS)).astype(np.float32)
+    owners = np.repeat(np.arange(documents), CHUNKS_PER_DOCUMENT)
+    chunks = topics[owners] + 0.9 * rng.standard_normal((len(owners), DIMENSIONS)).astype(np.float32)
+    chunks /= np.linalg.norm(chunks, axis=1, keepdims=True)
+    return chunks, owners
+
+def build_centroids(chunks: np.ndarray, owners: np.ndarray, documents: int) -> np.ndarray:
+    """Mean chunk vector per document, as maintained by add_texts"""
+    sums = np.zeros((documents, DIMENSIONS), dtype=np.float32)
+    np.add.at(sums, owners, chunks)
+    return sums / np.bincount(owners, minlength=documents)[:, None]
+
+async def benchmark_routing():
+    """Compare flat search with routing through document centroids as the corpus grows"""
+    rng = np.random.default_rng(0)
+    print(f"\n=== Hierarchical Retrieval (d={DIMENSIONS}, {CHUNKS_PER_DOCUMENT} chunks/doc, "
+          f"top {ROUTE_TOP_N} docs, k={K}) ===")
+    print(f"{'docs':>6} {'chunks':>8} {'flat ms':>8} {'routed ms':>10} {'searched':>9} {'recall':>7}")
+
+    ok = True
+    for documents in [100, 500, 2500]:
+        chunks, owners = generate_corpus(documents, rng)
+        ids = [str(i) for i in range(len(chunks))]
+        flat = LocalVectorStore(DIMENSIONS)
+        flat.add(ids, chunks)
+        centroids = LocalVectorStore(DIMENSIONS)
+        centroids.add([str(d) for d in range(documents)], build_centroids(chunks, owners, documents))
+        rows_by_document = [np.flatnonzero(owners == d) for d in range(documents)]
+
+        # Queries paraphrase a random chunk
+        picks = rng.integers(0, len(chunks), size=QUERY_COUNT)
+        queries = chunks[picks] + 0.5 * rng.standard_normal((QUERY_COUNT, DIMENSIONS)).astype(np.float32)
+
+        start = time.perf_counter()
+        truth = [set(vector_id for vector_id, _ in flat.search(query, K)) for query in queries]
+        flat_ms = (time.perf_counter() - start) * 1000 / QUERY_COUNT
+
+        # Stand-in for a filtered chunk query: score only the routed documents' chunks
+        start = time.perf_counter()
+        hits = 0
+        searched = 0
+        for query, expected in zip(queries, truth):
+            routed = [int(d) for d, _ in centroids.search(query, ROUTE_TOP_N)]
+            rows = np.concatenate([rows_by_document[d] for d in routed])
+            scores = chunks[rows] @ query
+            top = rows[np.argsort(-scores)[:K]]
+            hits += len(expected & set(str(row) for row in top))
+            searched += len(rows)
+        routed_ms = (time.perf_counter() - start) * 1000 / QUERY_COUNT
+
+        recall = hits / (K * QUERY_COUNT)
+        ok = ok and recall > 0.5
+        print(f"{documents:>6} {len(chunks):>8} {flat_ms:>8.2f} {routed_ms:>10.2f} "
+              f"{searched // QUERY_COUNT:>9} {recall:>7.3f}")
+
+    return ok
+
+async def run_tests():
+    """Run the routing benchmark"""
+    if await benchmark_routing():
+        print("\n✅ Routing benchmark completed")
+    else:
+        print("\n❌ Routing benchmark failed")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import random
+import string
+import time
+from typing import Any, Dict, List, Optional
+
+import orjson
+from pydantic import BaseModel
+
+from .compression import compress
+
+class SearchResult(BaseModel):
+    """Mirror of the /query result model"""
+    content: Optional[str] = None
+    metadata: Dict[str, Any]
+    score: float
+
+class QueryResponse(BaseModel):
+    """Mirror of the /query response model"""
+    results: List[SearchResult]
+    answer: str
+    cached: bool = False
+
+ITERATIONS = 50
+
+def make_results(k: int) -> List[Dict[str, Any]]:
+    """Build search results shaped like real chunks"""
+    rng = random.Random(k)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(400)]
+    return [
+        {
+            "content": " ".join(rng.choices(words, k=170)),
+            "metadata": {
+                "id": f"{i:08d}-aaaa-bbbb-cccc-{i:012d}",
+                "filename": f"report-{i % 7}.pdf",
+                "type": "pdf",
+                "size": 183000 + i,
+                "chunk_index": i,
+                "total_chunks": k
+            },
+            "score": 0.9 - i * 0.001
+        }
+        for i in range(k)
+    ]
+
+def time_it(fn) -> float:
+    """Average milliseconds per call"""
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        fn()
+    return (time.perf_counter() - start) * 1000 / ITERATIONS
+
+async def benchmark_serialization():
+    """Compare encoders, response shapes and compression for large k"""
+    answer = "Based on the context, " + "the report describes the quarterly results. " * 10
+    print(f"\n=== /query Serialization Benchmark ({ITERATIONS} iterations) ===")
+    print(f"{'k':>4} {'shape':>8} {'pydantic ms':>12} {'orjson ms':>10} {'bytes':>9} {'gzip':>8} {'br':>8}")
+    for k in [4, 20, 100]:
+        results = make_results(k)
+        shapes = {
+            "full": results,
+            "snippet": [{**r, "content": r["content"][:200]} for r in results],
+            "lean": [{"metadata": {"filename": r["metadata"]["filename"]}, "score": r["score"]} for r in results],
+        }
+        for shape, shaped in shapes.items():
+            payload = {"results": shaped, "answer": answer, "cached": False}
+            pydantic_ms = time_it(lambda: QueryResponse(**payload).model_dump_json(exclude_none=True))
+            orjson_ms = time_it(lambda: orjson.dumps(payload))
+            body = orjson.dumps(payload)
+            assert json.loads(body) == payload
+            print(f"{k:>4} {shape:>8} {pydantic_ms:>12.3f} {orjson_ms:>10.3f} {len(body):>9} "
+                  f"{len(compress(body, 'gzip')):>8} {len(compress(body, 'br')):>8}")
+
+    return True
+
+async def run_tests():
+    """Run the serialization benchmark"""
+    if await benchmark_serialization():
+        print("\n✅ Serialization benchmark completed")
+    else:
+        print("\n❌ Serialization benchmark failed")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
@@ -0,0 +1,105 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+from .shared_queue import SharedIngestQueue, WORKER_RETIRE_SECONDS
+
+async def test_claim_lease_complete():
+    """Each item goes to one worker until its lease expires; completed items are gone"""
+    with tempfile.TemporaryDirectory() as directory:
+        queue = SharedIngestQueue(os.path.join(directory, "queue.db"), max_size=3, lease_seconds=0.05)
+        queued = [queue.enqueue("w1", f"message {i}", {"channel_id": "c1"}) for i in range(4)]
+
+        print("\n=== Claim, Lease and Complete ===")
+        first = queue.claim("w1", 2)
+        second = queue.claim("w2", 2)
+        nothing_left = queue.claim("w2", 2)
+        queue.complete([row["id"] for row in second])
+
+        # w1 never completes, so its items are handed out again
+        time.sleep(0.06)
+        reclaimed = queue.claim("w2", 10)
+        queue.complete([row["id"] for row in reclaimed])
+        status = queue.get_status()
+        print(f"Queued: {queued}, w1 claimed {[row['content'] for row in first]}, "
+              f"w2 claimed {[row['content'] for row in second]}, then {len(nothing_left)} more")
+        print(f"After w1's lease expired w2 reclaimed {[row['content'] for row in reclaimed]}, "
+              f"queue size {status['queue_size']}")
+        return (queued == [True, True, True, False] and len(first) == 2 and len(second) == 1
+                and not nothing_left and [row["id"] for row in reclaimed] == [row["id"] for row in first]
+                and status["queue_size"] == 0)
+
+async def test_rate_budget():
+    """A batch is only claimed when the shared budget has a slot, and empty claims take none"""
+    with tempfile.TemporaryDirectory() as directory:
+        queue = SharedIngestQueue(os.path.join(directory, "queue.db"))
+        empty = queue.claim("w1", 5, limit_per_minute=1)
+        for i in range(4):
+            queue.enqueue("w1", f"message {i}", {})
+
+        print("\n=== Shared Rate Budget ===")
+        batches = [len(queue.claim(worker, 2, limit_per_minute=1)) for worker in ("w1", "w2")]
+        print(f"Claim on empty queue: {len(empty)} items; batch sizes with 1 slot/minute: {batches}")
+        return not empty and batches == [2, 0]
+
+async def test_dedup_results():
+    """Results posted for a worker's deduplicated items reach only that worker, once"""
+    with tempfile.TemporaryDirectory() as directory:
+        queue = SharedIngestQueue(os.path.join(directory, "queue.db"))
+        queue.enqueue("w1", "deploy failed", {"channel_id": "c1"}, dedup_entry_id=7)
+        queue.enqueue("w1", "lunch?", {"channel_id": "c1"}, dedup_entry_id=8)
+        rows = queue.claim("w2", 10)
+        queue.complete([row["id"] for row in rows], [
+            (row["enqueued_by"], row["dedup_entry_id"], f"vec-{row['dedup_entry_id']}" if row["dedup_entry_id"] == 7 else None,
+             "channel_id:c1")
+            for row in rows
+        ])
+
+        print("\n=== Dedup Results ===")
+        for_other = queue.take_dedup_results("w2")
+        for_owner = queue.take_dedup_results("w1")
+        again = queue.take_dedup_results("w1")
+        print(f"w2: {for_other}, w1: {for_owner}, w1 again: {again}")
+        return (not for_other and not again and for_owner == [
+            {"dedup_entry_id": 7, "vector_id": "vec-7", "namespace": "channel_id:c1"},
+            {"dedup_entry_id": 8, "vector_id": None, "namespace": "channel_id:c1"}
+        ])
+
+async def test_retired_workers():
+    """Stats of long-silent workers fold into one row without changing the totals"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "queue.db")
+        queue = SharedIngestQueue(path)
+        queue.report_stats("w1", {"processed_count": 10, "last_processed": "2026-01-01T00:00:00"})
+        queue.report_stats("w2", {"processed_count": 5, "last_processed": "2026-01-02T00:00:00"})
+        with sqlite3.connect(path) as conn:
+            conn.execute("UPDATE worker_stats SET reported_at = ?", (time.time() - WORKER_RETIRE_SECONDS - 1,))
+
+        print("\n=== Retired Workers ===")
+        before = queue.get_status()
+        queue.report_stats("w3", {"processed_count": 1, "last_processed": None})
+        after = queue.get_status()
+        with sqlite3.connect(path) as conn:
+            rows = sorted(worker_id for (worker_id,) in conn.execute("SELECT worker_id FROM worker_stats"))
+        print(f"Before: processed {before['processed_count']}, {before['workers']} active; "
+              f"after w3 reported: processed {after['processed_count']}, {after['workers']} active, rows {rows}")
+        return (before["processed_count"] == 15 and after["processed_count"] == 16 and after["workers"] == 1
+                and after["last_processed"] == "2026-01-02T00:00:00" and rows == ["retired", "w3"])
+
+async def run_tests():
+    """Run all shared queue tests"""
+    for name, test in [
+        ("Claim, lease and complete", test_claim_lease_complete),
+        ("Rate budget", test_rate_budget),
+        ("Dedup results", test_dedup_results),
+        ("Retired workers", test_retired_workers)
+    ]:
+        if await test():
+            print(f"\n✅ {name} test completed")
+        else:
+            print(f"\n❌ {name} test failed")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
@@ -0,0 +1,108 @@
+import asyncio
+import tempfile
+import time
+import numpy as np
+
+from .local_store import LocalVectorStore
+from .snapshot import SnapshotManager
+
+DIMENSIONS = 1536
+CORPUS_SIZE = 20000
+WAL_ADDS = 500
+K = 10
+
+async def benchmark_restore():
+    """Snapshot a store, keep changing it, then restore it in a fresh manager"""
+    rng = np.random.default_rng(0)
+    corpus = rng.standard_normal((CORPUS_SIZE + WAL_ADDS, DIMENSIONS)).astype(np.float32)
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+    ids = [f"vec-{i}" for i in range(len(corpus))]
+    counters = {"processed_count": 1234}
+
+    with tempfile.TemporaryDirectory() as directory:
+        holder = {"store": LocalVectorStore(DIMENSIONS)}
+        manager = SnapshotManager(directory)
+        manager.register_store("vectors", lambda: holder["store"], lambda store: holder.update(store=store))
+        manager.register_state("counters", lambda: dict(counters), counters.update)
+        manager.restore()
+
+        holder["store"].add(ids[:CORPUS_SIZE], corpus[:CORPUS_SIZE])
+        snapshot = await manager.snapshot()
+
+        # Changes after the snapshot are only in the write-ahead log
+        start = time.perf_counter()
+        for i in range(CORPUS_SIZE, len(ids)):
+            holder["store"].add([ids[i]], corpus[i:i + 1])
+        holder["store"].delete(ids[:10])
+        wal_ms = (time.perf_counter() - start) * 1000
+        expected = holder["store"].search(corpus[-1], K)
+        manager.close()
+
+        # Simulate a restarted worker
+        restored = {"store": None}
+        counters["processed_count"] = 0
+        fresh = SnapshotManager(directory)
+        fresh.register_store("vectors", lambda: restored["store"], lambda store: restored.update(store=store))
+        fresh.register_state("counters", lambda: dict(counters), counters.update)
+        restore = fresh.restore()
+        fresh.close()
+
+        start = time.perf_counter()
+        rebuilt = LocalVectorStore(DIMENSIONS)
+        rebuilt.add(ids[10:], corpus[10:])
+        rebuild_ms = (time.perf_counter() - start) * 1000
+
+        print(f"\n=== Snapshot Restore (n={CORPUS_SIZE}, d={DIMENSIONS}, WAL adds={WAL_ADDS}) ===")
+        print(f"Snapshot: {snapshot['bytes'] / 1e6:.1f} MB written in {snapshot['duration_ms']:.0f} ms")
+        print(f"WAL: {WAL_ADDS} single-vector adds logged in {wal_ms:.0f} ms")
+        print(f"Restore (map + WAL replay): {restore['duration_ms']:.1f} ms, {restore['wal_entries']} WAL entries")
+        print(f"Rebuild from in-memory vectors (no re-fetch or re-embed): {rebuild_ms:.1f} ms")
+        print(f"Counters restored: {counters}")
+
+        return (len(restored["store"]) == len(ids) - 10
+                and restored["store"].search(corpus[-1], K) == expected
+                and counters["processed_count"] == 1234)
+
+async def test_worker_dirs():
+    """Concurrent workers snapshot into separate subdirectories; a restart reclaims its slot"""
+    with tempfile.TemporaryDirectory() as directory:
+        stores = [LocalVectorStore(4), LocalVectorStore(4)]
+        managers = []
+        for store in stores:
+            manager = SnapshotManager(directory)
+            manager.register_store("vectors", lambda store=store: store, lambda restored: None)
+            manager.restore()
+            managers.append(manager)
+        stores[0].add(["a"], np.ones((1, 4), dtype=np.float32))
+        stores[1].add(["b"], np.ones((1, 4), dtype=np.float32))
+        for manager in managers:
+            await manager.snapshot()
+        dirs = [manager.directory.name for manager in managers]
+        managers[0].close()
+
+        holder = {"store": None}
+        restarted = SnapshotManager(directory)
+        restarted.register_store("vectors", lambda: holder["store"], lambda store: holder.update(store=store))
+        restarted.restore()
+        restarted_dir = restarted.directory.name
+        restarted.close()
+        managers[1].close()
+
+        print("\n=== Worker Directories ===")
+        print(f"Concurrent workers: {dirs}, restarted worker: {restarted_dir} with ids {holder['store'].export()[0]}")
+        return dirs == ["worker-0", "worker-1"] and restarted_dir == "worker-0" and holder["store"].export()[0] == ["a"]
+
+async def run_tests():
+    """Run the snapshot benchmark and tests"""
+    if await benchmark_restore():
+        print("\n✅ Snapshot restore benchmark completed")
+    else:
+        print("\n❌ Snapshot restore benchmark failed")
+
+    if await test_worker_dirs():
+        print("\n✅ Worker directories test completed")
+    else:
+        print("\n❌ Worker directories test failed")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
@@ -1,9 +1,21 @@
-from typing import List, Optional, Dict, Any
+from typing import Iterator, List, Optional, Dict, Any, Tuple
+from collections import defaultdict
+from datetime import datetime
 from pinecone import Pinecone
+import numpy as np
+import asyncio
+import hashlib
+import itertools
+import math
+import threading
 import uuid
 import logging
+import time
 import json
-from .embeddings import get_embeddings, get_query_embedding
+from .embeddings import get_embeddings_array, get_query_embedding, truncate_embeddings, FULL_DIMENSIONS
+from .local_store import LocalVectorStore
+from .resilience import get_dependency
+from .profiling import stage
 from ..config import get_settings
 
 # Configure logging
@@ -12,6 +24,91 @@ logger = logging.getLogger(__name__)
 settings = get_settings()
 _pinecone_client = None
 _index = None
+_full_vectors = None
+# (monotonic time, vector count per namespace) for unscoped queries
+_namespace_cache: Optional[Tuple[float, Dict[str, int]]] = None
+# Two-stage queries, and those ranked on coarse scores for lack of full vectors
+_rescore_stats = {"queries": 0, "fallbacks": 0, "missing_vectors": 0}
+
+# Coarse routing layer: one centroid per document or channel, kept in its
+# own namespace
+CENTROID_NAMESPACE = "centroids"
+ROUTE_FIELDS = ("filename", "channel_id")
+
+def namespace_for(metadata: Dict[str, Any]) -> str:
+    """
+    Namespace holding a chunk, from its metadata
+
+    With namespace_key set (e.g. "channel_id"), chunks go to a namespace
+    named "<key>:<value>"; chunks without the key, and all chunks when it is
+    unset, go to the default namespace "".
+    """
+    if settings.namespace_key is None:
+        return ""
+    value = metadata.get(settings.namespace_key)
+    return namespace_name(value) if value is not None else ""
+
+def namespace_name(value: Any) -> str:
+    """Namespace for a value of namespace_key"""
+    return f"{settings.namespace_key}:{value}"
+
+def namespaces_from_filter(filter: Optional[Dict[str, Any]]) -> Optional[List[str]]:
+    """Namespaces implied by an equality or $in filter on namespace_key, if any"""
+    if settings.namespace_key is None or not filter:
+        return None
+    condition = filter.get(settings.namespace_key)
+    if isinstance(condition, dict):
+        if isinstance(condition.get("$in"), list):
+            return [namespace_name(value) for value in condition["$in"]]
+        condition = condition.get("$eq")
+    if condition is None or isinstance(condition, (dict, list)):
+        return None
+    return [namespace_name(condition)]
+
+class TooManyNamespacesError(ValueError):
+    """Raised when a query's filter names more namespaces than it may search"""
+
+async def cached_namespace_stats() -> Dict[str, int]:
+    """get_namespace_stats, reused for settings.namespace_cache_seconds"""
+    global _namespace_cache
+    now = time.monotonic()
+    if _namespace_cache is None or now - _namespace_cache[0] > settings.namespace_cache_seconds:
+        _namespace_cache = (now, await get_namespace_stats())
+    return _namespace_cache[1]
+
+async def query_namespaces(filter: Optional[Dict[str, Any]] = None,
+                           namespace: Optional[str] = None) -> Tuple[List[str], int]:
+    """
+    Namespaces a query searches
+
+    `namespace` if given, else those named by the filter on namespace_key,
+    else every namespace. A filter naming more than
+    settings.query_max_namespaces raises TooManyNamespacesError; a query
+    naming none is never refused, and past the limit searches the default
+    namespace and the largest others from the cached namespace list.
+
+    Returns:
+        Tuple of (namespaces to search, number of namespaces left out)
+    """
+    if namespace is not None:
+        return [namespace], 0
+    if settings.namespace_key is None:
+        return [""], 0
+    namespaces = namespaces_from_filter(filter)
+    if namespaces is not None:
+        if len(namespaces) > settings.query_max_namespaces:
+            raise TooManyNamespacesError(
+                f"Filter names {len(namespaces)} namespaces (limit {settings.query_max_namespaces}); "
+                f"pass a namespace or filter on fewer values of {settings.namespace_key}"
+            )
+        return namespaces, 0
+    
+    counts = await cached_namespace_stats()
+    if len(counts) <= settings.query_max_namespaces:
+        return sorted(counts) or [""], 0
+    by_size = sorted((name for name in counts if name != ""), key=lambda name: counts[name], reverse=True)
+    namespaces = ([""] if "" in counts else []) + by_size
+    return namespaces[:settings.query_max_namespaces], len(namespaces) - settings.query_max_namespaces
 
 def get_pinecone():
     """Get or create Pinecone client"""
@@ -21,6 +118,26 @@ def get_pinecone():
         _index = _pinecone_client.Index(settings.pinecone_index)
     return _pinecone_client, _index
 
+def get_full_vector_store() -> Optional[LocalVectorStore]:
+    """
+    Get the local store of full-dimension vectors used for re-scoring
+
+    Returns None unless coarse_dimensions is configured, in which case the
+    Pinecone index holds only the truncated prefix of each embedding and
+    must be created with that dimension.
+    """
+    global _full_vectors
+    if settings.coarse_dimensions is None:
+        return None
+    if _full_vectors is None:
+        _full_vectors = LocalVectorStore(FULL_DIMENSIONS, dtype=settings.local_vector_dtype)
+    return _full_vectors
+
+def set_full_vector_store(store: LocalVectorStore):
+    """Replace the local full-vector store, e.g. with one restored from a snapshot"""
+    global _full_vectors
+    _full_vectors = store
+
 def chunk_text(text: str, chunk_size: int = 1000) -> List[str]:
     """Split text into chunks of roughly equal size"""
     words = text.split()
@@ -43,17 +160,54 @@ def chunk_text(text: str, chunk_size: int = 1000) -> List[str]:
     
     return chunks
 
-async def add_texts(
+def estimate_tokens(text: str) -> int:
+    """Rough token count for English text (about 4 characters per token)"""
+    return max(1, len(text) // 4) if text else 0
+
+def parse_timestamp(value: Any) -> Optional[float]:
+    """Epoch seconds from a timestamp in epoch seconds, epoch milliseconds or ISO 8601, if valid"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        # Millisecond epochs are common in chat payloads
+        return value / 1000 if value > 1e11 else float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+        except (ValueError, OverflowError, OSError):
+            return None
+    return None
+
+def build_chunk_metadata(
+    base_metadata: Dict[str, Any],
+    chunk: str,
+    chunk_index: int,
+    total_chunks: int,
+) -> Dict[str, Any]:
+    """Build the metadata stored alongside a single chunk"""
+    chunk_metadata = base_metadata.copy()
+    chunk_metadata.update({
+        "chunk_index": chunk_index,
+        "total_chunks": total_chunks,
+        "content": chunk
+    })
+    # Epoch seconds, numeric so retention policies can filter on it. Messages
+    # age from their own timestamp, so imported history is not kept longer
+    if "indexed_at" not in chunk_metadata:
+        sent_at = parse_timestamp(chunk_metadata.get("timestamp"))
+        chunk_metadata["indexed_at"] = int(sent_at if sent_at is not None else time.time())
+    return chunk_metadata
+
+def chunk_id(base_id: str, chunk_index: int) -> str:
+    """Vector ID of a chunk of a text with a caller-supplied ID"""
+    return base_id if chunk_index == 0 else f"{base_id}#{chunk_index}"
+
+def iter_chunks(
     texts: List[str],
     metadatas: Optional[List[dict]] = None,
-) -> List[str]:
-    """Add texts to the vector store"""
-    _, index = get_pinecone()
-    
-    # Split texts into chunks
-    all_chunks = []
-    chunk_metadatas = []
-    
+    ids: Optional[List[str]] = None,
+) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+    """Lazily split texts into (vector ID, chunk, metadata) triples"""
     for i, text in enumerate(texts):
         logger.info(f"Processing text {i} of length: {len(text)} bytes")
         chunks = chunk_text(text)
@@ -62,79 +216,511 @@ async def add_texts(
         # Create metadata for each chunk
         base_metadata = (metadatas or [{}])[i].copy() if metadatas and i < len(metadatas) else {}
         for j, chunk in enumerate(chunks):
-            all_chunks.append(chunk)
-            chunk_metadata = base_metadata.copy()
-            chunk_metadata.update({
-                "chunk_index": j,
-                "total_chunks": len(chunks),
-                "content": chunk
-            })
-            chunk_metadatas.append(chunk_metadata)
+            chunk_metadata = build_chunk_metadata(base_metadata, chunk, j, len(chunks))
             metadata_size = len(json.dumps(chunk_metadata).encode('utf-8'))
             logger.info(f"Chunk {j} metadata size: {metadata_size} bytes")
+            vector_id = chunk_id(ids[i], j) if ids is not None else str(uuid.uuid4())
+            yield vector_id, chunk, chunk_metadata
+
+async def embed_window(chunks: List[str]) -> np.ndarray:
+    """Embed a window of chunks into a compact float32 matrix"""
+    embeddings = await get_embeddings_array(chunks)
+    logger.info(f"Generated {len(embeddings)} embeddings, dimension: {embeddings.shape[1]}")
+    return embeddings
+
+async def upsert_window(
+    index,
+    ids: List[str],
+    embeddings: np.ndarray,
+    metadatas: List[Dict[str, Any]],
+    may_exist: bool = False,
+):
+    """
+    Upsert a window of vectors, converting to lists only at serialization
+
+    Pass may_exist when the IDs were supplied by the caller and can replace
+    stored vectors; fresh IDs skip looking up what they replace.
+    """
+    full_store = get_full_vector_store()
+    full_embeddings = embeddings
+    if full_store is not None:
+        embeddings = truncate_embeddings(embeddings, settings.coarse_dimensions)
     
-    # Generate embeddings for all chunks
-    embeddings = await get_embeddings(all_chunks)
-    logger.info(f"Generated embeddings, dimension: {len(embeddings[0])}")
-    
-    # Generate IDs
-    ids = [str(uuid.uuid4()) for _ in all_chunks]
-    
-    # Prepare vectors
-    vectors = []
-    for i, (chunk, embedding, metadata) in enumerate(zip(all_chunks, embeddings, chunk_metadatas)):
-        vector_entry = {
-            "id": ids[i],
-            "values": embedding,
+    vectors = [
+        {
+            "id": vector_id,
+            "values": embedding.tolist(),
             "metadata": metadata
         }
-        vector_size = len(json.dumps(vector_entry).encode('utf-8'))
-        logger.info(f"Vector {i} total size: {vector_size} bytes")
-        logger.info(f"Vector {i} metadata size: {len(json.dumps(metadata).encode('utf-8'))} bytes")
-        vectors.append(vector_entry)
+        for vector_id, embedding, metadata in zip(ids, embeddings, metadatas)
+    ]
+    by_namespace = defaultdict(list)
+    for vector in vectors:
+        by_namespace[namespace_for(vector["metadata"])].append(vector)
+    
+    # Vectors being replaced, e.g. a conversation window that grew, leave
+    # their centroids before the new versions are added
+    replaced = []
+    if settings.route_top_n is not None and may_exist:
+        for namespace, namespace_vectors in by_namespace.items():
+            replaced += await fetch_vectors(index, [vector["id"] for vector in namespace_vectors], namespace)
     
-    # Upsert to Pinecone
     logger.info(f"Upserting {len(vectors)} vectors to Pinecone...")
-    index.upsert(vectors=vectors)
+    for namespace, namespace_vectors in by_namespace.items():
+        await get_dependency("pinecone").call_sync(index.upsert, vectors=namespace_vectors, namespace=namespace)
     logger.info("Upsert complete")
     
-    return ids
+    # Only keep full vectors for chunks that made it into the index
+    if full_store is not None:
+        full_store.add(ids, full_embeddings)
+    
+    if settings.route_top_n is not None:
+        await update_centroids(index, embeddings, metadatas, replaced)
 
-async def similarity_search_with_score(
+async def fetch_vectors(index, ids: List[str], namespace: str = "") -> List[Tuple[np.ndarray, Dict[str, Any]]]:
+    """(values, metadata) of those of the given vectors that exist"""
+    fetched = await get_dependency("pinecone").call_sync(index.fetch, ids=ids, namespace=namespace)
+    return [
+        (np.asarray(vector.values, dtype=np.float32), vector.metadata or {})
+        for vector in fetched.vectors.values()
+    ]
+
+def route_key(metadata: Dict[str, Any]) -> Optional[Tuple[str, Any]]:
+    """The (field, value) pair naming a chunk's document or channel, if any"""
+    for field in ROUTE_FIELDS:
+        if metadata.get(field) is not None:
+            return field, metadata[field]
+    return None
+
+def centroid_id(key: Tuple[str, Any], namespace: str = "") -> str:
+    name = f"{key[0]}:{key[1]}"
+    return f"{namespace}/{name}" if namespace else name
+
+async def update_centroids(index, embeddings: np.ndarray, metadatas: List[Dict[str, Any]],
+                           replaced: Optional[List[Tuple[np.ndarray, Dict[str, Any]]]] = None):
+    """
+    Fold a window of chunk vectors into their documents' centroid vectors
+
+    Centroids are stored as unnormalized means with the chunk count in
+    metadata. `replaced` holds the previous (values, metadata) of chunks
+    being overwritten, which are taken out of their centroids first, so
+    re-upserting a chunk does not count it twice. Each update starts from
+    the stored centroid rather than a per-process copy, so workers build on
+    each other's updates; two workers updating one centroid at the same
+    moment can still lose one update. Deleted chunks are not subtracted; a
+    stale centroid only costs a wasted route.
+    """
+    # Centroids are per namespace, since a file name can recur across channels
+    added = defaultdict(list)
+    removed = defaultdict(list)
+    routes = {}
+    for row, metadata in enumerate(metadatas):
+        key = route_key(metadata)
+        if key is not None:
+            namespace = namespace_for(metadata)
+            vector_id = centroid_id(key, namespace)
+            added[vector_id].append(embeddings[row])
+            routes[vector_id] = (key, namespace)
+    for values, metadata in replaced or []:
+        key = route_key(metadata)
+        if key is not None:
+            namespace = namespace_for(metadata)
+            vector_id = centroid_id(key, namespace)
+            removed[vector_id].append(values)
+            routes[vector_id] = (key, namespace)
+    if not routes:
+        return
+    
+    fetched = await get_dependency("pinecone").call_sync(
+        index.fetch, ids=list(routes), namespace=CENTROID_NAMESPACE
+    )
+    
+    vectors, emptied = [], []
+    for vector_id, (key, namespace) in routes.items():
+        stored = fetched.vectors.get(vector_id)
+        total = np.zeros(embeddings.shape[1], dtype=np.float32)
+        count = 0
+        if stored is not None:
+            stored_count = int((stored.metadata or {}).get("chunk_count", 1))
+            total = np.asarray(stored.values, dtype=np.float32) * stored_count - np.sum(removed[vector_id], axis=0)
+            count = stored_count - len(removed[vector_id])
+        if count <= 0:
+            # Only replaced chunks were left, or the stored count was off
+            total, count = np.zeros(embeddings.shape[1], dtype=np.float32), 0
+        total += np.sum(added[vector_id], axis=0)
+        count += len(added[vector_id])
+        if count == 0:
+            emptied.append(vector_id)
+            continue
+        vectors.append({
+            "id": vector_id,
+            "values": (total / count).tolist(),
+            "metadata": {
+                "route_field": key[0],
+                "route_value": key[1],
+                "chunk_count": count,
+                "namespace": namespace
+            }
+        })
+    if vectors:
+        await get_dependency("pinecone").call_sync(index.upsert, vectors=vectors, namespace=CENTROID_NAMESPACE)
+    if emptied:
+        await get_dependency("pinecone").call_sync(index.delete, ids=emptied, namespace=CENTROID_NAMESPACE)
+
+async def route_query(index, search_vector: np.ndarray, top_n: int, namespace: str = "") -> Optional[Dict[str, Any]]:
+    """
+    Find the top_n documents or channels in a namespace closest to the query
+
+    Returns:
+        A metadata filter matching their chunks and every chunk with no
+        document or channel, or None if there are no centroids
+    """
+    response = await get_dependency("pinecone").call_sync(
+        index.query,
+        vector=search_vector.tolist(),
+        top_k=top_n,
+        include_metadata=True,
+        filter={"namespace": {"$eq": namespace}},
+        namespace=CENTROID_NAMESPACE
+    )
+    values = defaultdict(list)
+    for match in response.matches:
+        values[match.metadata["route_field"]].append(match.metadata["route_value"])
+    if not values:
+        return None
+    clauses = [{field: {"$in": routed}} for field, routed in values.items()]
+    # Chunks without a route field have no centroid and are always searched
+    clauses.append({"$and": [{field: {"$exists": False}} for field in ROUTE_FIELDS]})
+    return {"$or": clauses}
+
+async def add_texts(
+    texts: List[str],
+    metadatas: Optional[List[dict]] = None,
+    ids: Optional[List[str]] = None,
+) -> List[str]:
+    """
+    Add texts to the vector store
+
+    Chunks are embedded and upserted in fixed-size windows, and the upsert of
+    one window overlaps with embedding the next, so at most two windows of
+    vectors are held in memory regardless of document size.
+
+    Pass ids to give each text a stable ID so that re-adding it replaces
+    its vectors; chunk j > 0 of a text is stored as "<id>#<j>".
+    """
+    _, index = get_pinecone()
+    window_size = settings.embed_window_size
+    
+    added_ids = []
+    pending_upsert: Optional[asyncio.Task] = None
+    chunk_stream = iter_chunks(texts, metadatas, ids)
+    
+    try:
+        while True:
+            # Chunking and metadata building happen lazily inside islice
+            with stage("chunk"):
+                window = list(itertools.islice(chunk_stream, window_size))
+            if not window:
+                break
+            
+            window_ids = [vector_id for vector_id, _, _ in window]
+            chunks = [chunk for _, chunk, _ in window]
+            window_metadatas = [metadata for _, _, metadata in window]
+            with stage("embed"):
+                embeddings = await embed_window(chunks)
+            
+            # Wait for the previous window before starting the next upsert
+            if pending_upsert is not None:
+                with stage("upsert_wait"):
+                    await pending_upsert
+            
+            pending_upsert = asyncio.create_task(
+                upsert_window(index, window_ids, embeddings, window_metadatas, may_exist=ids is not None)
+            )
+            added_ids.extend(window_ids)
+        
+        if pending_upsert is not None:
+            with stage("upsert_wait"):
+                await pending_upsert
+    except BaseException:
+        if pending_upsert is not None and not pending_upsert.done():
+            pending_upsert.cancel()
+        raise
+    
+    return added_ids
+
+class OverfetchEstimator:
+    """
+    Chooses how many candidates to fetch per requested result.
+
+    Candidates that share a filename and chunk index are collapsed after the
+    search, so fetching exactly k can return fewer than k results. The factor
+    tracks an exponentially weighted duplicate rate and fetches enough for
+    the expected unique count to reach k, plus `margin`, within
+    [min_factor, max_factor].
+    """
+
+    def __init__(self,
+                 initial_factor: float = 2.0,
+                 min_factor: float = 1.2,
+                 max_factor: float = 4.0,
+                 margin: float = 1.2,
+                 smoothing: float = 0.1):
+        self.min_factor = min_factor
+        self.max_factor = max_factor
+        self.margin = margin
+        self.smoothing = smoothing
+        # Start at the duplicate rate that yields the initial factor
+        self.duplicate_rate = max(0.0, 1 - margin / initial_factor)
+        self._lock = threading.Lock()
+
+    @property
+    def factor(self) -> float:
+        factor = self.margin / max(1 - self.duplicate_rate, 1e-3)
+        return min(self.max_factor, max(self.min_factor, factor))
+
+    def top_k(self, k: int) -> int:
+        """Number of candidates to fetch for k results"""
+        return max(k, math.ceil(k * self.factor))
+
+    def observe(self, fetched: int, duplicates: int):
+        """Record how many of the fetched candidates were duplicates"""
+        if fetched <= 0:
+            return
+        with self._lock:
+            self.duplicate_rate += self.smoothing * (duplicates / fetched - self.duplicate_rate)
+
+_overfetch = OverfetchEstimator(
+    min_factor=settings.overfetch_min_factor,
+    max_factor=settings.overfetch_max_factor
+)
+
+def select_results(
+    results: List[Tuple[dict, float]],
+    min_score: Optional[float] = None,
+    max_score_gap: Optional[float] = None,
+    token_budget: Optional[int] = None,
+) -> Tuple[List[Tuple[dict, float]], Dict[str, Any]]:
+    """
+    Trim best-first search results before they go into the prompt
+
+    Applied in order:
+    - min_score drops results scoring below it
+    - max_score_gap cuts the list at its largest drop between neighbouring
+      scores, if that drop is at least max_score_gap
+    - token_budget keeps results while their content fits the budget; the
+      top result is always kept
+
+    Returns:
+        Tuple of (kept results, stats with counts of dropped chunks and tokens)
+    """
+    stats = {
+        "candidates": len(results),
+        "dropped_min_score": 0,
+        "dropped_score_gap": 0,
+        "dropped_token_budget": 0,
+    }
+    kept = results
+
+    if min_score is not None:
+        kept = [(doc, score) for doc, score in kept if score >= min_score]
+        stats["dropped_min_score"] = len(results) - len(kept)
+
+    if max_score_gap is not None and len(kept) > 1:
+        gaps = [kept[i][1] - kept[i + 1][1] for i in range(len(kept) - 1)]
+        cut = max(range(len(gaps)), key=gaps.__getitem__)
+        if gaps[cut] >= max_score_gap:
+            stats["dropped_score_gap"] = len(kept) - (cut + 1)
+            kept = kept[:cut + 1]
+
+    if token_budget is not None:
+        used = 0
+        for i, (doc, _) in enumerate(kept):
+            used += estimate_tokens(doc.get("content", ""))
+            if used > token_budget and i > 0:
+                stats["dropped_token_budget"] = len(kept) - i
+                kept = kept[:i]
+                break
+
+    kept_ids = {id(doc) for doc, _ in kept}
+    stats["returned"] = len(kept)
+    stats["returned_tokens"] = sum(estimate_tokens(doc.get("content", "")) for doc, _ in kept)
+    stats["dropped_tokens"] = sum(
+        estimate_tokens(doc.get("content", "")) for doc, _ in results if id(doc) not in kept_ids
+    )
+    return kept, stats
+
+async def query_namespace(index, search_vector: np.ndarray, top_k: int,
+                          filter: Optional[Dict[str, Any]], namespace: str) -> Tuple[list, bool]:
+    """Candidate matches from one namespace, and whether routing narrowed them"""
+    # With hierarchical retrieval, only search chunks of the closest documents
+    route_filter = None
+    if settings.route_top_n is not None:
+        with stage("route"):
+            route_filter = await route_query(index, search_vector, settings.route_top_n, namespace)
+    
+    search_filter = filter
+    if route_filter is not None:
+        search_filter = {"$and": [filter, route_filter]} if filter else route_filter
+    with stage("pinecone_query"):
+        results = await get_dependency("pinecone").call_sync(
+            index.query,
+            vector=search_vector.tolist(),
+            top_k=top_k,
+            include_metadata=True,
+            filter=search_filter,
+            namespace=namespace
+        )
+    if route_filter is not None and not results.matches:
+        # Routed documents had no matching chunks, e.g. excluded by the filter
+        results = await get_dependency("pinecone").call_sync(
+            index.query,
+            vector=search_vector.tolist(),
+            top_k=top_k,
+            include_metadata=True,
+            filter=filter,
+            namespace=namespace
+        )
+    return results.matches, route_filter is not None
+
+async def similarity_search_with_stats(
     query: str,
     k: int = 4,
     filter: Optional[Dict[str, Any]] = None,
-) -> List[tuple[dict, float]]:
+    query_embedding: Optional[np.ndarray] = None,
+    namespace: Optional[str] = None,
+    min_score: Optional[float] = None,
+    max_score_gap: Optional[float] = None,
+    token_budget: Optional[int] = None,
+) -> Tuple[List[tuple[dict, float]], Dict[str, Any]]:
     """
-    Search for similar texts and return scores
+    Search for similar texts and trim the results by score and token budget
+
+    Up to k unique results are selected, then trimmed by select_results.
+    Each returned document includes its vector "id". Pass query_embedding
+    when the caller has already embedded the query.
+
+    With namespaces enabled, `namespace` is searched if given, else those
+    named by an equality or $in filter on namespace_key, else all of them
+    up to a limit (see query_namespaces).
+
+    Returns:
+        Tuple of (results with scores, retrieval stats)
     """
     _, index = get_pinecone()
+    namespaces, namespaces_skipped = await query_namespaces(filter, namespace)
     
     # Get query embedding
-    query_embedding = await get_query_embedding(query)
+    if query_embedding is None:
+        query_embedding = await get_query_embedding(query)
     
-    # Search in Pinecone
-    results = index.query(
-        vector=query_embedding,
-        top_k=k * 2,
-        include_metadata=True,
-        filter=filter
-    )
+    # With two-stage retrieval, search the truncated index for a wider
+    # candidate set and re-score it with the full vectors
+    full_store = get_full_vector_store()
+    top_k = _overfetch.top_k(k)
+    search_vector = query_embedding
+    if full_store is not None:
+        top_k *= settings.rescore_factor
+        search_vector = truncate_embeddings(query_embedding, settings.coarse_dimensions)
+    
+    # Several namespaces are searched in parallel and their candidates ranked together
+    searched = await asyncio.gather(*(
+        query_namespace(index, search_vector, top_k, filter, name) for name in namespaces
+    ))
+    matches = [match for namespace_matches, _ in searched for match in namespace_matches]
+    if len(searched) > 1:
+        matches.sort(key=lambda match: match.score, reverse=True)
+    
+    scored_matches = [(match, match.score) for match in matches]
+    if full_store is not None:
+        with stage("rescore"):
+            scored_matches = rescore_matches(matches, query_embedding, full_store)
     
     # Process results
     unique_results = []
     seen_chunks = set()
+    duplicates = 0
     
-    for match in results.matches:
+    for match, score in scored_matches:
         metadata = match.metadata
-        chunk_key = f"{metadata.get('filename', '')}_{metadata.get('chunk_index', '')}"
+        # The same text indexed twice (e.g. a file uploaded again under a new
+        # ID) is one result; distinct chat messages never share a key
+        content = metadata.get("content")
+        chunk_key = hashlib.sha1(content.encode("utf-8")).hexdigest() if content else match.id
         
-        if chunk_key not in seen_chunks and len(unique_results) < k:
+        if chunk_key in seen_chunks:
+            duplicates += 1
+        elif len(unique_results) < k:
             seen_chunks.add(chunk_key)
             doc = metadata.copy()
-            unique_results.append((doc, match.score))
+            doc["id"] = match.id
+            unique_results.append((doc, score))
     
-    return unique_results
+    _overfetch.observe(len(scored_matches), duplicates)
+    
+    selected, stats = select_results(unique_results, min_score, max_score_gap, token_budget)
+    stats.update({
+        "fetched": len(scored_matches),
+        "duplicates": duplicates,
+        "overfetch_factor": round(_overfetch.factor, 2),
+        "routed": any(routed for _, routed in searched),
+        "namespaces": namespaces,
+        "namespaces_skipped": namespaces_skipped
+    })
+    return selected, stats
+
+async def similarity_search_with_score(
+    query: str,
+    k: int = 4,
+    filter: Optional[Dict[str, Any]] = None,
+    query_embedding: Optional[np.ndarray] = None,
+) -> List[tuple[dict, float]]:
+    """
+    Search for similar texts and return scores
+
+    Each returned document includes its vector "id". Pass query_embedding
+    when the caller has already embedded the query.
+    """
+    results, _ = await similarity_search_with_stats(query, k, filter, query_embedding)
+    return results
+
+def rescore_matches(
+    matches: List[Any],
+    query_embedding: np.ndarray,
+    full_store: LocalVectorStore,
+) -> List[Tuple[Any, float]]:
+    """
+    Re-rank coarse candidates by cosine similarity of their full vectors
+
+    Coarse and full-dimension scores are on different scales, so if any
+    candidate's full vector is not held locally (e.g. after a restart, or in
+    a worker that did not index it) every candidate keeps its coarse score.
+    """
+    found_ids, full_vectors = full_store.get(match.id for match in matches)
+    _rescore_stats["queries"] += 1
+    if len(found_ids) < len(matches):
+        _rescore_stats["fallbacks"] += 1
+        _rescore_stats["missing_vectors"] += len(matches) - len(found_ids)
+        logger.warning(f"Full vectors missing for {len(matches) - len(found_ids)} of {len(matches)} candidates, "
+                       f"ranking on coarse scores")
+        return [(match, match.score) for match in matches]
+    
+    query = query_embedding / max(float(np.linalg.norm(query_embedding)), 1e-12)
+    norms = np.maximum(np.linalg.norm(full_vectors, axis=1), 1e-12)
+    full_scores = dict(zip(found_ids, ((full_vectors @ query) / norms).tolist()))
+    
+    scored = [(match, full_scores[match.id]) for match in matches]
+    scored.sort(key=lambda item: item[1], reverse=True)
+    return scored
+
+def get_rescore_status() -> Dict[str, Any]:
+    """How often two-stage queries fell back to coarse scores"""
+    queries = _rescore_stats["queries"]
+    return {
+        "enabled": settings.coarse_dimensions is not None,
+        **_rescore_stats,
+        "fallback_rate": round(_rescore_stats["fallbacks"] / queries, 4) if queries else 0.0
+    }
 
 async def similarity_search(
     query: str,
@@ -155,8 +741,69 @@ async def similarity_search(
     results = await similarity_search_with_score(query, k, filter)
     return [doc for doc, _ in results] 
 
+async def set_vector_metadata(vector_id: str, metadata: Dict[str, Any], namespace: str = ""):
+    """Merge metadata fields into an existing vector"""
+    _, index = get_pinecone()
+    await get_dependency("pinecone").call_sync(index.update, id=vector_id, set_metadata=metadata, namespace=namespace)
+
+async def find_vectors(filter: Dict[str, Any], limit: int, namespace: str = "") -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Find up to `limit` vectors whose metadata matches a filter
+
+    Pinecone has no list-by-filter call, so this runs a filtered query with a
+    constant probe vector; which matching vectors come back is arbitrary.
+
+    Returns:
+        List of (vector ID, metadata) pairs
+    """
+    _, index = get_pinecone()
+    dimensions = settings.coarse_dimensions or FULL_DIMENSIONS
+    probe = [1.0 / dimensions ** 0.5] * dimensions
+    response = await get_dependency("pinecone").call_sync(
+        index.query,
+        vector=probe,
+        top_k=limit,
+        include_metadata=True,
+        filter=filter,
+        namespace=namespace
+    )
+    return [(match.id, dict(match.metadata or {})) for match in response.matches]
+
+async def delete_vectors(ids: List[str], namespace: str = ""):
+    """Delete vectors by ID"""
+    if not ids:
+        return
+    _, index = get_pinecone()
+    await get_dependency("pinecone").call_sync(index.delete, ids=ids, namespace=namespace)
+    full_store = get_full_vector_store()
+    if full_store is not None:
+        full_store.delete(ids)
+
+async def get_vector_count() -> int:
+    """Total number of chunk vectors in the index, excluding centroids"""
+    return sum((await get_namespace_stats()).values())
+
+async def get_namespace_stats() -> Dict[str, int]:
+    """Vector count per chunk namespace ("" is the default namespace)"""
+    _, index = get_pinecone()
+    stats = await get_dependency("pinecone").call_sync(index.describe_index_stats)
+    return {
+        name: summary.vector_count
+        for name, summary in (stats.namespaces or {}).items()
+        if name != CENTROID_NAMESPACE
+    }
+
 async def delete_all_vectors():
     """Delete all vectors from the Pinecone index"""
+    global _namespace_cache
+    _namespace_cache = None
     _, index = get_pinecone()
-    index.delete(delete_all=True)
+    namespaces = set(await get_namespace_stats()) | {""}
+    if settings.route_top_n is not None:
+        namespaces.add(CENTROID_NAMESPACE)
+    for namespace in namespaces:
+        await get_dependency("pinecone").call_sync(index.delete, delete_all=True, namespace=namespace)
+    full_store = get_full_vector_store()
+    if full_store is not None:
+        full_store.clear()
     logger.info("Deleted all vectors from Pinecone index") 
\ No newline at end of file